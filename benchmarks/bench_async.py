@@ -0,0 +1,62 @@
+"""
+benchmarks/bench_async.py - Async tool variants: thread hops and single-flight fan-out
+
+1. Per-call cost of list_microscopy_types the way sync tools were run (one
+   thread-pool hop per call) against the async variant running inline.
+2. Hundreds of concurrent identical get_microscopy_profile calls against a
+   cold profile set: how many loads actually ran, and the wall time.
+
+Run from the project root:
+    python -m benchmarks.bench_async
+"""
+
+import asyncio
+import time
+
+import anyio.to_thread
+
+from microscopy_aesthetics import server
+
+CALLS = 2000
+FAN_OUT = 500
+
+
+async def per_call_us(call, number=CALLS):
+    started = time.perf_counter()
+    for _ in range(number):
+        await call()
+    return (time.perf_counter() - started) / number * 1e6
+
+
+async def fan_out(count):
+    server.profiles_changed()
+    before = server._SINGLE_FLIGHT.stats()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        server.get_microscopy_profile_async("darkfield", ["display_name", "color_palette"], True)
+        for _ in range(count)
+    ))
+    elapsed = time.perf_counter() - started
+    assert len(set(results)) == 1
+    after = server._SINGLE_FLIGHT.stats()
+    return after["started"] - before["started"], after["coalesced"] - before["coalesced"], elapsed
+
+
+async def main_async():
+    server.list_microscopy_types()
+    hop = await per_call_us(lambda: anyio.to_thread.run_sync(server.list_microscopy_types))
+    inline = await per_call_us(lambda: server.list_microscopy_types_async())
+    print(f"list_microscopy_types via thread hop: {hop:8.1f} us")
+    print(f"list_microscopy_types async inline:   {inline:8.1f} us")
+    print()
+    computations, coalesced, elapsed = await fan_out(FAN_OUT)
+    print(f"{FAN_OUT} concurrent cold get_microscopy_profile calls: {computations} computation(s), "
+          f"{coalesced} coalesced, {elapsed * 1e3:.1f} ms")
+
+
+def main():
+    asyncio.run(main_async())
+
+
+if __name__ == '__main__':
+    main()
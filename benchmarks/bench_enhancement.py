@@ -0,0 +1,56 @@
+"""
+benchmarks/bench_enhancement.py - Precompiled suffix table vs the original pipeline
+
+Verifies byte-for-byte identical output over every option combination, then
+times both implementations.
+
+Run from the project root:
+    python -m benchmarks.bench_enhancement
+"""
+
+import itertools
+import timeit
+
+from microscopy_aesthetics.enhancement import STRENGTH_LEVELS
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES, enhance_prompt_with_microscopy
+
+from tests.reference import legacy_enhance_prompt
+
+BASE_PROMPTS = ['a butterfly wing', 'neurons firing in a dense forest of dendrites', 'word ' * 70]
+NUMBER = 20000
+
+
+def combinations():
+    for mtype, profile in MICROSCOPY_PROFILES.items():
+        for mag, palette, strength in itertools.product(
+            profile["magnification_feel"], profile["color_palette"], STRENGTH_LEVELS
+        ):
+            yield mtype, mag, palette, strength
+
+
+def verify():
+    checked = 0
+    for base_prompt in BASE_PROMPTS:
+        for mtype, mag, palette, strength in combinations():
+            expected = legacy_enhance_prompt(base_prompt, mtype, mag, palette, strength)
+            actual = enhance_prompt_with_microscopy(base_prompt, mtype, mag, palette, strength)
+            if actual != expected:
+                raise SystemExit(f"Output mismatch for {(base_prompt, mtype, mag, palette, strength)}")
+            checked += 1
+    return checked
+
+
+def main():
+    print(f"✓ {verify()} outputs identical to the original pipeline")
+    print()
+    print(f"{'prompt words':>12}  {'original µs':>12}  {'precompiled µs':>15}  {'speedup':>8}")
+    for base_prompt in BASE_PROMPTS:
+        args = (base_prompt, 'Phase Contrast', 'high', 'artistic', 'strong')
+        legacy = min(timeit.repeat(lambda: legacy_enhance_prompt(*args), number=NUMBER, repeat=5))
+        fast = min(timeit.repeat(lambda: enhance_prompt_with_microscopy(*args), number=NUMBER, repeat=5))
+        print(f"{len(base_prompt.split()):>12}  {legacy / NUMBER * 1e6:>12.2f}  "
+              f"{fast / NUMBER * 1e6:>15.2f}  {legacy / fast:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+benchmarks/bench_profile_memory.py - Resident size of dict vs compact profiles
+
+Builds catalogs of 10, 1k and 10k profiles from the packaged vocabulary (with
+a share of per-profile phrases, as custom catalogs have) and measures the
+memory each representation holds with tracemalloc. Plain profiles are
+round-tripped through marshal so every string is a separate object, exactly
+as they are after loading from YAML or the compiled cache.
+
+Run from the project root:
+    python -m benchmarks.bench_profile_memory
+"""
+
+import gc
+import marshal
+import random
+import tracemalloc
+
+import yaml
+
+from microscopy_aesthetics.compact import CompactProfile, VocabularyTable
+from microscopy_aesthetics.store import PACKAGED_DIR
+
+CATALOG_SIZES = [10, 1000, 10000]
+UNIQUE_SHARE = 0.2
+
+
+def synthetic_profiles(size, rng):
+    templates = [yaml.safe_load(path.read_text()) for path in sorted(PACKAGED_DIR.glob('*.yaml'))]
+    for i in range(size):
+        profile = dict(rng.choice(templates))
+        profile['display_name'] = f'Custom {i}'
+        for field in ('structure', 'texture', 'mood'):
+            profile[field] = [
+                f'{phrase} {i}' if rng.random() < UNIQUE_SHARE else phrase
+                for phrase in profile[field]
+            ]
+        yield marshal.loads(marshal.dumps(profile))
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    print(f"{'profiles':>8}  {'dict KiB':>10}  {'compact KiB':>12}  {'ratio':>6}  {'bytes/profile':>14}")
+    for size in CATALOG_SIZES:
+        raw = list(synthetic_profiles(size, random.Random(0)))
+        blob = marshal.dumps(raw)
+        dict_bytes, _ = measure(lambda: marshal.loads(blob))
+
+        def build_compact():
+            table = VocabularyTable()
+            return [CompactProfile.from_mapping(p, table) for p in marshal.loads(blob)]
+
+        # Current (not peak) traced size: the transient plain dicts are freed by then
+        compact_bytes, kept = measure(build_compact)
+        print(f"{size:>8}  {dict_bytes / 1024:>10.1f}  {compact_bytes / 1024:>12.1f}  "
+              f"{dict_bytes / compact_bytes:>5.1f}x  {compact_bytes / size:>14.0f}")
+        del kept
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+benchmarks/bench_profile_store.py - Profile store startup vs catalog size
+
+Writes synthetic catalogs of 10 to 5,000 YAML profiles and measures the time
+to create a store and serve one profile, with and without a warm compiled
+cache. First access should stay flat as the catalog grows.
+
+Run from the project root:
+    python -m benchmarks.bench_profile_store
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from microscopy_aesthetics.store import PACKAGED_DIR, ProfileStore
+
+CATALOG_SIZES = [10, 100, 1000, 5000]
+
+
+def first_access(directory, cache):
+    started = time.perf_counter()
+    store = ProfileStore([directory], cache)
+    store['profile_0']
+    return time.perf_counter() - started
+
+
+def main():
+    template = (PACKAGED_DIR / 'confocal.yaml').read_text()
+    print(f"{'profiles':>8}  {'cold ms':>8}  {'cached ms':>10}  {'list all ms':>12}")
+    for size in CATALOG_SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp) / 'profiles'
+            directory.mkdir()
+            for i in range(size):
+                (directory / f'profile_{i}.yaml').write_text(template)
+            cache = Path(tmp) / 'cache'
+            cold = first_access(directory, cache)
+            cached = min(first_access(directory, cache) for _ in range(5))
+            started = time.perf_counter()
+            list(ProfileStore([directory], cache))
+            listing = time.perf_counter() - started
+        print(f"{size:>8}  {cold * 1e3:>8.2f}  {cached * 1e3:>10.3f}  {listing * 1e3:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
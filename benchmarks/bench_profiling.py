@@ -0,0 +1,45 @@
+"""
+benchmarks/bench_profiling.py - Per-call cost of sampled tool profiling
+
+Times a server tool unwrapped (profiling disabled, the default), wrapped with
+a zero sample rate (profiling paused at runtime), sampling 1% of calls, and
+profiling every call in each mode, so the cost of one profiled call can be
+read off directly.
+
+Run from the project root:
+    python -m benchmarks.bench_profiling
+"""
+
+import timeit
+
+from microscopy_aesthetics import server
+from microscopy_aesthetics.profiling import MODES, Profiler
+
+NUMBER = 5000
+KWARGS = {"base_prompt": "a butterfly wing", "microscopy_type": "confocal", "aesthetic_strength": "strong"}
+
+
+def per_call_ns(func, number=NUMBER):
+    return min(timeit.repeat(lambda: func(**KWARGS), number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    # The undecorated tool, whatever $MICROSCOPY_PROFILING says
+    tool = getattr(server.enhance_prompt_with_microscopy, "__wrapped__", server.enhance_prompt_with_microscopy)
+    tool(**KWARGS)
+    raw = per_call_ns(tool)
+    rows = [("disabled (unwrapped)", raw)]
+    for label, rate, mode in [("paused (rate 0)", 0.0, "cpu"), ("1% sampled, cpu", 0.01, "cpu")] + \
+            [(f"every call, {mode}", 1.0, mode) for mode in MODES]:
+        profiler = Profiler(sample_rate=1.0, mode=mode)
+        wrapped = profiler.profile(tool)
+        profiler.sample_rate = rate
+        rows.append((label, per_call_ns(wrapped, NUMBER if rate < 1 else NUMBER // 10)))
+
+    print(f"{'enhance_prompt_with_microscopy':<32} {'ns/call':>10} {'overhead ns':>12}")
+    for label, ns in rows:
+        print(f"{label:<32} {ns:>10.0f} {ns - raw:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
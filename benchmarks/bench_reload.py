@@ -0,0 +1,68 @@
+"""
+benchmarks/bench_reload.py - Hot reload latency vs catalog size
+
+Writes synthetic catalogs of 10 to 1,000 profiles, warms every derived
+structure, then edits one profile and measures:
+
+1. An incremental reload (only the edited profile is re-read and re-derived)
+2. A full rebuild plus re-warming, which is what a restart had to redo
+3. A poll that finds nothing changed (the watcher's steady-state cost)
+
+Run from the project root:
+    python -m benchmarks.bench_reload
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from microscopy_aesthetics.snapshot import ProfileReloader
+from microscopy_aesthetics.store import PACKAGED_DIR, ProfileStore
+
+CATALOG_SIZES = [10, 100, 1000]
+
+
+def warm(snapshot):
+    snapshot.suffix_table.compile()
+    for key in snapshot.profiles:
+        snapshot.responses.profile(key)
+    snapshot.responses.list_types()
+    snapshot.keyword_matcher()
+
+
+def edit(path, generation):
+    text = path.read_text().replace("display_name: ", f"display_name: Edit{generation} ", 1)
+    path.write_text(text)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + generation * 1_000_000))
+
+
+def main():
+    template = (PACKAGED_DIR / 'confocal.yaml').read_text()
+    print(f"{'profiles':>8}  {'reload ms':>10}  {'rebuild ms':>11}  {'no-op poll ms':>14}")
+    for size in CATALOG_SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp) / 'profiles'
+            directory.mkdir()
+            for i in range(size):
+                (directory / f'profile_{i}.yaml').write_text(template)
+            reloader = ProfileReloader(ProfileStore([directory], Path(tmp) / 'cache'), {})
+            warm(reloader.current)
+
+            edit(directory / 'profile_0.yaml', 1)
+            reloader.reload()
+            reload_ms = reloader.last_reload_ms
+
+            started = time.perf_counter()
+            warm(reloader.rebuild())
+            rebuild_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            reloader.reload()
+            poll_ms = (time.perf_counter() - started) * 1000
+        print(f"{size:>8}  {reload_ms:>10.2f}  {rebuild_ms:>11.2f}  {poll_ms:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+benchmarks/bench_result_cache.py - enhance_prompt_with_microscopy with and without memoization
+
+Times repeated calls (the templated-traffic case) with the result cache
+disabled, served from the in-process LRU, and served from the shared SQLite
+tier by a second cache that has not seen the prompt yet.
+
+Run from the project root:
+    python -m benchmarks.bench_result_cache
+"""
+
+import tempfile
+import timeit
+from pathlib import Path
+
+from microscopy_aesthetics import server
+from microscopy_aesthetics.result_cache import ResultCache, SharedResults
+
+PROMPTS = {
+    "short": "a butterfly wing",
+    "long (trimmed)": "an intricate coral reef ecosystem teeming with life " * 40,
+}
+NUMBER = 20000
+
+
+def per_call_us(call, number=NUMBER):
+    return min(timeit.repeat(call, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    enhance = server.enhance_prompt_with_microscopy
+    previous = server._RESULT_CACHE
+    with tempfile.TemporaryDirectory() as directory:
+        shared_path = Path(directory) / "results.sqlite"
+        print(f"{'prompt':<16} {'uncached us':>12} {'LRU hit us':>11} {'shared hit us':>14}")
+        try:
+            for name, prompt in PROMPTS.items():
+                args = (prompt, "confocal", "HIGH", "artistic", "strong")
+                server._RESULT_CACHE = None
+                uncached = per_call_us(lambda: enhance(*args))
+
+                server._RESULT_CACHE = ResultCache(1024, shared=SharedResults(shared_path))
+                expected = enhance(*args)
+                cached = per_call_us(lambda: enhance(*args))
+
+                # A fresh process-local cache per call: every call misses memory and hits SQLite
+                reader = SharedResults(shared_path)
+
+                def shared_hit():
+                    server._RESULT_CACHE = ResultCache(1024, shared=reader)
+                    assert enhance(*args) == expected
+
+                shared = per_call_us(shared_hit, number=NUMBER // 10)
+                print(f"{name:<16} {uncached:>12.2f} {cached:>11.2f} {shared:>14.2f}")
+        finally:
+            server._RESULT_CACHE = previous
+
+
+if __name__ == '__main__':
+    main()
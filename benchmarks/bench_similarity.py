@@ -0,0 +1,63 @@
+"""
+benchmarks/bench_similarity.py - TF-IDF suggestion latency as the catalog grows
+
+Builds synthetic catalogs of 7 to 5,000 profiles by recombining the real
+vocabulary, then times single-description scoring, batch scoring, and a cold
+load from the disk cache versus a rebuild.
+
+Run from the project root:
+    python -m benchmarks.bench_similarity
+"""
+
+import random
+import tempfile
+import time
+import timeit
+
+from microscopy_aesthetics.matching import vocabulary_terms
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES
+from microscopy_aesthetics.similarity import SimilarityIndex
+
+CATALOG_SIZES = [7, 100, 1000, 5000]
+DESCRIPTIONS = [
+    'glowing neon cells with vivid channels',
+    'dramatic dark background with rim lighting on particles',
+    'deep intact tissue imaged in vivo with native autofluorescence',
+]
+
+
+def synthetic_catalog(size, rng):
+    phrases = [p for profile in MICROSCOPY_PROFILES.values() for p in vocabulary_terms(profile)]
+    catalog = {}
+    for i in range(size):
+        # Suffixed words give each synthetic profile some unique vocabulary
+        extra = [f'{rng.choice(phrases)} variant{i % 97}-{rng.randint(0, 50)}' for _ in range(5)]
+        catalog[f'profile_{i}'] = rng.sample(phrases, 30) + extra
+    return catalog
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'profiles':>8}  {'terms':>6}  {'build ms':>9}  {'load ms':>8}  "
+          f"{'score µs':>9}  {'batch µs/desc':>14}")
+    for size in CATALOG_SIZES:
+        documents = synthetic_catalog(size, rng)
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.perf_counter()
+            index = SimilarityIndex.load_or_build(documents, directory)
+            build = time.perf_counter() - started
+            started = time.perf_counter()
+            SimilarityIndex.load_or_build(documents, directory)
+            load = time.perf_counter() - started
+
+        number = 2000
+        single = min(timeit.repeat(lambda: [index.rank(d) for d in DESCRIPTIONS],
+                                   number=number // 3, repeat=3)) / (number // 3 * len(DESCRIPTIONS))
+        batch = DESCRIPTIONS * 300
+        many = min(timeit.repeat(lambda: index.score_many(batch), number=3, repeat=3)) / (3 * len(batch))
+        print(f"{size:>8}  {index.shape[1]:>6}  {build * 1e3:>9.1f}  {load * 1e3:>8.1f}  "
+              f"{single * 1e6:>9.1f}  {many * 1e6:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
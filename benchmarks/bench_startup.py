@@ -0,0 +1,134 @@
+"""
+benchmarks/bench_startup.py - Cold start of the stdio server
+
+MCP clients spawn one stdio server per session, so startup is user-visible
+latency. Reports the `python -X importtime` breakdown of the server module and
+the wall-clock time from spawning `python -m microscopy_aesthetics` to the
+initialize response and to the first list_microscopy_types response, and
+checks both against budgets.
+
+Run from the project root:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --budget 2.0
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+# Spawn to first list_microscopy_types response, in seconds. Most of it is
+# importing fastmcp; override for slow CI machines.
+FIRST_LIST_BUDGET_S = float(os.environ.get("MICROSCOPY_STARTUP_BUDGET_S", 5.0))
+# Import time of this package's own modules, excluding dependencies
+PACKAGE_IMPORT_BUDGET_MS = float(os.environ.get("MICROSCOPY_IMPORT_BUDGET_MS", 100.0))
+
+PACKAGE = "microscopy_aesthetics"
+PROTOCOL_VERSION = "2025-06-18"
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def import_times(module: str = f"{PACKAGE}.server") -> List[ImportTime]:
+    """Per-module import times from `python -X importtime`, in import order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append(ImportTime(name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def package_import_ms(times: Sequence[ImportTime]) -> float:
+    """Time spent in this package's own module bodies."""
+    return sum(t.self_us for t in times if t.module.split(".")[0] == PACKAGE) / 1000
+
+
+def time_to_first_list(command: Optional[Sequence[str]] = None, timeout: float = 60.0) -> Dict[str, float]:
+    """
+    Spawn a stdio server and time the MCP handshake and first tool call.
+
+    Returns:
+        {"initialize_s": ..., "first_list_s": ...} measured from spawn
+    """
+    command = list(command or [sys.executable, "-m", PACKAGE])
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True)
+
+    def send(message):
+        process.stdin.write(json.dumps({"jsonrpc": "2.0", **message}) + "\n")
+        process.stdin.flush()
+
+    def receive(request_id):
+        while True:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("server exited before responding")
+            message = json.loads(line)
+            if message.get("id") == request_id:
+                if "error" in message:
+                    raise RuntimeError(message["error"])
+                return message["result"]
+
+    try:
+        send({"id": 1, "method": "initialize", "params": {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "bench_startup", "version": "0"},
+        }})
+        receive(1)
+        initialized = time.perf_counter()
+        send({"method": "notifications/initialized"})
+        send({"id": 2, "method": "tools/call",
+              "params": {"name": "list_microscopy_types", "arguments": {}}})
+        result = receive(2)
+        listed = time.perf_counter()
+        json.loads(result["content"][0]["text"])
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"initialize_s": initialized - started, "first_list_s": listed - started}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure stdio server cold start")
+    parser.add_argument("--runs", type=int, default=3, help="Server launches to time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--budget", type=float, default=FIRST_LIST_BUDGET_S,
+                        help=f"Seconds allowed to the first list response (default: {FIRST_LIST_BUDGET_S})")
+    args = parser.parse_args(argv)
+
+    times = import_times()
+    print(f"{'module':<50} {'self ms':>9} {'cumulative ms':>14}")
+    for t in sorted(times, key=lambda t: t.cumulative_us, reverse=True)[:args.top]:
+        print(f"{t.module:<50} {t.self_us / 1000:>9.1f} {t.cumulative_us / 1000:>14.1f}")
+    own_ms = package_import_ms(times)
+    print(f"\n{PACKAGE} modules: {own_ms:.1f} ms (budget {PACKAGE_IMPORT_BUDGET_MS:.0f} ms)")
+    print(f"fastmcp imported by {PACKAGE}.cli: "
+          f"{any(t.module == 'fastmcp' for t in import_times(f'{PACKAGE}.cli'))}")
+
+    runs = [time_to_first_list() for _ in range(args.runs)]
+    best = min(runs, key=lambda r: r["first_list_s"])
+    print(f"\ninitialize response:  {best['initialize_s'] * 1000:8.0f} ms (best of {args.runs})")
+    print(f"first list response:  {best['first_list_s'] * 1000:8.0f} ms (budget {args.budget * 1000:.0f} ms)")
+    return 0 if best["first_list_s"] <= args.budget and own_ms <= PACKAGE_IMPORT_BUDGET_MS else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+benchmarks/bench_suggest.py - Keyword matcher scaling with description length
+
+Times the compiled single-pass matcher against the original one-scan-per-keyword
+loop over the same (full vocabulary) term set, for descriptions from 10 to
+100k characters.
+
+Run from the project root:
+    python -m benchmarks.bench_suggest
+"""
+
+import random
+import timeit
+
+from microscopy_aesthetics.matching import KeywordMatcher, vocabulary_terms
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES, SUGGESTION_KEYWORDS
+
+from tests.reference import legacy_keyword_scores
+
+LENGTHS = [10, 100, 1000, 10000, 100000]
+
+
+def description_of_length(length, rng):
+    words = ['glowing', 'cells', 'with', 'dramatic', 'rim', 'lighting', 'and', 'deep', 'tissue',
+             'layers', 'under', 'a', 'soft', 'halo', 'of', 'particles']
+    text = ''
+    while len(text) < length:
+        text += rng.choice(words) + ' '
+    return text[:length]
+
+
+def main():
+    terms = {
+        key: list(dict.fromkeys(t.lower() for t in SUGGESTION_KEYWORDS[key] + vocabulary_terms(profile)))
+        for key, profile in MICROSCOPY_PROFILES.items()
+    }
+    matcher = KeywordMatcher(terms)
+    rng = random.Random(0)
+    print(f"{len(matcher)} indexed terms across {len(terms)} types")
+    print()
+    print(f"{'chars':>8}  {'original ms':>12}  {'compiled ms':>12}  {'compiled ns/char':>17}")
+    for length in LENGTHS:
+        description = description_of_length(length, rng)
+        assert matcher.scores(description) == legacy_keyword_scores(description, terms)
+        number = max(1, 20000 // length)
+        legacy = min(timeit.repeat(lambda: legacy_keyword_scores(description, terms),
+                                   number=number, repeat=3)) / number
+        fast = min(timeit.repeat(lambda: matcher.scores(description),
+                                 number=number, repeat=3)) / number
+        print(f"{length:>8}  {legacy * 1e3:>12.3f}  {fast * 1e3:>12.3f}  {fast / length * 1e9:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+benchmarks/load_generator.py - Local HTTP load generator for the sharded server
+
+Starts `microscopy-server serve --transport http --workers N` on a Unix socket
+for each requested worker count, drives it with keep-alive connections spread
+over several client processes (so the generator is not the bottleneck), and
+reports requests/s, latency percentiles and scaling relative to one worker.
+Requests are stateless MCP tools/call messages mixing every tool.
+
+Run from the project root:
+    python -m benchmarks.load_generator --workers 1,2,4 --concurrency 32 --duration 10
+
+Scaling is bounded by the cores left over for the client processes; on a
+machine with C cores, expect close to linear gains up to about C/2 workers.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from benchmarks.suite import percentile
+
+MCP_PATH = "/mcp"
+CALLS = [
+    ("enhance_prompt_with_microscopy", {"base_prompt": "a butterfly wing", "microscopy_type": "confocal"}),
+    ("enhance_prompt_with_microscopy", {"base_prompt": "neurons reaching toward a synapse " * 5,
+                                        "microscopy_type": "electron", "aesthetic_strength": "strong"}),
+    ("list_microscopy_types", {"compact": True}),
+    ("get_microscopy_profile", {"microscopy_type": "darkfield"}),
+    ("suggest_microscopy_type", {"description": "glowing neon cells with dramatic rim lighting"}),
+]
+
+
+def request_bytes(request_id: int, tool: str, arguments: Dict) -> bytes:
+    body = json.dumps({"jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+                       "params": {"name": tool, "arguments": arguments}}).encode("utf-8")
+    head = (f"POST {MCP_PATH} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Accept: application/json, text/event-stream\r\nContent-Length: {len(body)}\r\n\r\n")
+    return head.encode("ascii") + body
+
+
+async def read_response(reader: asyncio.StreamReader) -> bytes:
+    """Read one HTTP/1.1 response with a Content-Length body; returns the body."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = head.split(b" ", 2)[1]
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    body = await reader.readexactly(length)
+    if status != b"200":
+        raise RuntimeError(f"HTTP {status.decode()}: {body[:200]!r}")
+    return body
+
+
+async def _connection(socket_path: str, deadline: float, latencies: List[int], offset: int) -> int:
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    errors = 0
+    i = offset
+    clock = time.perf_counter_ns
+    try:
+        while time.monotonic() < deadline:
+            tool, arguments = CALLS[i % len(CALLS)]
+            started = clock()
+            writer.write(request_bytes(i, tool, arguments))
+            body = await read_response(reader)
+            latencies.append(clock() - started)
+            if b'"isError":true' in body or b'"error"' in body[:64]:
+                errors += 1
+            i += 1
+    finally:
+        writer.close()
+    return errors
+
+
+def _client_process(args) -> Dict:
+    socket_path, connections, duration, seed = args
+    latencies: List[int] = []
+
+    async def run():
+        deadline = time.monotonic() + duration
+        return sum(await asyncio.gather(*(
+            _connection(socket_path, deadline, latencies, seed * 1000 + c) for c in range(connections)
+        )))
+
+    errors = asyncio.run(run())
+    return {"latencies": latencies, "errors": errors}
+
+
+def run_load(socket_path: str, concurrency: int, duration: float, processes: int) -> Dict[str, float]:
+    """Drive a server with `concurrency` connections split over client processes."""
+    processes = max(1, min(processes, concurrency))
+    shares = [concurrency // processes + (i < concurrency % processes) for i in range(processes)]
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        results = pool.map(_client_process, [(socket_path, n, duration, i) for i, n in enumerate(shares)])
+    elapsed = time.perf_counter() - started
+    latencies = sorted(ns / 1000 for r in results for ns in r["latencies"])
+    if not latencies:
+        raise RuntimeError("no requests completed")
+    return {
+        "requests": len(latencies),
+        "errors": sum(r["errors"] for r in results),
+        "requests_per_sec": round(len(latencies) / min(elapsed, duration), 1),
+        "p50_us": round(percentile(latencies, 0.50), 1),
+        "p99_us": round(percentile(latencies, 0.99), 1),
+    }
+
+
+def start_server(workers: int, socket_path: str, timeout: float = 120.0) -> subprocess.Popen:
+    """Start a (sharded) stateless HTTP server and wait until it accepts connections."""
+    # One worker is a plain stateless server, so scaling includes the dispatcher's cost
+    process = subprocess.Popen(
+        [sys.executable, "-m", "microscopy_aesthetics", "serve", "--transport", "http",
+         "--workers", str(workers), "--socket", socket_path, "--stateless"],
+        stdin=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        if time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError("server did not start")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+            return process
+        except OSError:
+            time.sleep(0.05)
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the sharded HTTP server")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts (default: 1,2,4)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Open connections (default: 32)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run (default: 10)")
+    parser.add_argument("--client-processes", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Load generator processes (default: half the cores)")
+    args = parser.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in (int(w) for w in args.workers.split(",")):
+            socket_path = str(Path(directory) / f"dispatch-{workers}.sock")
+            process = start_server(workers, socket_path)
+            try:
+                stats = run_load(socket_path, args.concurrency, args.duration, args.client_processes)
+            finally:
+                stop_server(process)
+            rows.append((workers, stats))
+
+    base = rows[0][1]["requests_per_sec"]
+    print(f"{os.cpu_count()} cores, {args.concurrency} connections, {args.client_processes} client processes")
+    print(f"{'workers':>7} {'req/s':>10} {'scaling':>8} {'p50 us':>10} {'p99 us':>10} {'errors':>7}")
+    for workers, stats in rows:
+        print(f"{workers:>7} {stats['requests_per_sec']:>10,.0f} {stats['requests_per_sec'] / base:>7.2f}x "
+              f"{stats['p50_us']:>10,.0f} {stats['p99_us']:>10,.0f} {stats['errors']:>7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""
+benchmarks/load_test.py - End-to-end load test over the stdio and HTTP transports
+
+Unlike suite.py, which calls tools in-process, this launches the server as a
+subprocess and measures everything a real client waits for: JSON-RPC
+encoding, FastMCP dispatch and transport I/O. A configurable number of
+simulated clients replay a mixed workload of every tool (load_generator.CALLS
+by default, or a JSONL file of {"tool": ..., "arguments": {...}} lines), each
+starting at a different point of it. Reports end-to-end latency percentiles
+and throughput overall and per tool, plus the CPU and RSS of the server's
+process tree sampled from /proc while the load runs.
+
+Over stdio the clients share one server and session, as concurrent calls
+from one MCP host do; over HTTP each client keeps its own connection to a
+stateless server on a Unix socket (--workers N puts N processes behind the
+dispatcher). Everything runs offline on one Linux machine.
+
+Run from the project root:
+    python -m benchmarks.load_test                               # stdio and http, 1/8/32 clients
+    python -m benchmarks.load_test --transport stdio --clients 16 --duration 30 --timeline
+    python -m benchmarks.load_test --workload calls.jsonl --output load.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from benchmarks.bench_startup import PACKAGE, PROTOCOL_VERSION
+from benchmarks.load_generator import CALLS, read_response, request_bytes, start_server, stop_server
+from benchmarks.suite import percentile
+
+TRANSPORTS = ("stdio", "http")
+# Longest stdio response line accepted; full profiles are a few kilobytes
+STDIO_LINE_LIMIT = 16 * 1024 * 1024
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+Call = Tuple[str, Dict[str, Any]]
+
+
+class Sample(NamedTuple):
+    """Server resource use over one sampling interval."""
+    elapsed_s: float
+    cpu_percent: float
+    rss_mb: float
+    processes: int
+
+
+def _stat(pid: int) -> Optional[List[str]]:
+    # Fields after the command name, which may itself contain spaces
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    return stat[stat.rindex(")") + 2:].split()
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and all of its descendants (dispatcher workers, executor processes)."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            fields = _stat(int(entry))
+            if fields is not None:
+                children.setdefault(int(fields[1]), []).append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, ()))
+    return tree
+
+
+def tree_usage(pid: int) -> Tuple[float, int, int]:
+    """(CPU seconds, RSS bytes, process count) of a process tree."""
+    cpu_ticks = rss_pages = count = 0
+    for member in process_tree(pid):
+        fields = _stat(member)
+        if fields is None:
+            continue  # Exited meanwhile
+        cpu_ticks += int(fields[11]) + int(fields[12])
+        rss_pages += int(fields[21])
+        count += 1
+    return cpu_ticks / CLOCK_TICKS, rss_pages * PAGE_SIZE, count
+
+
+class ResourceSampler(threading.Thread):
+    """Samples a process tree's CPU and RSS every `interval` seconds until stop()."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Sample] = []
+        # CPU seconds used by the tree between start and stop
+        self.cpu_s = 0.0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        if not os.path.exists(f"/proc/{self.pid}/stat"):
+            return  # Not Linux, or the server is gone
+        started = last_time = time.monotonic()
+        first_cpu = last_cpu = tree_usage(self.pid)[0]
+        while not self._stopped.wait(self.interval):
+            now = time.monotonic()
+            cpu, rss, count = tree_usage(self.pid)
+            self.samples.append(Sample(round(now - started, 3), round(100 * (cpu - last_cpu) / (now - last_time), 1),
+                                       round(rss / 2**20, 1), count))
+            last_time, last_cpu = now, cpu
+        self.cpu_s = tree_usage(self.pid)[0] - first_cpu
+
+    def stop(self) -> List[Sample]:
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+
+class StdioTarget:
+    """A stdio server; every simulated client shares its one session."""
+
+    name = "stdio"
+
+    def __init__(self) -> None:
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self) -> int:
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", PACKAGE, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL, limit=STDIO_LINE_LIMIT,
+        )
+        self._reader = asyncio.create_task(self._read())
+        response = await self._request("initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "load_test", "version": "0"},
+        })
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        return self.process.pid
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        self.process.stdin.write(json.dumps(message).encode("utf-8") + b"\n")
+
+    async def _request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        request_id = next(self._ids)
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        return await future
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("server exited before responding"))
+
+    async def call(self, client: int, tool: str, arguments: Dict[str, Any]) -> bool:
+        """Make one tools/call; returns whether it succeeded."""
+        message = await self._request("tools/call", {"name": tool, "arguments": arguments})
+        return "error" not in message and not message["result"].get("isError")
+
+    async def close(self) -> None:
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), 30)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+        if self._reader is not None:
+            await self._reader
+
+
+class HttpTarget:
+    """A stateless HTTP server on a Unix socket; each client keeps its own connection."""
+
+    name = "http"
+
+    def __init__(self, socket_path: str, workers: int = 1) -> None:
+        self.socket_path = socket_path
+        self.workers = workers
+        self.process = None
+        self._connections: Dict[int, Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = {}
+        self._ids = itertools.count(1)
+
+    async def start(self) -> int:
+        self.process = await asyncio.to_thread(start_server, self.workers, self.socket_path)
+        return self.process.pid
+
+    async def call(self, client: int, tool: str, arguments: Dict[str, Any]) -> bool:
+        """Make one tools/call; returns whether it succeeded."""
+        connection = self._connections.get(client)
+        if connection is None:
+            connection = self._connections[client] = await asyncio.open_unix_connection(self.socket_path)
+        reader, writer = connection
+        writer.write(request_bytes(next(self._ids), tool, arguments))
+        try:
+            body = await read_response(reader)
+        except RuntimeError:
+            return False
+        return b'"isError":true' not in body and b'"error"' not in body[:64]
+
+    async def close(self) -> None:
+        for _, writer in self._connections.values():
+            writer.close()
+        self._connections.clear()
+        if self.process is not None:
+            await asyncio.to_thread(stop_server, self.process)
+
+
+async def _client(target, client: int, calls: Sequence[Call], deadline: float,
+                  records: Optional[List[Tuple[str, int, bool]]]) -> None:
+    clock = time.perf_counter_ns
+    # Each client starts at a different call so the mix is spread from the start
+    for i in itertools.count(client):
+        if time.monotonic() >= deadline:
+            return
+        tool, arguments = calls[i % len(calls)]
+        started = clock()
+        ok = await target.call(client, tool, arguments)
+        if records is not None:
+            records.append((tool, clock() - started, ok))
+
+
+async def _replay(target, clients: int, calls: Sequence[Call], duration: float,
+                  records: Optional[List[Tuple[str, int, bool]]] = None) -> None:
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(_client(target, c, calls, deadline, records) for c in range(clients)))
+
+
+def _latencies(latencies_ns: List[int]) -> Dict[str, float]:
+    us = sorted(ns / 1000 for ns in latencies_ns)
+    return {
+        "p50_us": round(percentile(us, 0.50), 1),
+        "p95_us": round(percentile(us, 0.95), 1),
+        "p99_us": round(percentile(us, 0.99), 1),
+    }
+
+
+def summarize(records: List[Tuple[str, int, bool]], elapsed_s: float, samples: List[Sample],
+              cpu_s: float = 0.0) -> Dict[str, Any]:
+    """Overall and per-tool latency, throughput and server resource use of one run."""
+    if not records:
+        raise RuntimeError("no requests completed")
+    by_tool: Dict[str, List[int]] = {}
+    for tool, latency, _ in records:
+        by_tool.setdefault(tool, []).append(latency)
+    stats: Dict[str, Any] = {
+        "requests": len(records),
+        "errors": sum(not ok for _, _, ok in records),
+        "requests_per_sec": round(len(records) / elapsed_s, 1),
+        **_latencies([latency for _, latency, _ in records]),
+        "tools": {tool: {"calls": len(latencies), **_latencies(latencies)} for tool, latencies in by_tool.items()},
+    }
+    if samples:
+        cpu = [s.cpu_percent for s in samples]
+        stats.update(
+            cpu_percent_mean=round(sum(cpu) / len(cpu), 1),
+            cpu_percent_max=max(cpu),
+            cpu_ms_per_request=round(cpu_s * 1000 / len(records), 3),
+            rss_mb_peak=max(s.rss_mb for s in samples),
+        )
+    stats["timeline"] = [s._asdict() for s in samples]
+    return stats
+
+
+async def run_load(target, clients: int, duration: float, warmup: float = 1.0,
+                   calls: Sequence[Call] = CALLS, interval: float = 0.5) -> Dict[str, Any]:
+    """
+    Start a target's server, warm it up, then replay calls from `clients`
+    concurrent clients for `duration` seconds while sampling its resources.
+    """
+    pid = await target.start()
+    try:
+        if warmup > 0:
+            await _replay(target, clients, calls, warmup)
+        records: List[Tuple[str, int, bool]] = []
+        sampler = ResourceSampler(pid, interval)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await _replay(target, clients, calls, duration, records)
+        finally:
+            samples = sampler.stop()
+        elapsed = time.perf_counter() - started
+    finally:
+        await target.close()
+    return summarize(records, elapsed, samples, sampler.cpu_s)
+
+
+def load_workload(path: Path) -> List[Call]:
+    """Calls from a JSONL file of {"tool": ..., "arguments": {...}} lines."""
+    calls = []
+    for line in path.read_text().splitlines():
+        if line.strip():
+            call = json.loads(line)
+            calls.append((call["tool"], call.get("arguments", {})))
+    if not calls:
+        raise ValueError(f"{path}: no calls")
+    return calls
+
+
+def print_results(rows: List[Dict[str, Any]], timeline: bool = False) -> None:
+    print(f"{'transport':<9} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'cpu %':>6} {'cpu ms/req':>10} {'peak MB':>8}")
+    for row in rows:
+        stats = row["stats"]
+        print(f"{row['transport']:<9} {row['clients']:>7} {stats['requests_per_sec']:>9,.0f} "
+              f"{stats['p50_us'] / 1000:>8.2f} {stats['p95_us'] / 1000:>8.2f} {stats['p99_us'] / 1000:>8.2f} "
+              f"{stats['errors']:>6} {stats.get('cpu_percent_mean', 0):>6.0f} "
+              f"{stats.get('cpu_ms_per_request', 0):>10.3f} {stats.get('rss_mb_peak', 0):>8.1f}")
+    for row in rows:
+        print(f"\n{row['transport']}, {row['clients']} clients: {'calls':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        for tool, stats in row["stats"]["tools"].items():
+            print(f"  {tool:<32} {stats['calls']:>7} {stats['p50_us'] / 1000:>8.2f} {stats['p99_us'] / 1000:>8.2f}")
+        if timeline:
+            print(f"  {'t s':>6} {'cpu %':>6} {'rss MB':>7} {'procs':>5}")
+            for sample in row["stats"]["timeline"]:
+                print(f"  {sample['elapsed_s']:>6.1f} {sample['cpu_percent']:>6.0f} {sample['rss_mb']:>7.1f} "
+                      f"{sample['processes']:>5}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the server end to end over stdio and HTTP")
+    parser.add_argument("--transport", default=",".join(TRANSPORTS),
+                        help="Comma-separated transports: stdio, http (default: both)")
+    parser.add_argument("--clients", default="1,8,32", help="Comma-separated client counts (default: 1,8,32)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per run (default: 10)")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds per run (default: 2)")
+    parser.add_argument("--interval", type=float, default=0.5, help="Resource sampling interval (default: 0.5)")
+    parser.add_argument("--workers", type=int, default=1, help="HTTP worker processes (default: 1)")
+    parser.add_argument("--workload", type=Path, help="JSONL of calls to replay (default: a mix of every tool)")
+    parser.add_argument("--timeline", action="store_true", help="Print CPU and RSS per sampling interval")
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    transports = args.transport.split(",")
+    unknown = [t for t in transports if t not in TRANSPORTS]
+    if unknown:
+        parser.error(f"unknown transport {unknown[0]!r}; choose from {', '.join(TRANSPORTS)}")
+    calls = load_workload(args.workload) if args.workload else CALLS
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for transport, clients in itertools.product(transports, (int(c) for c in args.clients.split(","))):
+            if transport == "stdio":
+                target = StdioTarget()
+            else:
+                target = HttpTarget(str(Path(directory) / f"load-{clients}.sock"), args.workers)
+            stats = asyncio.run(run_load(target, clients, args.duration, args.warmup, calls, args.interval))
+            rows.append({"transport": transport, "clients": clients, "stats": stats})
+
+    print(f"{os.cpu_count()} cores, {len(calls)} calls in the workload, {args.duration:g} s per run")
+    print_results(rows, args.timeline)
+    if args.output:
+        args.output.write_text(json.dumps({"meta": {"duration_s": args.duration, "workers": args.workers},
+                                           "runs": rows}, indent=2))
+    return 1 if any(row["stats"]["errors"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
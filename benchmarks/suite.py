@@ -0,0 +1,273 @@
+"""
+benchmarks/suite.py - Latency benchmarks for every MCP tool, with regression gating
+
+Drives each tool directly and through an in-process FastMCP client over a
+spread of inputs: prompt lengths, every type/option combination, and unknown
+types that take the error paths. Reports p50/p95/p99 latency and ops/s, writes
+JSON results, and compares them with a stored baseline.
+
+Run from the project root:
+    python -m benchmarks.suite --save-baseline          # record benchmarks/baseline.json
+    python -m benchmarks.suite                          # compare; exit 1 on regression
+    python -m benchmarks.suite --threshold 0.5 --metric p95_us --output results.json
+
+Baselines are machine-specific, so record one on the machine that gates.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from microscopy_aesthetics import server
+from microscopy_aesthetics.enhancement import STRENGTH_LEVELS
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+# Slowdowns smaller than this are timer noise on sub-microsecond calls
+DEFAULT_MIN_DELTA_US = 1.0
+METRICS = ("p50_us", "p95_us", "p99_us")
+
+PROMPTS = {
+    "short": "a butterfly wing",
+    "medium": "a dense forest of neurons with dendrites reaching toward a glowing synapse " * 3,
+    "long": "an intricate coral reef ecosystem teeming with life " * 40,
+}
+DESCRIPTIONS = {
+    "short": "glowing and luminous",
+    "long": "dramatic dark background with rim lighting on particles and deep intact tissue " * 50,
+    "no_match": "zzz qqq",
+}
+
+
+class Case(NamedTuple):
+    """One benchmark: a tool and the argument sets it cycles through."""
+    name: str
+    tool: str
+    arguments: List[Dict[str, Any]]
+
+
+def build_cases() -> List[Case]:
+    types = list(server.MICROSCOPY_PROFILES)
+    combos = [
+        {"microscopy_type": t, "magnification": m, "color_palette": p, "aesthetic_strength": s}
+        for t, m, p, s in itertools.product(
+            types, ("low", "medium", "high"), ("scientific", "artistic", "monochrome"), STRENGTH_LEVELS
+        )
+    ]
+    cases = [
+        Case(f"enhance/{length}", "enhance_prompt_with_microscopy",
+             [dict(combo, base_prompt=prompt) for combo in combos])
+        for length, prompt in PROMPTS.items()
+    ]
+    cases += [
+        Case("enhance/unknown_type", "enhance_prompt_with_microscopy",
+             [{"base_prompt": PROMPTS["short"], "microscopy_type": "x-ray"}]),
+        Case("enhance/variants_1000", "enhance_prompt_with_microscopy",
+             [{"base_prompt": PROMPTS["short"], "microscopy_type": t, "aesthetic_strength": "strong",
+               "variants": 1000, "seed": 1} for t in types]),
+        Case("enhance/blend", "enhance_prompt_with_microscopy",
+             [{"base_prompt": PROMPTS["short"], "microscopy_type": {a: 0.7, b: 0.3}}
+              for a, b in zip(types, types[1:] + types[:1])]),
+        Case("enhance/alias", "enhance_prompt_with_microscopy",
+             [{"base_prompt": PROMPTS["short"], "microscopy_type": name}
+              for name in ("SEM", "two-photon", "DIC", "Phase Contrast", "confocl", "flourescence")]),
+        Case("enhance/budget_tokens_long", "enhance_prompt_with_microscopy",
+             [{"base_prompt": PROMPTS["long"], "microscopy_type": t, "budget": 77, "budget_unit": "tokens"}
+              for t in types]),
+        Case("enhance_batch/100", "enhance_prompts_batch",
+             [{"prompts": [PROMPTS["short"]] * 100, "microscopy_type": t} for t in types]),
+        Case("list/pretty", "list_microscopy_types", [{}]),
+        Case("list/compact", "list_microscopy_types", [{"compact": True}]),
+        Case("profile/full", "get_microscopy_profile", [{"microscopy_type": t} for t in types]),
+        Case("profile/fields", "get_microscopy_profile",
+             [{"microscopy_type": t, "fields": ["color_palette", "magnification_feel"], "compact": True}
+              for t in types]),
+        Case("profile/unknown_type", "get_microscopy_profile", [{"microscopy_type": "x-ray"}]),
+        Case("metrics/json", "get_server_metrics", [{}]),
+        Case("metrics/prometheus", "get_server_metrics", [{"format": "prometheus"}]),
+        Case("profiling/report", "profiling_report", [{"limit": 5}]),
+    ]
+    cases += [
+        Case(f"suggest/{name}", "suggest_microscopy_type", [{"description": description}])
+        for name, description in DESCRIPTIONS.items()
+    ]
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        cases.append(Case("suggest/similarity", "suggest_microscopy_type",
+                          [{"description": d, "mode": "similarity"} for d in DESCRIPTIONS.values()]))
+    return cases
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies_ns: List[int], elapsed_s: float) -> Dict[str, float]:
+    latencies_ns.sort()
+    us = [ns / 1000 for ns in latencies_ns]
+    return {
+        "calls": len(us),
+        "mean_us": round(sum(us) / len(us), 3),
+        "p50_us": round(percentile(us, 0.50), 3),
+        "p95_us": round(percentile(us, 0.95), 3),
+        "p99_us": round(percentile(us, 0.99), 3),
+        "ops_per_sec": round(len(us) / elapsed_s, 1),
+    }
+
+
+def run_direct(case: Case, iterations: int, warmup: int) -> Dict[str, float]:
+    func: Callable[..., str] = getattr(server, case.tool)
+    arguments = itertools.cycle(case.arguments)
+    for _ in range(warmup):
+        func(**next(arguments))
+    latencies = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for _ in range(iterations):
+        kwargs = next(arguments)
+        t0 = clock()
+        func(**kwargs)
+        latencies.append(clock() - t0)
+    return summarize(latencies, (clock() - started) / 1e9)
+
+
+async def run_client_cases(cases: Sequence[Case], iterations: int, warmup: int) -> Dict[str, Dict[str, float]]:
+    from fastmcp import Client
+
+    results = {}
+    async with Client(server.mcp) as client:
+        for case in cases:
+            arguments = itertools.cycle(case.arguments)
+            for _ in range(warmup):
+                await client.call_tool(case.tool, next(arguments), raise_on_error=False)
+            latencies = []
+            clock = time.perf_counter_ns
+            started = clock()
+            for _ in range(iterations):
+                kwargs = next(arguments)
+                t0 = clock()
+                await client.call_tool(case.tool, kwargs, raise_on_error=False)
+                latencies.append(clock() - t0)
+            results[f"client/{case.name}"] = summarize(latencies, (clock() - started) / 1e9)
+    return results
+
+
+def run_suite(
+    iterations: int = 2000,
+    client_iterations: int = 200,
+    warmup: int = 50,
+    client: bool = True,
+    only: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Run every case directly (and through the FastMCP client).
+
+    Returns:
+        {"meta": {...}, "results": {"direct/<case>": stats, "client/<case>": stats}}
+    """
+    cases = [c for c in build_cases() if only is None or only in c.name]
+    results = {f"direct/{case.name}": run_direct(case, iterations, warmup) for case in cases}
+    if client:
+        results.update(asyncio.run(run_client_cases(cases, client_iterations, min(warmup, 10))))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "iterations": iterations,
+            "client_iterations": client_iterations if client else 0,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+    metric: str = "p50_us",
+    min_delta_us: float = DEFAULT_MIN_DELTA_US
+) -> List[Dict[str, Any]]:
+    """
+    Compare results against a baseline.
+
+    Returns:
+        One row per benchmark present in both, with the change ratio and
+        whether it regressed: more than threshold slower (e.g. 0.25 = 25%)
+        and by more than min_delta_us
+    """
+    rows = []
+    for name, stats in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or not before.get(metric):
+            continue
+        ratio = stats[metric] / before[metric]
+        rows.append({
+            "name": name,
+            "baseline": before[metric],
+            "current": stats[metric],
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + threshold and stats[metric] - before[metric] > min_delta_us,
+        })
+    return rows
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f"{'benchmark':<40} {'p50 µs':>10} {'p95 µs':>10} {'p99 µs':>10} {'ops/s':>12}")
+    for name, stats in results["results"].items():
+        print(f"{name:<40} {stats['p50_us']:>10.2f} {stats['p95_us']:>10.2f} "
+              f"{stats['p99_us']:>10.2f} {stats['ops_per_sec']:>12,.0f}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every MCP tool")
+    parser.add_argument("--iterations", type=int, default=2000, help="Direct calls per case")
+    parser.add_argument("--client-iterations", type=int, default=200, help="Client calls per case")
+    parser.add_argument("--no-client", action="store_true", help="Skip the in-process FastMCP client")
+    parser.add_argument("--only", help="Only run cases whose name contains this text")
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Allowed slowdown before failing (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--metric", choices=METRICS, default="p50_us", help="Metric to gate on")
+    parser.add_argument("--min-delta-us", type=float, default=DEFAULT_MIN_DELTA_US,
+                        help=f"Ignore slowdowns smaller than this (default: {DEFAULT_MIN_DELTA_US})")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.iterations, args.client_iterations, client=not args.no_client, only=args.only)
+    print_results(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    rows = compare(results, json.loads(args.baseline.read_text()), args.threshold, args.metric,
+                   args.min_delta_us)
+    regressions = [row for row in rows if row["regressed"]]
+    print(f"\nCompared {len(rows)} benchmarks on {args.metric} (threshold +{args.threshold:.0%})")
+    for row in regressions:
+        print(f"  REGRESSION {row['name']}: {row['baseline']:.2f} -> {row['current']:.2f} µs "
+              f"({row['ratio']:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
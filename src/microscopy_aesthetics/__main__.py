@@ -0,0 +1,8 @@
+"""python -m microscopy_aesthetics: same commands as the microscopy-server script."""
+
+import sys
+
+from microscopy_aesthetics.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
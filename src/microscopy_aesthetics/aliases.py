@@ -0,0 +1,142 @@
+"""
+Resolution of microscopy type names: exact keys, aliases and near misses.
+
+Every profile key, display name and entry of a profile's optional `aliases`
+list is folded to an alias key (lowercase alphanumeric words joined by "_",
+without NOISE_WORDS, so "Phase-Contrast", "phase contrast microscopy" and
+"PHASE_CONTRAST" agree) and stored in one dict: exact and alias hits are a
+single lookup. Anything else goes to
+a trigram index over the same names plus each profile's `style` phrases.
+Candidates come from the posting lists of the query's rarer trigrams only
+(lists longer than COMMON_POSTINGS, e.g. for a word every display name
+shares, are skipped while a rarer trigram exists), so a lookup touches the
+few names sharing trigrams with it rather than every profile. Candidates
+are scored by Dice similarity of trigram sets. A clear best
+match resolves; otherwise the best candidates are offered as suggestions.
+Results for names seen before are memoized.
+"""
+
+import re
+from itertools import chain
+from typing import Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+# A fuzzy match resolves when it scores at least this and beats the best
+# other type by FUZZY_MARGIN; candidates scoring FUZZY_SUGGEST are suggested
+FUZZY_ACCEPT = 0.6
+FUZZY_MARGIN = 0.15
+FUZZY_SUGGEST = 0.3
+# Style phrases describe a look rather than name a type, so they rank lower
+STYLE_WEIGHT = 0.85
+MAX_SUGGESTIONS = 3
+# Trigrams on more names than this do not bring in candidates by themselves
+COMMON_POSTINGS = 256
+# Distinct unresolved names remembered before the memo starts over
+MEMO_SIZE = 4096
+
+# Words any type could carry, dropped so "Confocal Microscopy" is "confocal"
+# and "microscopy" alone names nothing
+NOISE_WORDS = frozenset({"microscopy", "microscope", "microscopic", "imaging"})
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def alias_key(name: str) -> str:
+    """Fold a type name to the form aliases are stored under."""
+    return "_".join(word for word in _NON_ALNUM.split(name.lower()) if word and word not in NOISE_WORDS)
+
+
+def trigrams(name: str) -> Set[str]:
+    """Character trigrams of each word, padded so word starts and ends count."""
+    grams = set()
+    for word in alias_key(name).split("_"):
+        if word:
+            padded = f"  {word} "
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TypeIndex:
+    """
+    Alias table and trigram index for one profile set.
+
+    Profile keys always win over aliases, and display names over declared
+    aliases; among equal kinds the first profile declaring a name keeps it.
+    """
+
+    def __init__(self, profiles: Mapping[str, Mapping]):
+        self._aliases: Dict[str, str] = {}
+        # (type, weight, trigrams) per indexed name
+        self._names: List[Tuple[str, float, FrozenSet[str]]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._memo: Dict[str, Optional[str]] = {}
+
+        names = chain(
+            ((key, key) for key in profiles),
+            ((profile["display_name"], key) for key, profile in profiles.items()),
+            ((alias, key) for key, profile in profiles.items() for alias in profile.get("aliases", ())),
+        )
+        for name, key in names:
+            folded = alias_key(name)
+            if folded:
+                self._aliases.setdefault(folded, key)
+
+        for alias, key in self._aliases.items():
+            self._add(alias, key, 1.0)
+        for key, profile in profiles.items():
+            for phrase in profile.get("style", ()):
+                self._add(phrase, key, STYLE_WEIGHT)
+
+    def _add(self, name: str, microscopy_type: str, weight: float) -> None:
+        grams = trigrams(name)
+        if not grams:
+            return
+        index = len(self._names)
+        self._names.append((microscopy_type, weight, frozenset(grams)))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(index)
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def canonical(self, name: str) -> Optional[str]:
+        """The type a key, display name or alias names, or None."""
+        return self._aliases.get(alias_key(name))
+
+    def ranked(self, name: str) -> List[Tuple[str, float]]:
+        """(type, similarity) for every type sharing a trigram with name, best first."""
+        grams = trigrams(name)
+        postings = [p for p in map(self._postings.get, grams) if p]
+        rare = [p for p in postings if len(p) <= COMMON_POSTINGS]
+        candidates = set(chain.from_iterable(rare or postings))
+        scores: Dict[str, float] = {}
+        for index in candidates:
+            microscopy_type, weight, indexed = self._names[index]
+            score = weight * 2 * len(grams & indexed) / (len(grams) + len(indexed))
+            if score > scores.get(microscopy_type, 0.0):
+                scores[microscopy_type] = score
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    def suggestions(self, name: str, limit: int = MAX_SUGGESTIONS) -> List[str]:
+        """Types worth offering for a name that did not resolve."""
+        return [t for t, score in self.ranked(name)[:limit] if score >= FUZZY_SUGGEST]
+
+    def resolve(self, name: str) -> Optional[str]:
+        """
+        The type a name refers to: exact or alias match, else a clear fuzzy
+        match. None when nothing matches clearly.
+        """
+        try:
+            return self._memo[name]
+        except KeyError:
+            pass
+        resolved = self.canonical(name)
+        if resolved is None:
+            ranked = self.ranked(name)
+            if ranked and ranked[0][1] >= FUZZY_ACCEPT and (
+                len(ranked) == 1 or ranked[0][1] - ranked[1][1] >= FUZZY_MARGIN
+            ):
+                resolved = ranked[0][0]
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[name] = resolved
+        return resolved
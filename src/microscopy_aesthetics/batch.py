@@ -0,0 +1,284 @@
+"""
+Batch enhancement: many prompts per call instead of one MCP round trip each.
+
+Items are validated and enhanced in a single pass and results keep input order.
+Responses are capped at a byte budget. When a batch does not fit, the items
+not yet returned are spooled to a file under the cache directory and the
+response carries a cursor; calls with the cursor alone continue from there,
+so the items are sent once however many responses a batch takes. Spool
+files are shared by every server process on the host, so a follow-up call
+may land on any worker; they are removed when the batch completes, or after
+SPOOL_TTL seconds without a call. The response also reports next_offset, the
+index to resend from if no cursor could be kept.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from microscopy_aesthetics.blending import blend_spec
+from microscopy_aesthetics.enhancement import (
+    DEFAULT_COLOR_PALETTE,
+    DEFAULT_MAGNIFICATION,
+    SuffixTable,
+    compose,
+)
+
+# Keep responses comfortably under common MCP client message limits
+MAX_RESPONSE_BYTES = 4 * 1024 * 1024
+
+OUTPUT_FORMATS = ("json", "jsonl")
+
+ITEM_FIELDS = ("base_prompt", "microscopy_type", "magnification", "color_palette", "aesthetic_strength")
+
+# (index, enhanced_prompt, error) - exactly one of enhanced_prompt / error is set
+ItemResult = Tuple[int, Optional[str], Optional[str]]
+
+# Record separators of each output format
+SEPARATORS = {"json": ", ", "jsonl": "\n"}
+
+# Seconds a spooled batch is kept after its last call
+SPOOL_TTL = 3600
+
+# <batch id>-<index of the next item>-<its byte position in the spool file>
+_CURSOR = re.compile(r"^([0-9a-f]{32})-([0-9]{1,18})-([0-9]{1,18})$")
+
+
+def enhance_item(table: SuffixTable, item: Any) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Validate and enhance one batch item.
+
+    Args:
+        table: Compiled suffix table for the current profile set
+        item: Mapping with base_prompt and microscopy_type (a type, blend
+            string or {type: weight} object), plus optional magnification,
+            color_palette and aesthetic_strength
+
+    Returns:
+        (enhanced_prompt, None) on success, (None, error message) otherwise
+    """
+    if not isinstance(item, Mapping):
+        return None, "Item must be an object"
+    for field in ITEM_FIELDS[:2]:
+        if field not in item:
+            return None, f"Missing required field '{field}'"
+    for field in ITEM_FIELDS:
+        if field in item and not isinstance(item[field], str):
+            if field == "microscopy_type" and isinstance(item[field], Mapping):
+                continue
+            return None, f"Field '{field}' must be a string"
+
+    microscopy_type = blend_spec(item["microscopy_type"])
+    entry = table.lookup(
+        microscopy_type,
+        item.get("magnification", DEFAULT_MAGNIFICATION),
+        item.get("color_palette", DEFAULT_COLOR_PALETTE),
+        item.get("aesthetic_strength", "balanced"),
+    )
+    if entry is None:
+        return None, table.unknown_message(microscopy_type)
+    return compose(item["base_prompt"], *entry), None
+
+
+def iter_results(table: SuffixTable, items: Iterable[Any], start: int = 0) -> Iterator[ItemResult]:
+    """Enhance items lazily, yielding (index, enhanced_prompt, error) in input order."""
+    for index, item in enumerate(items, start):
+        enhanced, error = enhance_item(table, item)
+        yield index, enhanced, error
+
+
+def items_from_prompts(prompts: Iterable[Any], config: Mapping[str, str]) -> Iterator[Dict[str, Any]]:
+    """Expand a list of base prompts sharing one configuration into batch items."""
+    for prompt in prompts:
+        item = dict(config)
+        item["base_prompt"] = prompt
+        yield item
+
+
+def result_record(index: int, enhanced: Optional[str], error: Optional[str]) -> Dict[str, Any]:
+    """Output record for one item."""
+    if error is not None:
+        return {"index": index, "error": error}
+    return {"index": index, "enhanced_prompt": enhanced}
+
+
+def envelope_bytes(output_format: str) -> int:
+    """
+    Bytes a response adds around its records: the summary, with the widest
+    values it can hold, and the JSON brackets or the newline before the
+    JSON Lines summary.
+    """
+    widest = 10 ** 18 - 1
+    summary = {"count": sys.maxsize, "errors": sys.maxsize, "next_offset": sys.maxsize,
+               "cursor": f"{uuid.UUID(int=0).hex}-{widest}-{widest}"}
+    if output_format == "jsonl":
+        return len(json.dumps({"summary": summary})) + len(SEPARATORS["jsonl"])
+    return len(json.dumps(summary)) - 1 + len(', "results": []}')
+
+
+class BatchSpool:
+    """
+    Items of unfinished batches, kept on disk between calls.
+
+    Each batch is one JSON Lines file of its remaining items. A cursor names
+    the file and the byte position of the next item, so resuming reads only
+    what is left.
+
+    Args:
+        directory: Where spool files live (created on first use)
+        ttl: Seconds an unused spool file is kept
+    """
+
+    def __init__(self, directory: Path, ttl: float = SPOOL_TTL):
+        self.directory = Path(directory)
+        self.ttl = ttl
+
+    def _path(self, batch_id: str) -> Path:
+        return self.directory / f"{batch_id}.jsonl"
+
+    def save(self, start: int, items: Iterable[Any]) -> str:
+        """
+        Spool items, the first of which has index `start`, and return the
+        cursor of the first one.
+
+        Raises:
+            OSError: If the spool directory is not writable
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._expire()
+        batch_id = uuid.uuid4().hex
+        path = self._path(batch_id)
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False, default=repr))
+                f.write("\n")
+        tmp.replace(path)
+        return f"{batch_id}-{start}-0"
+
+    def open(self, cursor: str) -> Optional["SpooledItems"]:
+        """The items left at a cursor, or None for an unknown or expired one."""
+        match = _CURSOR.match(cursor)
+        if match is None:
+            return None
+        batch_id, start, position = match.group(1), int(match.group(2)), int(match.group(3))
+        path = self._path(batch_id)
+        try:
+            # Keeps a batch that is still being read from expiring
+            os.utime(path)
+        except OSError:
+            return None
+        return SpooledItems(batch_id, path, start, position)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        for path in self.directory.glob("*.jsonl"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass  # Removed by another process meanwhile
+
+
+class SpooledItems:
+    """Spooled items from a cursor on, read one line at a time."""
+
+    def __init__(self, batch_id: str, path: Path, start: int, position: int):
+        self.batch_id = batch_id
+        self.path = path
+        self.start = start
+        self._position = position
+        self._line_start = position
+
+    def __iter__(self) -> Iterator[Any]:
+        with open(self.path, "rb") as f:
+            f.seek(self._position)
+            while True:
+                self._line_start = f.tell()
+                line = f.readline()
+                if not line:
+                    return
+                yield json.loads(line)
+
+    def cursor(self, index: int) -> str:
+        """Cursor of the item yielded last, which has index `index`."""
+        return f"{self.batch_id}-{index}-{self._line_start}"
+
+    def finish(self) -> None:
+        """Remove the spool file once every item has been returned."""
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def run_batch(
+    table: SuffixTable,
+    items: Iterable[Any],
+    offset: int = 0,
+    output_format: str = "json",
+    max_response_bytes: int = MAX_RESPONSE_BYTES,
+    spool: Optional[BatchSpool] = None
+) -> str:
+    """
+    Enhance items[offset:] and serialize the results.
+
+    Serialization stops before the response, separators and summary
+    included, would exceed max_response_bytes; the unprocessed remainder is
+    reported via next_offset and, when `spool` is given, kept there behind
+    a cursor. The first record is always included, so a single oversized
+    result can exceed the cap.
+
+    Args:
+        items: Batch items, or SpooledItems read back from a cursor (offset
+            is then ignored and indexes continue from the cursor's)
+
+    Returns:
+        A JSON object with count/errors/next_offset/cursor/results, or JSON
+        Lines with one record per item followed by a summary line
+    """
+    records: List[str] = []
+    size = envelope_bytes(output_format)
+    separator = len(SEPARATORS[output_format])
+    errors = 0
+    next_offset = None
+    cursor = None
+
+    if isinstance(items, SpooledItems):
+        source = iter(items)
+        numbered = enumerate(source, items.start)
+    else:
+        source = islice(items, offset, None)
+        numbered = enumerate(source, offset)
+    for index, item in numbered:
+        enhanced, error = enhance_item(table, item)
+        line = json.dumps(result_record(index, enhanced, error), ensure_ascii=False)
+        size += len(line.encode("utf-8")) + (separator if records else 0)
+        if size > max_response_bytes and records:
+            next_offset = index
+            if isinstance(items, SpooledItems):
+                cursor = items.cursor(index)
+            elif spool is not None:
+                try:
+                    cursor = spool.save(index, chain([item], source))
+                except OSError:
+                    cursor = None  # Resuming falls back to next_offset
+            break
+        records.append(line)
+        errors += error is not None
+    else:
+        if isinstance(items, SpooledItems):
+            items.finish()
+
+    summary = {"count": len(records), "errors": errors, "next_offset": next_offset, "cursor": cursor}
+    if output_format == "jsonl":
+        records.append(json.dumps({"summary": summary}))
+        return SEPARATORS["jsonl"].join(records)
+    head = json.dumps(summary)[:-1]
+    return f'{head}, "results": [{SEPARATORS["json"].join(records)}]}}'
@@ -0,0 +1,411 @@
+"""
+Weighted blends of microscopy types, e.g. {"confocal": 0.7, "darkfield": 0.3}.
+
+A blend is merged into one profile-shaped mapping and then compiled like any
+single type. Phrases are drawn from the member types in proportion to their
+weights by Sainte-Lague apportionment (each next phrase goes to the member
+with the highest weight / (2 * phrases_taken + 1)), so a 0.3 share gets its
+first phrase second rather than last. Characteristic slots are apportioned
+across fields in the order build_suffix() fills them; the color palette and
+magnification phrases join the first phrase of each member among the first
+PHRASE_SLOTS picks. Duplicate phrases are dropped. A blend of one type
+merges to exactly that type's profile.
+
+Blends are written as a mapping or as "confocal:0.7+darkfield:0.3" (weights
+default to 1 and are normalized to sum to 1, rounded to WEIGHT_DIGITS). The
+canonical form of that string names the blend wherever a microscopy type is
+accepted. BlendSuffixTable keeps merged profiles, their compiled suffixes
+and variant spaces per blend in a bounded LRU, so a repeated blend costs the
+same dictionary lookups as a single type.
+"""
+
+import functools
+import math
+import threading
+from collections import OrderedDict, deque
+from itertools import chain
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from microscopy_aesthetics.aliases import TypeIndex
+from microscopy_aesthetics.enhancement import (
+    DEFAULT_COLOR_PALETTE,
+    DEFAULT_MAGNIFICATION,
+    SuffixEntry,
+    SuffixKey,
+    SuffixTable,
+    normalize_type,
+    unknown_type_message,
+)
+from microscopy_aesthetics.matching import VOCABULARY_FIELDS
+from microscopy_aesthetics.variants import VariantSpace
+
+MEMBER_SEPARATOR = "+"
+WEIGHT_SEPARATOR = ":"
+WEIGHT_DIGITS = 3
+# Members whose palette and magnification phrases are joined into one
+PHRASE_SLOTS = 2
+# Characteristic fields in the order build_suffix() fills its slots
+CHARACTERISTIC_SLOTS = ("structure", "structure", "material", "color", "texture", "composition", "style")
+# Blends kept compiled per profile-set version
+BLEND_CACHE_SIZE = 256
+
+# ((microscopy_type, weight), ...) heaviest first, weights summing to 1
+Blend = Tuple[Tuple[str, float], ...]
+
+
+class BlendError(ValueError):
+    """A blend names an unknown type or has an invalid weight."""
+
+
+def is_blend(microscopy_type: str) -> bool:
+    """Whether a normalized microscopy type is written as a blend."""
+    return MEMBER_SEPARATOR in microscopy_type or WEIGHT_SEPARATOR in microscopy_type
+
+
+def blend_spec(microscopy_type: Union[str, Mapping[str, Any]]) -> str:
+    """Normalize a microscopy type, blend string or {type: weight} mapping to a lookup string."""
+    if isinstance(microscopy_type, Mapping):
+        items = tuple(microscopy_type.items())
+        try:
+            return _mapping_spec(items)
+        except TypeError:
+            # Unhashable weights; parse_blend() will reject them
+            return _mapping_spec.__wrapped__(items)
+    return normalize_type(microscopy_type)
+
+
+@functools.lru_cache(maxsize=BLEND_CACHE_SIZE)
+def _mapping_spec(items: Tuple[Tuple[Any, Any], ...]) -> str:
+    return MEMBER_SEPARATOR.join(f"{normalize_type(str(key))}{WEIGHT_SEPARATOR}{weight}" for key, weight in items)
+
+
+def parse_blend(spec: str, types: Mapping[str, Any], index: Optional[TypeIndex] = None) -> Blend:
+    """
+    Members and normalized weights of a blend string.
+
+    Args:
+        spec: Normalized blend string ("confocal:0.7+darkfield:0.3")
+        types: Known microscopy types, in profile order (ties keep this order)
+        index: Resolves members that are aliases or near misses of a type
+
+    Raises:
+        BlendError: For unknown types and weights that are not positive numbers
+    """
+    weights: Dict[str, float] = {}
+    for part in spec.split(MEMBER_SEPARATOR):
+        # normalize_type() turned spaces around the separators into underscores
+        name, separator, weight = part.partition(WEIGHT_SEPARATOR)
+        name = name.strip("_")
+        if name not in types:
+            resolved = index.resolve(name) if index is not None else None
+            if resolved is None:
+                suggestions = index.suggestions(name) if index is not None else ()
+                raise BlendError(unknown_type_message(name, types, suggestions))
+            name = resolved
+        try:
+            value = float(weight.strip("_")) if separator else 1.0
+        except ValueError:
+            value = math.nan
+        if not (value > 0 and math.isfinite(value)):
+            raise BlendError(f"Blend weight for '{name}' must be a positive number")
+        weights[name] = weights.get(name, 0.0) + value
+    total = sum(weights.values())
+    order = {name: i for i, name in enumerate(types)}
+    members = [(name, round(value / total, WEIGHT_DIGITS)) for name, value in weights.items()]
+    members.sort(key=lambda member: (-member[1], order[member[0]]))
+    # Members too light to survive rounding drop out
+    return tuple(member for member in members if member[1] > 0)
+
+
+def blend_name(blend: Blend) -> str:
+    """Canonical blend string; a single type is just its key."""
+    if len(blend) == 1:
+        return blend[0][0]
+    return MEMBER_SEPARATOR.join(f"{name}{WEIGHT_SEPARATOR}{weight:g}" for name, weight in blend)
+
+
+def apportion(blend: Blend) -> Iterator[str]:
+    """Members in Sainte-Lague order, endlessly."""
+    seats = dict.fromkeys((name for name, _ in blend), 0)
+    while True:
+        # max() keeps the first of equal quotients: the heavier member
+        name = max(blend, key=lambda member: member[1] / (2 * seats[member[0]] + 1))[0]
+        seats[name] += 1
+        yield name
+
+
+def _merge(phrases: Mapping[str, Sequence[str]], picks: Iterable[str]) -> List[str]:
+    # Every member's phrases, taken in pick order without duplicates; a pick
+    # of a member with nothing left goes to the first member that has some
+    queues = {name: deque(values) for name, values in phrases.items() if values}
+    merged: List[str] = []
+    seen = set()
+    for name in picks:
+        if not queues:
+            break
+        if name not in queues:
+            name = next(iter(queues))
+        queue = queues[name]
+        phrase = queue.popleft()
+        if not queue:
+            del queues[name]
+        if phrase not in seen:
+            seen.add(phrase)
+            merged.append(phrase)
+    return merged
+
+
+def _join(phrases: Sequence[str]) -> str:
+    if len(phrases) <= 2:
+        return " and ".join(phrases)
+    return f"{', '.join(phrases[:-1])} and {phrases[-1]}"
+
+
+def blend_profile(profiles: Mapping[str, Mapping], blend: Blend) -> Dict[str, Any]:
+    """
+    One profile-shaped mapping for a blend, accepted by build_suffix() and
+    VariantSpace like any single profile.
+    """
+    members = {name: profiles[name] for name, _ in blend}
+    slots = list(zip(CHARACTERISTIC_SLOTS, apportion(blend)))
+    leads = list(dict.fromkeys(name for _, name in zip(range(PHRASE_SLOTS), apportion(blend))))
+
+    merged: Dict[str, Any] = {
+        "display_name": _join([members[name]["display_name"] for name in members]),
+        "description": " ".join(members[name].get("description", "") for name in members).strip(),
+    }
+    for field in VOCABULARY_FIELDS:
+        phrases = {name: profile.get(field, ()) for name, profile in members.items()}
+        picks = [name for slot, name in slots if slot == field]
+        merged[field] = _merge(phrases, chain(picks, _cycle_after(blend, picks)))
+
+    palettes: Dict[str, List[str]] = {}
+    for key in dict.fromkeys(k for profile in members.values() for k in profile["color_palette"]):
+        phrases = {name: _fallback(profile["color_palette"], key, DEFAULT_COLOR_PALETTE, ())
+                   for name, profile in members.items()}
+        lead = [phrases[name][0] for name in leads if phrases[name]]
+        rest = [p for p in _merge(phrases, apportion(blend)) if p not in lead]
+        palettes[key] = [_join(lead)] + rest if lead else rest
+    merged["color_palette"] = palettes
+
+    merged["magnification_feel"] = {
+        key: _join([_fallback(members[name]["magnification_feel"], key, DEFAULT_MAGNIFICATION, "")
+                    for name in leads])
+        for key in dict.fromkeys(k for profile in members.values() for k in profile["magnification_feel"])
+    }
+    return merged
+
+
+def _cycle_after(blend: Blend, picks: Sequence[str]) -> Iterator[str]:
+    # Apportionment continuing as if picks had already been taken
+    order = apportion(blend)
+    remaining = list(picks)
+    for name in order:
+        if name in remaining:
+            remaining.remove(name)
+        else:
+            yield name
+
+
+def _fallback(section: Mapping, key: str, default: str, missing: Any) -> Any:
+    value = section.get(key)
+    if value is None:
+        value = section.get(default, missing)
+    return value
+
+
+class _Compiled(NamedTuple):
+    name: str
+    members: frozenset
+    # Merged profile and its own table; None for single-type blends, which
+    # the base table serves
+    profile: Optional[Dict[str, Any]]
+    table: Optional[SuffixTable]
+    spaces: Dict[SuffixKey, VariantSpace]
+
+
+class BlendSuffixTable(SuffixTable):
+    """
+    A SuffixTable that also resolves blends, aliases and near misses.
+
+    Any type string that is not a profile key but is written as a blend
+    resolves to a key whose first element is the blend's canonical name; the
+    merged profile and its suffixes are built on first use and kept for the
+    most recent max_blends blend strings. Other unknown strings resolve
+    through the table's TypeIndex, built on first use, to the type they name.
+    """
+
+    def __init__(self, profiles: Mapping[str, Mapping], max_blends: int = BLEND_CACHE_SIZE):
+        super().__init__(profiles)
+        self.max_blends = max_blends
+        self._blends: "OrderedDict[str, _Compiled]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._index: Optional[TypeIndex] = None
+
+    def __contains__(self, microscopy_type: str) -> bool:
+        if super().__contains__(microscopy_type):
+            return True
+        if is_blend(microscopy_type):
+            return self._compiled(microscopy_type) is not None
+        return self.canonical_type(microscopy_type) is not None
+
+    def type_index(self) -> TypeIndex:
+        """Alias table and trigram index over this table's profiles."""
+        index = self._index
+        if index is None:
+            # Building twice under a race is harmless: both indexes are equal
+            index = self._index = TypeIndex(self._profiles)
+        return index
+
+    def canonical_type(self, microscopy_type: str) -> Optional[str]:
+        """The profile key a type, display name, alias or clear near miss names, or None."""
+        if microscopy_type in self._profiles:
+            return microscopy_type
+        if is_blend(microscopy_type):
+            return None
+        return self.type_index().resolve(microscopy_type)
+
+    def _compiled(self, spec: str, strict: bool = False) -> Optional[_Compiled]:
+        compiled = self._blends.get(spec)
+        if compiled is not None:
+            try:
+                self._blends.move_to_end(spec)
+            except KeyError:
+                pass  # Evicted by another thread meanwhile
+            return compiled
+        try:
+            blend = parse_blend(spec, self._profiles, self.type_index())
+        except BlendError:
+            if strict:
+                raise
+            return None
+        name = blend_name(blend)
+        # Another spelling of a blend already merged
+        compiled = self._blends.get(name)
+        if compiled is None:
+            profile = table = None
+            if len(blend) > 1:
+                profile = blend_profile(self._profiles, blend)
+                table = SuffixTable({name: profile})
+            compiled = _Compiled(name, frozenset(member for member, _ in blend), profile, table, {})
+        with self._lock:
+            compiled = self._blends.setdefault(spec, compiled)
+            if spec != name:
+                # The canonical name is how keys, entries and variant spaces come back
+                self._blends.setdefault(name, compiled)
+            while len(self._blends) > self.max_blends:
+                self._blends.popitem(last=False)
+        return compiled
+
+    def resolve(
+        self,
+        microscopy_type: str,
+        magnification: str = DEFAULT_MAGNIFICATION,
+        color_palette: str = DEFAULT_COLOR_PALETTE,
+        aesthetic_strength: str = "balanced"
+    ) -> Optional[SuffixKey]:
+        key = super().resolve(microscopy_type, magnification, color_palette, aesthetic_strength)
+        if key is not None:
+            return key
+        if not is_blend(microscopy_type):
+            canonical = self.canonical_type(microscopy_type)
+            if canonical is None:
+                return None
+            return super().resolve(canonical, magnification, color_palette, aesthetic_strength)
+        compiled = self._compiled(microscopy_type)
+        if compiled is None:
+            return None
+        table = compiled.table if compiled.table is not None else super()
+        return table.resolve(compiled.name, magnification, color_palette, aesthetic_strength)
+
+    def lookup(
+        self,
+        microscopy_type: str,
+        magnification: str = DEFAULT_MAGNIFICATION,
+        color_palette: str = DEFAULT_COLOR_PALETTE,
+        aesthetic_strength: str = "balanced"
+    ) -> Optional[SuffixEntry]:
+        if microscopy_type in self._profiles:
+            return super().lookup(microscopy_type, magnification, color_palette, aesthetic_strength)
+        if not is_blend(microscopy_type):
+            canonical = self.canonical_type(microscopy_type)
+            if canonical is None:
+                return None
+            return super().lookup(canonical, magnification, color_palette, aesthetic_strength)
+        compiled = self._compiled(microscopy_type)
+        if compiled is None:
+            return None
+        table = compiled.table if compiled.table is not None else super()
+        return table.lookup(compiled.name, magnification, color_palette, aesthetic_strength)
+
+    def entry(self, key: SuffixKey) -> SuffixEntry:
+        entry = self._entries.get(key)
+        if entry is None:
+            compiled = self._compiled(key[0])
+            if compiled is None or compiled.table is None:
+                raise KeyError(key)
+            entry = compiled.table.entry(key)
+        return entry
+
+    def unknown_message(self, microscopy_type: str) -> str:
+        if is_blend(microscopy_type):
+            try:
+                self._compiled(microscopy_type, strict=True)
+            except BlendError as e:
+                return str(e)
+        return unknown_type_message(microscopy_type, self._profiles,
+                                    self.type_index().suggestions(microscopy_type))
+
+    def profile(self, microscopy_type: str) -> Mapping:
+        """
+        The profile a resolved key's type refers to, merged for blends.
+
+        Raises:
+            KeyError: If the type is neither a profile nor a valid blend
+        """
+        if microscopy_type in self._profiles:
+            return self._profiles[microscopy_type]
+        if not is_blend(microscopy_type):
+            canonical = self.canonical_type(microscopy_type)
+            if canonical is None:
+                raise KeyError(microscopy_type)
+            return self._profiles[canonical]
+        compiled = self._compiled(microscopy_type)
+        if compiled is None or compiled.profile is None:
+            raise KeyError(microscopy_type)
+        return compiled.profile
+
+    def blend_variant_space(self, key: SuffixKey) -> VariantSpace:
+        """Variant space of a blend key returned by resolve(), kept with the blend."""
+        compiled = self._compiled(key[0])
+        if compiled is None or compiled.profile is None:
+            raise KeyError(key)
+        space = compiled.spaces.get(key)
+        if space is None:
+            _, magnification, color_palette, num = key
+            space = compiled.spaces[key] = VariantSpace(compiled.profile, magnification, color_palette, num)
+        return space
+
+    def derive(self, profiles: Mapping[str, Mapping], changed: AbstractSet[str]) -> "BlendSuffixTable":
+        table = super().derive(profiles, changed)
+        table.max_blends = self.max_blends
+        if self._index is not None:
+            # The old table needed its index, so build the new one now rather than on a request
+            table.type_index()
+        for spec, compiled in list(self._blends.items()):
+            if not compiled.members & changed and all(member in profiles for member in compiled.members):
+                table._blends[spec] = compiled
+        return table
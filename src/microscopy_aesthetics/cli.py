@@ -0,0 +1,334 @@
+"""
+Command line interface: run the MCP server or bulk-enhance prompt dumps offline.
+
+    microscopy-server                                    # serve MCP over stdio
+    microscopy-server serve --transport http --workers 4 # HTTP, 4 processes behind a dispatcher
+    microscopy-server enhance dump.jsonl -o out.jsonl --workers 4
+    cat prompts.csv | microscopy-server enhance --format csv -t confocal > out.csv
+
+The enhance pipeline streams records in fixed-size chunks, so memory stays
+constant regardless of input size. Chunks are enhanced in-process or spread
+across a process pool, and written out in input order as they complete.
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, TextIO, Tuple
+
+from microscopy_aesthetics.batch import ITEM_FIELDS, enhance_item
+from microscopy_aesthetics.blending import BlendSuffixTable
+
+FORMATS = ("jsonl", "csv")
+TRANSPORTS = ("stdio", "http", "sse")
+OUTPUT_FIELDS = ("enhanced_prompt", "error")
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+_table: Optional[BlendSuffixTable] = None
+
+
+class PipelineStats(NamedTuple):
+    """Totals reported when a pipeline run finishes."""
+    records: int
+    errors: int
+    seconds: float
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.seconds if self.seconds > 0 else 0.0
+
+
+def _suffix_table() -> BlendSuffixTable:
+    # Built once per process, so pool workers pay for it only on their first chunk.
+    # Reads profiles through its own store rather than the server module, so
+    # offline runs and pool workers never import fastmcp.
+    global _table
+    if _table is None:
+        from microscopy_aesthetics.store import ProfileStore
+        _table = BlendSuffixTable(ProfileStore())
+    return _table
+
+
+def _enhance_jsonl(lines: Sequence[str], defaults: Dict[str, str]) -> Tuple[str, int, int]:
+    table = _suffix_table()
+    out = []
+    errors = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            record, enhanced, error = {"input": line.rstrip("\r\n")}, None, f"Invalid JSON: {e}"
+        else:
+            if isinstance(record, dict):
+                enhanced, error = enhance_item(table, {**defaults, **record})
+            else:
+                record, enhanced, error = {"input": record}, None, "Record must be an object"
+        if error is None:
+            record["enhanced_prompt"] = enhanced
+        else:
+            record["error"] = error
+            errors += 1
+        out.append(json.dumps(record, ensure_ascii=False))
+    out.append("")
+    return "\n".join(out), len(lines), errors
+
+
+def _enhance_csv(
+    rows: Sequence[Dict[str, Any]],
+    defaults: Dict[str, str],
+    fieldnames: Sequence[str]
+) -> Tuple[str, int, int]:
+    table = _suffix_table()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames, extrasaction="ignore")
+    errors = 0
+    for row in rows:
+        item = dict(defaults)
+        # Empty cells fall back to the command line defaults
+        item.update((k, v) for k, v in row.items() if k in ITEM_FIELDS and v)
+        enhanced, error = enhance_item(table, item)
+        if error is None:
+            row["enhanced_prompt"] = enhanced
+        else:
+            row["error"] = error
+            errors += 1
+        writer.writerow(row)
+    return buffer.getvalue(), len(rows), errors
+
+
+def process_chunk(task: Tuple[str, List[Any], Dict[str, str], Sequence[str]]) -> Tuple[str, int, int]:
+    """
+    Enhance one chunk of records.
+
+    Args:
+        task: (format, records, defaults, csv fieldnames) - module level and
+            picklable so it can run in a worker process
+
+    Returns:
+        (serialized output, record count, error count)
+    """
+    fmt, records, defaults, fieldnames = task
+    if fmt == "csv":
+        return _enhance_csv(records, defaults, fieldnames)
+    return _enhance_jsonl(records, defaults)
+
+
+def _chunked(records: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def enhance_stream(
+    in_stream: TextIO,
+    out_stream: TextIO,
+    fmt: str = "jsonl",
+    defaults: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> PipelineStats:
+    """
+    Enhance every record read from in_stream and write results to out_stream.
+
+    JSONL records are objects with the enhance_prompt_with_microscopy
+    arguments; CSV input needs a header row naming them. Fields missing from a
+    record are taken from defaults. Output records repeat the input fields
+    plus enhanced_prompt or error.
+
+    Args:
+        in_stream: Text stream to read records from
+        out_stream: Text stream to write results to
+        fmt: jsonl or csv
+        defaults: Argument values for fields a record leaves out
+        workers: Worker processes; 1 enhances in the current process
+        chunk_size: Records per chunk handed to a worker
+
+    Returns:
+        Record count, error count and elapsed time
+    """
+    defaults = dict(defaults or {})
+    started = time.perf_counter()
+
+    if fmt == "csv":
+        reader = csv.DictReader(in_stream)
+        fieldnames = list(reader.fieldnames or [])
+        fieldnames += [f for f in OUTPUT_FIELDS if f not in fieldnames]
+        csv.DictWriter(out_stream, fieldnames).writeheader()
+        records: Iterable[Any] = reader
+    else:
+        fieldnames = []
+        records = (line for line in in_stream if line.strip())
+
+    tasks = ((fmt, chunk, defaults, fieldnames) for chunk in _chunked(records, chunk_size))
+    total = errors = 0
+
+    if workers <= 1:
+        for output, count, failed in map(process_chunk, tasks):
+            out_stream.write(output)
+            total += count
+            errors += failed
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Bound in-flight chunks so memory stays constant while keeping output ordered
+        with ProcessPoolExecutor(workers) as pool:
+            pending: deque = deque()
+            for task in tasks:
+                pending.append(pool.submit(process_chunk, task))
+                if len(pending) >= workers * 2:
+                    output, count, failed = pending.popleft().result()
+                    out_stream.write(output)
+                    total += count
+                    errors += failed
+            while pending:
+                output, count, failed = pending.popleft().result()
+                out_stream.write(output)
+                total += count
+                errors += failed
+
+    out_stream.flush()
+    return PipelineStats(total, errors, time.perf_counter() - started)
+
+
+def _open_input(path: str, buffer_size: int) -> TextIO:
+    if path == "-":
+        return io.TextIOWrapper(io.BufferedReader(sys.stdin.buffer, buffer_size),
+                                encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="", buffering=buffer_size)
+
+
+def _open_output(path: str, buffer_size: int) -> TextIO:
+    if path == "-":
+        return io.TextIOWrapper(io.BufferedWriter(sys.stdout.buffer, buffer_size),
+                                encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="", buffering=buffer_size)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="microscopy-server",
+        description="Microscopy aesthetics MCP server and bulk prompt enhancer"
+    )
+    commands = parser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="Run the MCP server (default: over stdio)")
+    serve.add_argument("--transport", choices=TRANSPORTS, default="stdio",
+                       help="MCP transport (default: stdio)")
+    serve.add_argument("--host", default="127.0.0.1", help="HTTP address (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8000, help="HTTP port (default: 8000)")
+    serve.add_argument("--socket", help="Serve HTTP on this Unix socket instead of a TCP port")
+    serve.add_argument("--workers", type=int, default=1,
+                       help="Worker processes behind a local dispatcher (http transport only)")
+    serve.add_argument("--stateless", action="store_true",
+                       help="Stateless HTTP: no MCP sessions, JSON responses")
+
+    enhance = commands.add_parser("enhance", help="Enhance a JSONL or CSV prompt dump")
+    enhance.add_argument("input", nargs="?", default="-", help="Input file (default: stdin)")
+    enhance.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    enhance.add_argument("--format", choices=FORMATS,
+                         help="Record format (default: from the input extension, else jsonl)")
+    enhance.add_argument("-t", "--microscopy-type",
+                         help='Default microscopy type or blend (e.g. "confocal:0.7+darkfield:0.3")')
+    enhance.add_argument("--magnification", help="Default magnification")
+    enhance.add_argument("--color-palette", help="Default color palette")
+    enhance.add_argument("--aesthetic-strength", help="Default aesthetic strength")
+    enhance.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+    enhance.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                         help=f"Records per chunk (default: {DEFAULT_CHUNK_SIZE})")
+    enhance.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE,
+                         help=f"I/O buffer size in bytes (default: {DEFAULT_BUFFER_SIZE})")
+    enhance.add_argument("-q", "--quiet", action="store_true", help="Do not print the summary")
+    return parser
+
+
+def run_enhance(args: argparse.Namespace) -> int:
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    defaults = {
+        field: value for field, value in (
+            ("microscopy_type", args.microscopy_type),
+            ("magnification", args.magnification),
+            ("color_palette", args.color_palette),
+            ("aesthetic_strength", args.aesthetic_strength),
+        ) if value is not None
+    }
+
+    in_stream = _open_input(args.input, args.buffer_size)
+    out_stream = _open_output(args.output, args.buffer_size)
+    try:
+        stats = enhance_stream(in_stream, out_stream, fmt, defaults, args.workers, args.chunk_size)
+    finally:
+        if args.input != "-":
+            in_stream.close()
+        if args.output != "-":
+            out_stream.close()
+
+    if not args.quiet:
+        print(
+            f"{stats.records} records, {stats.errors} errors in {stats.seconds:.2f}s "
+            f"({stats.records_per_second:,.0f} records/s)",
+            file=sys.stderr
+        )
+    return 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    transport = getattr(args, "transport", "stdio")
+    workers = getattr(args, "workers", 1)
+    if workers > 1:
+        if transport != "http":
+            print("Error: --workers needs --transport http", file=sys.stderr)
+            return 2
+        from microscopy_aesthetics.dispatch import serve_sharded
+        return serve_sharded(workers, args.host, args.port, args.socket)
+
+    # fastmcp and the tool modules are only imported when serving
+    from microscopy_aesthetics.metrics import METRICS, start_exporter_from_env
+    from microscopy_aesthetics.profiling import PROFILER, start_report_writer_from_env
+    from microscopy_aesthetics.server import PROFILE_SNAPSHOTS, mcp
+    from microscopy_aesthetics.snapshot import start_watcher_from_env
+    start_exporter_from_env(METRICS)
+    start_report_writer_from_env(PROFILER)
+    start_watcher_from_env(PROFILE_SNAPSHOTS)
+    if transport == "stdio":
+        # The banner goes to stderr of a stdio child nobody reads, and costs startup time
+        mcp.run(show_banner=False)
+        return 0
+
+    # No per-request access log: it costs more than most tool calls
+    options: Dict[str, Any] = {"transport": transport, "show_banner": False,
+                               "uvicorn_config": {"access_log": False}}
+    if args.stateless:
+        if transport == "sse":
+            print("Error: --stateless needs --transport http", file=sys.stderr)
+            return 2
+        options.update(stateless_http=True, json_response=True)
+    if args.socket:
+        import os
+        import socket
+
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(args.socket)
+        options["sockets"] = [listener]
+    else:
+        options.update(host=args.host, port=args.port)
+    mcp.run(**options)
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "enhance":
+        return run_enhance(args)
+    return run_serve(args)
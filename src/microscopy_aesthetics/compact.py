@@ -0,0 +1,220 @@
+"""
+Compact, immutable profile representation for large catalogs.
+
+Profiles repeat the same phrases across fields and types, and a nested dict
+of lists costs far more than the text it holds. A CompactProfile keeps one
+array of indexes into a shared, interned VocabularyTable, plus a layout
+(field names and shapes) shared by every profile with the same structure.
+It reads like the original dict: list fields come back as tuples and nested
+fields as read-only mappings, and as_dict() rebuilds the plain JSON shape.
+"""
+
+import threading
+from array import array
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+# Layout entry kinds
+SCALAR = 0          # field: "text"
+LIST = 1            # field: ["text", ...]
+SECTION_SCALAR = 2  # field: {subkey: "text"}
+SECTION_LIST = 3    # field: {subkey: ["text", ...]}
+EMPTY_SECTION = 4   # field: {}
+
+LayoutEntry = Tuple[str, Optional[str], int]
+
+
+class VocabularyTable:
+    """Append-only table of distinct phrases, shared by many profiles."""
+
+    __slots__ = ("_phrases", "_indexes", "_layouts", "_lock")
+
+    def __init__(self):
+        self._phrases: List[str] = []
+        self._indexes: Dict[str, int] = {}
+        self._layouts: Dict[Tuple[LayoutEntry, ...], "Layout"] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    def __getitem__(self, index: int) -> str:
+        return self._phrases[index]
+
+    def intern(self, phrase: str) -> int:
+        """Index of phrase, adding it on first sight."""
+        index = self._indexes.get(phrase)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(phrase)
+                if index is None:
+                    index = len(self._phrases)
+                    self._phrases.append(phrase)
+                    self._indexes[phrase] = index
+        return index
+
+    def layout(self, entries: Tuple[LayoutEntry, ...]) -> "Layout":
+        """Shared Layout for a profile structure."""
+        layout = self._layouts.get(entries)
+        if layout is None:
+            layout = self._layouts.setdefault(entries, Layout(entries))
+        return layout
+
+
+class Layout:
+    """Field structure shared by every profile shaped the same way."""
+
+    __slots__ = ("entries", "fields")
+
+    def __init__(self, entries: Tuple[LayoutEntry, ...]):
+        self.entries = entries
+        # field -> positions of its entries, in field order
+        self.fields: Dict[str, Tuple[int, ...]] = {}
+        for position, (field, _, _) in enumerate(entries):
+            self.fields[field] = self.fields.get(field, ()) + (position,)
+
+
+class CompactProfile(Mapping):
+    """
+    Frozen profile backed by phrase indexes into a VocabularyTable.
+
+    The data array starts with one offset per layout entry (plus an end
+    offset) followed by the phrase indexes themselves.
+    """
+
+    __slots__ = ("_table", "_layout", "_data")
+
+    def __init__(self, table: VocabularyTable, layout: Layout, data: array):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_layout", layout)
+        object.__setattr__(self, "_data", data)
+
+    @classmethod
+    def from_mapping(cls, profile: Mapping[str, Any], table: VocabularyTable) -> "CompactProfile":
+        """
+        Build a compact profile from the plain dict shape.
+
+        Raises:
+            TypeError: If a field is not text, a list of text, or a mapping of those
+        """
+        entries: List[LayoutEntry] = []
+        chunks: List[List[int]] = []
+
+        def add(field: str, subkey: Optional[str], value: Any, scalar_kind: int, list_kind: int) -> None:
+            if isinstance(value, str):
+                entries.append((field, subkey, scalar_kind))
+                chunks.append([table.intern(value)])
+            elif isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+                entries.append((field, subkey, list_kind))
+                chunks.append([table.intern(v) for v in value])
+            else:
+                name = field if subkey is None else f"{field}.{subkey}"
+                raise TypeError(f"Unsupported value for profile field '{name}'")
+
+        for field, value in profile.items():
+            if isinstance(value, Mapping) and not value:
+                entries.append((field, None, EMPTY_SECTION))
+                chunks.append([])
+            elif isinstance(value, Mapping):
+                for subkey, subvalue in value.items():
+                    add(field, subkey, subvalue, SECTION_SCALAR, SECTION_LIST)
+            else:
+                add(field, None, value, SCALAR, LIST)
+
+        offsets = [len(chunks) + 1]
+        for chunk in chunks:
+            offsets.append(offsets[-1] + len(chunk))
+        data = array("I", offsets)
+        for chunk in chunks:
+            data.extend(chunk)
+        return cls(table, table.layout(tuple(entries)), data)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("CompactProfile is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("CompactProfile is immutable")
+
+    def _entry_value(self, position: int) -> Any:
+        _, _, kind = self._layout.entries[position]
+        data = self._data
+        table = self._table
+        start, end = data[position], data[position + 1]
+        if kind == SCALAR or kind == SECTION_SCALAR:
+            return table[data[start]]
+        return tuple(table[i] for i in data[start:end])
+
+    def __getitem__(self, field: str) -> Any:
+        positions = self._layout.fields[field]
+        kind = self._layout.entries[positions[0]][2]
+        if kind == SCALAR or kind == LIST:
+            return self._entry_value(positions[0])
+        if kind == EMPTY_SECTION:
+            return MappingProxyType({})
+        return MappingProxyType({
+            self._layout.entries[p][1]: self._entry_value(p) for p in positions
+        })
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layout.fields)
+
+    def __len__(self) -> int:
+        return len(self._layout.fields)
+
+    def __contains__(self, field: object) -> bool:
+        return field in self._layout.fields
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CompactProfile):
+            return self.as_dict() == other.as_dict()
+        if isinstance(other, Mapping):
+            return self.as_dict() == _plain(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __reduce__(self):
+        # Pickle as the plain shape; the receiving process interns into its own table
+        return (_unpickle, (self.as_dict(),))
+
+    def __repr__(self) -> str:
+        return f"CompactProfile({self.as_dict()!r})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The profile in its original plain shape: dicts, lists and strings."""
+        result: Dict[str, Any] = {}
+        for position, (field, subkey, kind) in enumerate(self._layout.entries):
+            if kind == EMPTY_SECTION:
+                result[field] = {}
+                continue
+            value = self._entry_value(position)
+            if kind == LIST or kind == SECTION_LIST:
+                value = list(value)
+            if subkey is None:
+                result[field] = value
+            else:
+                result.setdefault(field, {})[subkey] = value
+        return result
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, CompactProfile):
+        return value.as_dict()
+    if isinstance(value, Mapping):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_plain(v) for v in value]
+    return value
+
+
+def plain(profile: Mapping[str, Any]) -> Dict[str, Any]:
+    """A JSON-serializable copy of a compact or plain profile."""
+    return _plain(profile)
+
+
+# Process-wide table used when profiles are not given their own
+SHARED_VOCABULARY = VocabularyTable()
+
+
+def _unpickle(profile: Dict[str, Any]) -> CompactProfile:
+    return CompactProfile.from_mapping(profile, SHARED_VOCABULARY)
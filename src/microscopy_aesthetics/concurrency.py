@@ -0,0 +1,119 @@
+"""
+Event-loop helpers for the async tool variants.
+
+BoundedExecutor runs blocking work on a fixed pool of threads and caps how
+many calls may be queued, so a burst waits for a slot instead of growing an
+unbounded backlog. SingleFlight lets concurrent identical calls share one
+computation: the first caller starts it, later callers await the same result.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+EXECUTOR_WORKERS_ENV = "MICROSCOPY_EXECUTOR_WORKERS"
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# Calls queued or running per worker thread before new callers wait
+PENDING_PER_WORKER = 16
+
+
+class BoundedExecutor:
+    """
+    Fixed thread pool with a bound on queued work.
+
+    Args:
+        max_workers: Worker threads
+        max_pending: Calls queued or running at once; further callers wait
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, max_pending: Optional[int] = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max_workers * PENDING_PER_WORKER
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # One semaphore per event loop; asyncio primitives are bound to a loop
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self.submitted = 0
+        self.waited = 0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Threads are only created once something is offloaded
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="microscopy-tool")
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) on a worker thread and return its result."""
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_pending)
+        if slots.locked():
+            self.waited += 1
+        async with slots:
+            self.submitted += 1
+            return await loop.run_in_executor(self._executor(), fn, *args)
+
+    def stats(self) -> Dict[str, int]:
+        return {"max_workers": self.max_workers, "max_pending": self.max_pending,
+                "submitted": self.submitted, "waited": self.waited}
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one computation."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Await fn(*args), or the identical call already in flight.
+
+        The computation runs as its own task, so a caller that is cancelled
+        does not cancel it for the others.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and flight.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+            return await asyncio.shield(flight)
+
+        flight = asyncio.ensure_future(fn(*args))
+        self._flights[key] = flight
+        self.started += 1
+
+        def finished(task: "asyncio.Future[Any]") -> None:
+            if self._flights.get(key) is task:
+                del self._flights[key]
+            if not task.cancelled():
+                task.exception()  # Retrieved here so nobody-left-waiting failures are not logged
+
+        flight.add_done_callback(finished)
+        return await asyncio.shield(flight)
+
+    def stats(self) -> Dict[str, int]:
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self._flights)}
+
+
+def executor_from_env() -> BoundedExecutor:
+    """Executor sized by $MICROSCOPY_EXECUTOR_WORKERS (default: up to 4 threads)."""
+    try:
+        workers = int(os.environ.get(EXECUTOR_WORKERS_ENV, DEFAULT_WORKERS))
+    except ValueError:
+        workers = DEFAULT_WORKERS
+    return BoundedExecutor(max(1, workers))
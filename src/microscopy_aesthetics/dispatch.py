@@ -0,0 +1,458 @@
+"""
+Multi-process serving: N stateless HTTP workers behind a local dispatcher.
+
+Each worker is a full server process (`microscopy-server serve --transport
+http --socket <path> --stateless`) holding its own profile data and listening
+on a private Unix socket. The dispatcher accepts client connections on TCP or
+a Unix socket, reads each HTTP/1.1 request off them and hands it to the worker
+with the fewest requests in flight, over a pool of keep-alive connections to
+that worker. Only message framing is parsed (Content-Length or chunked); the
+request and response bytes, SSE streams included, are relayed unchanged.
+Balancing per request rather than per connection keeps a few long-lived
+keep-alive clients from pinning one worker. Workers run stateless so
+consecutive requests from one MCP client may land on different workers.
+Workers that exit are restarted; a request whose worker fails before
+responding gets a 502 Bad Gateway and is never resent, since the worker may
+already have acted on it.
+
+Each worker gets its own metrics export target and profiling report
+directory (see worker_environment), so workers never share a socket or file.
+
+    microscopy-server serve --transport http --workers 4 --port 8000
+    microscopy-server serve --transport http --workers 4 --socket /run/microscopy.sock
+"""
+
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from microscopy_aesthetics.metrics import EXPORT_ENV
+from microscopy_aesthetics.profiling import DIR_ENV as PROFILING_DIR_ENV
+
+RELAY_BUFFER = 64 * 1024
+WORKER_START_TIMEOUT = 60.0
+RESTART_DELAY = 1.0
+# Keep-alive connections kept open per worker between requests
+MAX_IDLE_CONNECTIONS = 32
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+def _worker_target(target: str, index: int) -> str:
+    # metrics.prom -> metrics.worker-0.prom; unix:/run/m.sock -> unix:/run/m.worker-0.sock
+    scheme = "unix:" if target.startswith("unix:") else ""
+    path = Path(target[len(scheme):])
+    return f"{scheme}{path.with_name(f'{path.stem}.worker-{index}{path.suffix}')}"
+
+
+def worker_environment(index: int, environ: Mapping[str, str] = os.environ) -> Dict[str, str]:
+    """
+    Environment for worker `index`: the dispatcher's, with the metrics export
+    target and profiling report directory made private to the worker.
+    """
+    env = dict(environ)
+    if env.get(EXPORT_ENV):
+        env[EXPORT_ENV] = _worker_target(env[EXPORT_ENV], index)
+    if env.get(PROFILING_DIR_ENV):
+        env[PROFILING_DIR_ENV] = str(Path(env[PROFILING_DIR_ENV]) / f"worker-{index}")
+    return env
+
+
+class _Message:
+    """The head of one HTTP/1.1 request or response."""
+
+    __slots__ = ("head", "first", "headers")
+
+    def __init__(self, head: bytes):
+        self.head = head
+        lines = head[:-4].split(b"\r\n")
+        self.first = lines[0]
+        self.headers: Dict[bytes, bytes] = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(b":")
+            self.headers[name.strip().lower()] = value.strip()
+
+    def without(self, name: bytes) -> bytes:
+        """The head with every `name` header removed."""
+        lines = self.head[:-4].split(b"\r\n")
+        kept = [line for line in lines[1:] if line.partition(b":")[0].strip().lower() != name]
+        return b"\r\n".join([lines[0]] + kept) + b"\r\n\r\n"
+
+    @property
+    def chunked(self) -> bool:
+        return b"chunked" in self.headers.get(b"transfer-encoding", b"").lower()
+
+    @property
+    def length(self) -> Optional[int]:
+        value = self.headers.get(b"content-length")
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError as e:
+            raise ConnectionError("malformed Content-Length") from e
+
+    @property
+    def close(self) -> bool:
+        connection = self.headers.get(b"connection", b"").lower()
+        if self.first.endswith(b"HTTP/1.0") or self.first.startswith(b"HTTP/1.0"):
+            return b"keep-alive" not in connection
+        return b"close" in connection
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Optional[_Message]:
+    """The next message head, or None if the peer closed between messages."""
+    try:
+        return _Message(await reader.readuntil(b"\r\n\r\n"))
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ConnectionError("connection closed mid-message") from e
+        return None
+    except asyncio.LimitOverrunError as e:
+        raise ConnectionError("message head too large") from e
+
+
+async def _copy(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, size: int) -> None:
+    while size:
+        data = await reader.read(min(size, RELAY_BUFFER))
+        if not data:
+            raise ConnectionError("connection closed mid-body")
+        writer.write(data)
+        size -= len(data)
+        await writer.drain()
+
+
+async def _copy_chunked(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            writer.write(line)
+            size = int(line.split(b";", 1)[0], 16)
+            if size == 0:
+                # Trailers, up to the blank line
+                while line != b"\r\n":
+                    line = await reader.readuntil(b"\r\n")
+                    writer.write(line)
+                await writer.drain()
+                return
+            await _copy(reader, writer, size + 2)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+        raise ConnectionError("malformed chunked body") from e
+
+
+def _bad_gateway(message: str, close: bool) -> bytes:
+    body = f"{message}\n".encode()
+    head = (f"HTTP/1.1 502 Bad Gateway\r\nContent-Type: text/plain; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n")
+    if close:
+        head += "Connection: close\r\n"
+    return f"{head}\r\n".encode() + body
+
+
+class _Buffer:
+    """Collects relayed bytes so a request is read whole before a worker is chosen."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data: bytes) -> None:
+        self.parts.append(data)
+
+    async def drain(self) -> None:
+        pass
+
+
+class Worker:
+    """One server process listening on a private Unix socket."""
+
+    def __init__(self, index: int, socket_path: Path):
+        self.index = index
+        self.socket_path = socket_path
+        self.process: Optional[subprocess.Popen] = None
+        self.active = 0
+        self.requests = 0
+        self.restarts = 0
+        # Requests answered with 502 because the worker failed before responding
+        self.failures = 0
+        # Keep-alive connections not serving a request
+        self.idle: List[Connection] = []
+
+    def start(self) -> None:
+        self.close_idle()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "microscopy_aesthetics", "serve", "--transport", "http",
+             "--socket", str(self.socket_path), "--stateless"],
+            stdin=subprocess.DEVNULL,
+            env=worker_environment(self.index),
+        )
+
+    async def connect(self) -> Connection:
+        """A pooled connection the worker has not closed, or a new one."""
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        return await asyncio.open_unix_connection(str(self.socket_path))
+
+    def release(self, connection: Connection) -> None:
+        """Return a connection whose last response was read completely."""
+        if len(self.idle) < MAX_IDLE_CONNECTIONS and self.alive:
+            self.idle.append(connection)
+        else:
+            connection[1].close()
+
+    def close_idle(self) -> None:
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    async def wait_ready(self, timeout: float = WORKER_START_TIMEOUT) -> None:
+        """Wait until the worker accepts connections."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if not self.alive:
+                raise RuntimeError(f"worker {self.index} exited during startup")
+            try:
+                _, writer = await asyncio.open_unix_connection(str(self.socket_path))
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"worker {self.index} did not start within {timeout:.0f}s")
+                await asyncio.sleep(0.05)
+            else:
+                writer.close()
+                return
+
+    def stop(self) -> None:
+        if self.alive:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class Dispatcher:
+    """
+    Relay client requests to the least-loaded worker.
+
+    Args:
+        workers: Number of worker processes
+        host: TCP address to listen on (ignored with socket_path)
+        port: TCP port to listen on; 0 picks a free port
+        socket_path: Listen on this Unix socket instead of TCP
+    """
+
+    def __init__(self, workers: int, host: str = "127.0.0.1", port: int = 8000,
+                 socket_path: Optional[str] = None):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self._directory = Path(tempfile.mkdtemp(prefix="microscopy-workers-"))
+        self.workers: List[Worker] = [
+            Worker(i, self._directory / f"worker-{i}.sock") for i in range(workers)
+        ]
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._next = 0
+        self._stopping = False
+
+    @property
+    def address(self) -> str:
+        """Where clients connect: a TCP host:port or a Unix socket path."""
+        if self.socket_path:
+            return self.socket_path
+        return f"{self.host}:{self.port}"
+
+    def _choose(self) -> Worker:
+        # Fewest requests in flight; rotate the starting point so ties spread evenly
+        candidates = self.workers[self._next:] + self.workers[:self._next]
+        self._next = (self._next + 1) % len(self.workers)
+        return min((w for w in candidates if w.alive), key=lambda w: w.active,
+                   default=candidates[0])
+
+    async def _read_request(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> Optional[Tuple[_Message, bytes]]:
+        # The whole request, so no worker waits on a slow client
+        request = await _read_head(reader)
+        if request is None:
+            return None
+        head = request.head
+        if b"100-continue" in request.headers.get(b"expect", b"").lower():
+            # Answered here since the body is read before a worker is chosen;
+            # the worker never sees the expectation
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+            head = request.without(b"expect")
+        body = _Buffer()
+        if request.chunked:
+            await _copy_chunked(reader, body)
+        elif request.length:
+            await _copy(reader, body, request.length)
+        return request, head + b"".join(body.parts)
+
+    async def _exchange(self, worker: Worker, data: bytes) -> Tuple[Connection, _Message]:
+        # Send one request and read the response head. connect() skips pooled
+        # connections the worker closed while idle; once the request is written
+        # it is never resent, since the worker may already have acted on it
+        reader, writer = await worker.connect()
+        try:
+            writer.write(data)
+            await writer.drain()
+            response = await _read_head(reader)
+            # Interim responses (103 Early Hints) are not relayed
+            while response is not None and response.first[9:10] == b"1":
+                response = await _read_head(reader)
+        except BaseException:
+            writer.close()
+            raise
+        if response is None:
+            writer.close()
+            raise ConnectionError(f"worker {worker.index} closed the connection")
+        return (reader, writer), response
+
+    async def _relay_response(self, request: _Message, connection: Connection, response: _Message,
+                              client_writer: asyncio.StreamWriter) -> bool:
+        # Relays the body; returns whether both connections can carry another request
+        reader, _ = connection
+        client_writer.write(response.head)
+        status = response.first[9:12]
+        if request.first.startswith(b"HEAD ") or status in (b"204", b"304"):
+            await client_writer.drain()
+        elif response.chunked:
+            await _copy_chunked(reader, client_writer)
+        elif response.length is not None:
+            await _copy(reader, client_writer, response.length)
+        else:
+            # Delimited by the worker closing the connection
+            while True:
+                data = await reader.read(RELAY_BUFFER)
+                if not data:
+                    return False
+                client_writer.write(data)
+                await client_writer.drain()
+        return not (request.close or response.close)
+
+    async def _handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        try:
+            keep_alive = True
+            while keep_alive:
+                message = await self._read_request(client_reader, client_writer)
+                if message is None:
+                    break
+                request, data = message
+                worker = self._choose()
+                worker.active += 1
+                worker.requests += 1
+                try:
+                    try:
+                        connection, response = await self._exchange(worker, data)
+                    except OSError as e:
+                        # Nothing was relayed yet, so the client can still get an answer
+                        worker.failures += 1
+                        client_writer.write(_bad_gateway(f"worker {worker.index} failed: {e}", request.close))
+                        await client_writer.drain()
+                        keep_alive = not request.close
+                        continue
+                    try:
+                        keep_alive = await self._relay_response(request, connection, response, client_writer)
+                    except BaseException:
+                        connection[1].close()
+                        raise
+                    if keep_alive:
+                        worker.release(connection)
+                    else:
+                        connection[1].close()
+                finally:
+                    worker.active -= 1
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            client_writer.close()
+
+    async def _supervise(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(RESTART_DELAY)
+            for worker in self.workers:
+                if not worker.alive and not self._stopping:
+                    worker.restarts += 1
+                    print(f"worker {worker.index} exited; restarting", file=sys.stderr)
+                    worker.start()
+
+    async def start(self) -> None:
+        """Start every worker, wait for them, then start listening."""
+        for worker in self.workers:
+            worker.start()
+        try:
+            await asyncio.gather(*(worker.wait_ready() for worker in self.workers))
+        except BaseException:
+            self.stop()
+            raise
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._server = await asyncio.start_unix_server(self._handle, self.socket_path)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        print(f"Dispatching {len(self.workers)} workers on {self.address}", file=sys.stderr)
+        supervisor = asyncio.ensure_future(self._supervise())
+        try:
+            await self._server.serve_forever()
+        finally:
+            supervisor.cancel()
+
+    def stop(self) -> None:
+        """Stop listening and terminate the workers."""
+        self._stopping = True
+        if self._server is not None:
+            self._server.close()
+        for worker in self.workers:
+            worker.close_idle()
+            worker.stop()
+        shutil.rmtree(self._directory, ignore_errors=True)
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def stats(self) -> List[dict]:
+        """Per-worker requests in flight, total requests, pooled connections, restarts and failures."""
+        return [
+            {"worker": w.index, "active": w.active, "requests": w.requests, "idle_connections": len(w.idle),
+             "restarts": w.restarts, "failures": w.failures}
+            for w in self.workers
+        ]
+
+
+def serve_sharded(workers: int, host: str = "127.0.0.1", port: int = 8000,
+                  socket_path: Optional[str] = None) -> int:
+    """Run a dispatcher until interrupted; returns the process exit status."""
+    dispatcher = Dispatcher(workers, host, port, socket_path)
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(dispatcher.serve_forever())
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, task.cancel)
+    try:
+        loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        dispatcher.stop()
+        loop.close()
+    return 0
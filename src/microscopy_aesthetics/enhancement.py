@@ -0,0 +1,378 @@
+"""
+Precompiled enhancement suffixes for enhance_prompt_with_microscopy.
+
+Everything after the base prompt depends only on the microscopy type,
+magnification, color palette and aesthetic strength. Those suffixes (and their
+word counts) are compiled once per profile set, so enhancing a prompt is a
+dict lookup plus one concatenation. Long base prompts are only scanned as far
+as the word limit or budget reaches.
+"""
+
+import functools
+import re
+from itertools import islice
+from typing import AbstractSet, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Number of characteristics per aesthetic strength; unknown strengths fall back
+# to DEFAULT_STRENGTH
+STRENGTH_LEVELS = {
+    "subtle": 2,
+    "balanced": 4,
+    "strong": 6
+}
+DEFAULT_STRENGTH = 4
+DEFAULT_MAGNIFICATION = "medium"
+DEFAULT_COLOR_PALETTE = "scientific"
+
+# Enhanced prompts longer than this are trimmed
+MAX_WORDS = 80
+
+# Units for compose_within budgets
+BUDGET_UNITS = ("words", "chars", "tokens")
+# Base prompts up to this many characters are split whole; longer ones are
+# scanned in growing windows, starting at this many characters per word needed
+WINDOW_CHARS_PER_WORD = 8
+
+_LEADING_SPACE = re.compile(r"\s*")
+# CLIP-style pre-tokenization: contractions, letter runs, single digits and
+# punctuation runs. BPE may split rare words further.
+_TOKEN = re.compile(r"'(?:s|t|re|ve|m|ll|d)|[^\W\d_]+|\d|(?:[^\w\s]|_)+", re.IGNORECASE)
+
+SuffixEntry = Tuple[str, int]
+# (microscopy_type, magnification, color_palette, num_characteristics)
+SuffixKey = Tuple[str, str, str, int]
+
+
+def normalize_type(microscopy_type: str) -> str:
+    """Normalize a user-supplied microscopy type to its profile key."""
+    return microscopy_type.lower().replace(" ", "_")
+
+
+def unknown_type_message(microscopy_type: str, available: Iterable[str], suggestions: Iterable[str] = ()) -> str:
+    """Message for an unknown microscopy type, listing close matches and the available ones."""
+    suggestions = list(suggestions)
+    hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+    return f"Unknown microscopy type '{microscopy_type}'.{hint} Available types: {', '.join(available)}"
+
+
+def build_suffix(
+    profile: Mapping,
+    magnification: str,
+    color_palette: str,
+    num_characteristics: int
+) -> str:
+    """
+    Build the text appended to a base prompt for one option combination.
+
+    Args:
+        profile: Microscopy profile from MICROSCOPY_PROFILES
+        magnification: Resolved magnification key (must exist in the profile)
+        color_palette: Resolved color palette key (must exist in the profile)
+        num_characteristics: Number of characteristics to include
+
+    Returns:
+        Suffix starting with ", rendered with ..." and ending with a period
+    """
+    characteristics = []
+    characteristics.extend(profile["structure"][:2])  # Always include structure
+    characteristics.extend(profile["material"][:1])
+    characteristics.extend(profile["color"][:1])
+    characteristics.extend(profile["texture"][:1])
+
+    if num_characteristics >= 5:
+        characteristics.extend(profile["composition"][:1])
+    if num_characteristics >= 6:
+        characteristics.extend(profile["style"][:1])
+
+    mag_language = profile["magnification_feel"][magnification]
+    color_selection = profile["color_palette"][color_palette]
+
+    suffix = f", rendered with {profile['display_name'].lower()} microscopy aesthetics. "
+    suffix += f"Features {', '.join(characteristics[:num_characteristics])}. "
+    suffix += f"Color palette emphasizes {color_selection[0]}. "
+    suffix += f"Captures {mag_language}. "
+    suffix += "Highly detailed 8k scientific visualization."
+    return suffix
+
+
+class SuffixTable:
+    """
+    Every enhancement suffix for a profile set, keyed by
+    (microscopy_type, magnification, color_palette, num_characteristics).
+
+    A type's suffixes are compiled the first time it is looked up, so profile
+    stores that load lazily only materialize the types actually used.
+    Lookups take already-normalized microscopy types; magnification, palette
+    and strength are lowercased and fall back to their defaults exactly like
+    the original per-call pipeline did.
+    """
+
+    def __init__(self, profiles: Mapping[str, Mapping]):
+        self._profiles = profiles
+        self._entries: Dict[SuffixKey, SuffixEntry] = {}
+        self._magnifications: Dict[str, frozenset] = {}
+        self._palettes: Dict[str, frozenset] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, microscopy_type: str) -> bool:
+        return microscopy_type in self._magnifications or microscopy_type in self._profiles
+
+    @property
+    def types(self) -> Tuple[str, ...]:
+        """Microscopy types in profile order."""
+        return tuple(self._profiles)
+
+    def compile(self, microscopy_type: Optional[str] = None) -> None:
+        """
+        Compile the suffixes for one type, or for every type.
+
+        Raises:
+            KeyError: If the type is not in the profile set
+        """
+        if microscopy_type is None:
+            for key in self._profiles:
+                self.compile(key)
+            return
+        if microscopy_type in self._magnifications:
+            return
+        profile = self._profiles[microscopy_type]
+        for mag_key in profile["magnification_feel"]:
+            for color_key in profile["color_palette"]:
+                for num in set(STRENGTH_LEVELS.values()):
+                    suffix = build_suffix(profile, mag_key, color_key, num)
+                    self._entries[(microscopy_type, mag_key, color_key, num)] = (
+                        suffix, len(suffix.split())
+                    )
+        self._palettes[microscopy_type] = frozenset(profile["color_palette"])
+        # Published last: a type is only marked compiled once its entries exist
+        self._magnifications[microscopy_type] = frozenset(profile["magnification_feel"])
+
+    def derive(self, profiles: Mapping[str, Mapping], changed: AbstractSet[str]) -> "SuffixTable":
+        """
+        A table for a new version of the profile set that keeps the compiled
+        suffixes of every type not in changed.
+        """
+        table = type(self)(profiles)
+        # Copy the published markers first: entries are written before a type
+        # is marked compiled, so every kept type has all of its entries
+        magnifications = dict(self._magnifications)
+        entries = dict(self._entries)
+        for microscopy_type, mags in magnifications.items():
+            if microscopy_type in changed or microscopy_type not in profiles:
+                continue
+            table._palettes[microscopy_type] = self._palettes[microscopy_type]
+            table._magnifications[microscopy_type] = mags
+        table._entries = {key: entry for key, entry in entries.items() if key[0] in table._magnifications}
+        return table
+
+    def resolve(
+        self,
+        microscopy_type: str,
+        magnification: str = DEFAULT_MAGNIFICATION,
+        color_palette: str = DEFAULT_COLOR_PALETTE,
+        aesthetic_strength: str = "balanced"
+    ) -> Optional[SuffixKey]:
+        """
+        Return the (type, magnification, palette, num_characteristics) key
+        after fallbacks, or None for an unknown type.
+        """
+        num = STRENGTH_LEVELS.get(aesthetic_strength.lower(), DEFAULT_STRENGTH)
+        key = (microscopy_type, magnification.lower(), color_palette.lower(), num)
+        if key in self._entries:
+            return key
+
+        magnifications = self._magnifications.get(microscopy_type)
+        if magnifications is None:
+            if microscopy_type not in self._profiles:
+                return None
+            self.compile(microscopy_type)
+            magnifications = self._magnifications[microscopy_type]
+        _, mag_key, color_key, _ = key
+        if mag_key not in magnifications:
+            mag_key = DEFAULT_MAGNIFICATION
+        if color_key not in self._palettes[microscopy_type]:
+            color_key = DEFAULT_COLOR_PALETTE
+        return (microscopy_type, mag_key, color_key, num)
+
+    def entry(self, key: SuffixKey) -> SuffixEntry:
+        """(suffix, suffix_word_count) for a key returned by resolve()."""
+        return self._entries[key]
+
+    def lookup(
+        self,
+        microscopy_type: str,
+        magnification: str = DEFAULT_MAGNIFICATION,
+        color_palette: str = DEFAULT_COLOR_PALETTE,
+        aesthetic_strength: str = "balanced"
+    ) -> Optional[SuffixEntry]:
+        """
+        Return (suffix, suffix_word_count), or None for an unknown type.
+        """
+        num = STRENGTH_LEVELS.get(aesthetic_strength.lower(), DEFAULT_STRENGTH)
+        entry = self._entries.get((microscopy_type, magnification.lower(), color_palette.lower(), num))
+        if entry is not None:
+            return entry
+        key = self.resolve(microscopy_type, magnification, color_palette, aesthetic_strength)
+        return None if key is None else self.entry(key)
+
+    def unknown_message(self, microscopy_type: str) -> str:
+        """Why a type did not resolve, listing the available ones."""
+        return unknown_type_message(microscopy_type, self._profiles)
+
+
+def _fuses(base_prompt: str) -> bool:
+    # Suffixes start with a comma, which fuses with the last word of the base
+    # prompt unless the base prompt ends in whitespace
+    return bool(base_prompt) and not base_prompt[-1].isspace()
+
+
+def count_joined_words(base_prompt: str, suffix_words: int) -> int:
+    """Word count of base_prompt + suffix without building the joined string."""
+    return len(base_prompt.split()) + suffix_words - _fuses(base_prompt)
+
+
+def leading_words(text: str, limit: int) -> Tuple[List[str], bool]:
+    """
+    The first `limit` words of text (as str.split() finds them) and whether
+    more follow. Only a window of about the needed length is split, doubled
+    until it holds more than `limit` words, so long text costs O(limit).
+    """
+    window = max(limit, 1) * WINDOW_CHARS_PER_WORD
+    while window < len(text):
+        words = text[:window].split()
+        if len(words) > limit:
+            # The next word starts inside the window, so the first `limit` are whole
+            return words[:limit], True
+        window *= 2
+    words = text.split()
+    return words[:limit], len(words) > limit
+
+
+def compose(base_prompt: str, suffix: str, suffix_words: int) -> str:
+    """
+    Join a base prompt with a precompiled suffix, trimming to MAX_WORDS.
+
+    Returns:
+        The same text the original per-call pipeline produced
+    """
+    if len(base_prompt) <= MAX_WORDS * WINDOW_CHARS_PER_WORD:
+        base_words = base_prompt.split()
+    else:
+        base_words, more = leading_words(base_prompt, MAX_WORDS)
+        if more:
+            # Over the limit on its own: the suffix is dropped
+            return " ".join(base_words) + "."
+    fused = _fuses(base_prompt)
+    if len(base_words) + suffix_words - fused <= MAX_WORDS:
+        # Suffixes end with a period, so only leading whitespace needs stripping
+        return (base_prompt + suffix).lstrip()
+
+    if len(base_words) > MAX_WORDS:
+        words = base_words
+    elif fused:
+        words = base_words[:-1] + (base_words[-1] + suffix).split()
+    else:
+        words = base_words + suffix.split()
+    return " ".join(words[:MAX_WORDS]) + "."
+
+
+def compose_many(base_prompt: str, entries: Iterable[SuffixEntry]) -> List[str]:
+    """
+    Enhanced prompts for one base prompt and many (suffix, suffix_word_count)
+    entries, one per variant.
+
+    While base prompt and suffix fit MAX_WORDS together, each result is what
+    compose() returns. Past that, compose() would cut into the suffixes and
+    every variant would end the same way, so the base prompt is shortened
+    instead, as compose_within() does, and each suffix is kept whole. Only a
+    suffix over MAX_WORDS on its own is still cut.
+    """
+    words, more = leading_words(base_prompt, MAX_WORDS)
+    base_words = MAX_WORDS + 1 if more else len(words) - _fuses(base_prompt)
+    strip = base_prompt[:1].isspace()
+    results = []
+    for suffix, suffix_words in entries:
+        if base_words + suffix_words <= MAX_WORDS:
+            results.append((base_prompt + suffix).lstrip() if strip else base_prompt + suffix)
+        elif suffix_words < MAX_WORDS:
+            results.append(compose_within(base_prompt, suffix, suffix_words, MAX_WORDS))
+        else:
+            results.append(compose(base_prompt, suffix, suffix_words))
+    return results
+
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Tokens in text by CLIP-style pre-tokenization (words, digits and punctuation runs)."""
+    return sum(1 for _ in _TOKEN.finditer(text))
+
+
+def suffix_cost(suffix: str, suffix_words: int, unit: str) -> int:
+    """
+    Length of a suffix on its own, in a budget unit: the smallest budget
+    compose_within() can honor with it.
+    """
+    if unit == "words":
+        return suffix_words
+    if unit == "chars":
+        return len(suffix)
+    return count_tokens(suffix)
+
+
+def compose_within(base_prompt: str, suffix: str, suffix_words: int, budget: int, unit: str = "words") -> str:
+    """
+    Join a base prompt with a suffix so the result fits a budget, shortening
+    only the base prompt.
+
+    The suffix's length is known up front, so the base prompt is scanned
+    only as far as the remaining room reaches: cost is O(budget) however long
+    the base prompt is, and the oversized joined string is never built. The
+    cut falls on a word boundary, mid-word only if not even the first word
+    fits. A base prompt that fits is joined exactly as compose() joins it.
+
+    Args:
+        base_prompt: The original image description
+        suffix: Precompiled suffix (starts with a comma)
+        suffix_words: Word count of the suffix
+        budget: Maximum length of the result; at least suffix_cost()
+        unit: words (as str.split() counts them), chars, or tokens (see count_tokens)
+
+    Returns:
+        The enhanced prompt, at most budget units long
+    """
+    start = _LEADING_SPACE.match(base_prompt).end()
+    if unit == "words":
+        # The suffix's leading comma joins the last base word, so one more fits
+        room = budget - suffix_words + 1
+        words, more = leading_words(base_prompt, room)
+        if not more and (len(words) < room or _fuses(base_prompt)):
+            return (base_prompt + suffix).lstrip()
+        return " ".join(words) + suffix
+
+    if unit == "chars":
+        room = budget - len(suffix)
+        if len(base_prompt) - start <= room:
+            return (base_prompt + suffix).lstrip()
+        window = base_prompt[start:start + room + 1]
+        head = window[:room]
+        if window[room].isspace() or head[-1:].isspace():
+            return head.rstrip() + suffix
+        parts = head.rsplit(None, 1)
+        return (parts[0] if len(parts) == 2 else head) + suffix
+
+    room = budget - count_tokens(suffix)
+    tokens = list(islice(_TOKEN.finditer(base_prompt, start), room + 1))
+    if len(tokens) <= room:
+        return (base_prompt + suffix).lstrip()
+    if room == 0:
+        return suffix.lstrip()
+    end = tokens[room - 1].end()
+    head = base_prompt[start:end]
+    if tokens[room].start() == end:
+        # The next token continues the same word; cut before that word instead
+        parts = head.rsplit(None, 1)
+        if len(parts) == 2:
+            head = parts[0]
+    return head + suffix
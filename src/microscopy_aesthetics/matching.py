@@ -0,0 +1,97 @@
+"""
+Single-pass keyword matching for suggest_microscopy_type.
+
+All terms for all microscopy types are compiled into one trie-shaped regular
+expression. Scanning a description is a single pass of the regex engine, so
+cost grows with the description length rather than with
+types x keywords x description length.
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Tuple
+
+# Profile fields whose phrases are indexed as suggestion terms
+VOCABULARY_FIELDS = (
+    "structure", "material", "color", "texture", "composition",
+    "style", "quality", "mood", "examples"
+)
+
+
+def vocabulary_terms(profile: Mapping) -> List[str]:
+    """Every vocabulary phrase of a profile, including color palette entries."""
+    terms = []
+    for field in VOCABULARY_FIELDS:
+        terms.extend(profile.get(field, ()))
+    for palette in profile.get("color_palette", {}).values():
+        terms.extend(palette)
+    return terms
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def pattern(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Greedy: prefer the longest term, backtracking to a shorter one
+        return f"(?:{body})?" if terminal else body
+
+    return pattern(trie)
+
+
+class KeywordMatcher:
+    """
+    Counts, per microscopy type, how many of its terms occur in a description.
+
+    A term counts once however often it occurs, and terms match as substrings
+    ("glow" matches "glowing"), exactly like the original per-keyword scan.
+    """
+
+    def __init__(self, terms_by_type: Mapping[str, Iterable[str]]):
+        self.types: Tuple[str, ...] = tuple(terms_by_type)
+        owners: Dict[str, List[str]] = {}
+        for microscopy_type, terms in terms_by_type.items():
+            for term in dict.fromkeys(t.lower() for t in terms if t):
+                owners.setdefault(term, []).append(microscopy_type)
+        self._owners: Dict[str, Tuple[str, ...]] = {t: tuple(o) for t, o in owners.items()}
+
+        # The regex reports the longest term starting at each position; shorter
+        # terms starting at the same position are its prefixes
+        self._prefixes: Dict[str, FrozenSet[str]] = {
+            term: frozenset(term[:i] for i in range(1, len(term) + 1) if term[:i] in owners)
+            for term in owners
+        }
+        self._regex = re.compile(f"(?=({_trie_pattern(owners)}))") if owners else None
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def matched_terms(self, description: str) -> FrozenSet[str]:
+        """Distinct terms occurring anywhere in the (lowercased) description."""
+        if self._regex is None:
+            return frozenset()
+        longest = set(self._regex.findall(description.lower()))
+        found = set()
+        for term in longest:
+            found |= self._prefixes[term]
+        return frozenset(found)
+
+    def scores(self, description: str) -> Dict[str, int]:
+        """Number of distinct matched terms per type, in type order."""
+        scores = dict.fromkeys(self.types, 0)
+        for term in self.matched_terms(description):
+            for microscopy_type in self._owners[term]:
+                scores[microscopy_type] += 1
+        return scores
+
+    def rank(self, description: str) -> List[Tuple[str, int]]:
+        """(type, score) pairs, highest score first; ties keep type order."""
+        return sorted(self.scores(description).items(), key=lambda x: x[1], reverse=True)
@@ -0,0 +1,384 @@
+"""
+Low-overhead per-tool metrics: call and error counts, fixed-bucket latency
+histograms, and counts per value of selected arguments.
+
+Tools opt in with the @METRICS.instrument(...) decorator. Snapshots are served
+by the get_server_metrics tool, and can be exported in Prometheus text format
+to a file or a Unix socket ($MICROSCOPY_METRICS_EXPORT). Setting
+MICROSCOPY_METRICS=0 leaves tools unwrapped.
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
+
+METRICS_ENV = "MICROSCOPY_METRICS"
+EXPORT_ENV = "MICROSCOPY_METRICS_EXPORT"
+INTERVAL_ENV = "MICROSCOPY_METRICS_INTERVAL"
+DEFAULT_EXPORT_INTERVAL = 15.0
+
+# Latency bucket upper bounds in microseconds; the last bucket is +Inf
+LATENCY_BUCKETS_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+# Distinct values tracked per argument; the rest are counted together
+MAX_ARGUMENT_VALUES = 64
+MAX_VALUE_LENGTH = 48
+OTHER_VALUE = "__other__"
+
+# Samples buffered per tool before they are counted
+FOLD_BATCH = 256
+
+PREFIX = "microscopy_tool"
+
+
+class ErrorResult(str):
+    """
+    A tool's error message. Tools return it instead of a plain string so the
+    call counts as failed; the text itself is never inspected, since a
+    successful result may start with the caller's own words.
+    """
+
+    __slots__ = ()
+
+
+def is_error_result(result: Any) -> bool:
+    """Tools report failures as ErrorResult strings."""
+    return isinstance(result, ErrorResult)
+
+
+class ToolMetrics:
+    """
+    Counters and latency histogram for one tool.
+
+    The call path only appends a raw sample to a deque (atomic, no lock);
+    samples are folded into the counters in batches, and before every read.
+    """
+
+    __slots__ = ("name", "calls", "errors", "latency_ns", "buckets", "arguments", "pending",
+                 "_tracked", "_labels", "_lock")
+
+    _bounds_ns = tuple(us * 1000 for us in LATENCY_BUCKETS_US)
+
+    def __init__(self, name: str, tracked: Sequence[Tuple[str, int, Any]] = (),
+                 labels: Optional[Mapping[str, Callable[[Any], Any]]] = None):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.latency_ns = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_US) + 1)
+        self.arguments: Dict[str, Dict[Any, int]] = {arg: {} for arg, _, _ in tracked}
+        # (elapsed_ns, error, tracked argument values) samples not yet counted
+        self.pending: Deque[Tuple[int, bool, tuple]] = deque()
+        # (argument name, positional index, default)
+        self._tracked = tuple(tracked)
+        # Per-argument functions turning a raw value into its label, applied when folding
+        self._labels = dict(labels or {})
+        self._lock = threading.Lock()
+
+    def tracked_values(self, args: tuple, kwargs: dict) -> tuple:
+        """
+        The tracked arguments' values in one call. Only these are buffered,
+        so pending samples never keep a call's other arguments (e.g. a batch
+        payload) alive.
+        """
+        return tuple(
+            kwargs[name] if name in kwargs else args[index] if index < len(args) else default
+            for name, index, default in self._tracked
+        )
+
+    def record(self, elapsed_ns: int, error: bool, args: tuple = (), kwargs: Optional[dict] = None) -> None:
+        self.pending.append((elapsed_ns, error, self.tracked_values(args, kwargs or {})))
+        if len(self.pending) >= FOLD_BATCH:
+            self.fold()
+
+    def fold(self) -> None:
+        """Count pending samples."""
+        pending = self.pending
+        bounds = self._bounds_ns
+        labels = self._labels
+        with self._lock:
+            while True:
+                try:
+                    elapsed_ns, error, values = pending.popleft()
+                except IndexError:
+                    break
+                self.calls += 1
+                self.errors += error
+                self.latency_ns += elapsed_ns
+                self.buckets[bisect_left(bounds, elapsed_ns)] += 1
+                for (name, _, _), value in zip(self._tracked, values):
+                    # Raw values (or their labels) are counted here and normalized when read
+                    if name in labels:
+                        value = labels[name](value)
+                    counts = self.arguments[name]
+                    try:
+                        count = counts.get(value)
+                    except TypeError:
+                        value = str(value)
+                        count = counts.get(value)
+                    if count is None:
+                        if len(counts) >= MAX_ARGUMENT_VALUES:
+                            value = OTHER_VALUE
+                            count = counts.get(value, 0)
+                        else:
+                            count = 0
+                    counts[value] = count + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        self.fold()
+        with self._lock:
+            buckets = list(self.buckets)
+            calls, errors, latency_ns = self.calls, self.errors, self.latency_ns
+            arguments = {name: _normalized(counts) for name, counts in self.arguments.items()}
+        labels = [f"le_{us}us" for us in LATENCY_BUCKETS_US] + ["le_inf"]
+        return {
+            "calls": calls,
+            "errors": errors,
+            "latency_us": {
+                "sum": round(latency_ns / 1000, 3),
+                "mean": round(latency_ns / 1000 / calls, 3) if calls else 0.0,
+                "buckets": dict(zip(labels, buckets)),
+            },
+            "arguments": arguments,
+        }
+
+    def reset(self) -> None:
+        self.fold()
+        with self._lock:
+            self.calls = self.errors = self.latency_ns = 0
+            self.buckets = [0] * len(self.buckets)
+            for counts in self.arguments.values():
+                counts.clear()
+
+
+def _normalized(counts: Dict[Any, int]) -> Dict[str, int]:
+    # Lowercased, truncated labels; raw values that normalize alike are merged
+    result: Dict[str, int] = {}
+    for value, count in counts.items():
+        label = value if value is OTHER_VALUE else str(value).lower()[:MAX_VALUE_LENGTH]
+        result[label] = result.get(label, 0) + count
+    return result
+
+
+class MetricsRegistry:
+    """Metrics for every instrumented tool in the process."""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.environ.get(METRICS_ENV, "1").lower() not in ("0", "false", "no", "off")
+        self.enabled = enabled
+        self.started = time.time()
+        self.tools: Dict[str, ToolMetrics] = {}
+        self._stop_exporting = threading.Event()
+        self._listeners: List[Any] = []
+
+    def instrument(self, *tracked: str,
+                   labels: Optional[Mapping[str, Callable[[Any], Any]]] = None) -> Callable[[Callable], Callable]:
+        """
+        Decorator recording calls, errors, latency and the values of the
+        named arguments. Place it under @mcp.tool() so FastMCP registers the
+        wrapped function; the original signature is preserved.
+
+        Args:
+            tracked: Arguments whose values are counted
+            labels: Functions turning a tracked argument's raw value into the
+                value counted (e.g. a blend mapping into its blend string)
+        """
+        def decorate(func: Callable) -> Callable:
+            if not self.enabled:
+                return func
+            parameters = inspect.signature(func).parameters
+            names = list(parameters)
+            stats = self.tools[func.__name__] = ToolMetrics(func.__name__, [
+                (name, names.index(name), parameters[name].default) for name in tracked
+            ], labels)
+            pending = stats.pending
+            append = pending.append
+            fold = stats.fold
+            clock = time.perf_counter_ns
+            values = stats.tracked_values if tracked else lambda args, kwargs: ()
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    start = clock()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except BaseException:
+                        append((clock() - start, True, values(args, kwargs)))
+                        raise
+                    append((clock() - start, result.__class__ is ErrorResult, values(args, kwargs)))
+                    if len(pending) >= FOLD_BATCH:
+                        fold()
+                    return result
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException:
+                    append((clock() - start, True, values(args, kwargs)))
+                    raise
+                # Same test as is_error_result, inlined to keep the call path short
+                append((clock() - start, result.__class__ is ErrorResult, values(args, kwargs)))
+                if len(pending) >= FOLD_BATCH:
+                    fold()
+                return result
+            return wrapper
+        return decorate
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All tool metrics as plain data."""
+        return {
+            "uptime_s": round(time.time() - self.started, 3),
+            "enabled": self.enabled,
+            "tools": {name: stats.snapshot() for name, stats in self.tools.items()},
+        }
+
+    def reset(self) -> None:
+        for stats in self.tools.values():
+            stats.reset()
+
+    def stop_exporting(self) -> None:
+        """Stop the exporters started for this registry and close their sockets."""
+        import socket
+
+        self._stop_exporting.set()
+        while self._listeners:
+            listener = self._listeners.pop()
+            try:
+                # Wakes a thread blocked in accept(); closing alone does not
+                listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            listener.close()
+
+    def prometheus_text(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        snapshot = {name: stats.snapshot() for name, stats in self.tools.items()}
+        lines: List[str] = [
+            f"# HELP {PREFIX}_calls_total Tool calls.",
+            f"# TYPE {PREFIX}_calls_total counter",
+        ]
+        lines += [f'{PREFIX}_calls_total{{tool="{_escape(n)}"}} {s["calls"]}' for n, s in snapshot.items()]
+        lines += [
+            f"# HELP {PREFIX}_errors_total Tool calls that raised or returned an error.",
+            f"# TYPE {PREFIX}_errors_total counter",
+        ]
+        lines += [f'{PREFIX}_errors_total{{tool="{_escape(n)}"}} {s["errors"]}' for n, s in snapshot.items()]
+        lines += [
+            f"# HELP {PREFIX}_latency_seconds Tool call latency.",
+            f"# TYPE {PREFIX}_latency_seconds histogram",
+        ]
+        for name, stats in snapshot.items():
+            tool = _escape(name)
+            cumulative = 0
+            bounds = [f"{us / 1e6:g}" for us in LATENCY_BUCKETS_US] + ["+Inf"]
+            for bound, count in zip(bounds, stats["latency_us"]["buckets"].values()):
+                cumulative += count
+                lines.append(f'{PREFIX}_latency_seconds_bucket{{tool="{tool}",le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_latency_seconds_sum{{tool="{tool}"}} {stats["latency_us"]["sum"] / 1e6:.9f}')
+            lines.append(f'{PREFIX}_latency_seconds_count{{tool="{tool}"}} {stats["calls"]}')
+        lines += [
+            f"# HELP {PREFIX}_argument_total Tool calls by argument value.",
+            f"# TYPE {PREFIX}_argument_total counter",
+        ]
+        for name, stats in snapshot.items():
+            for argument, counts in stats["arguments"].items():
+                for value, count in counts.items():
+                    lines.append(
+                        f'{PREFIX}_argument_total{{tool="{_escape(name)}",argument="{argument}",'
+                        f'value="{_escape(value)}"}} {count}'
+                    )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path) -> None:
+        """Atomically write the Prometheus text to a file (e.g. for node_exporter's textfile collector)."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.prometheus_text())
+        tmp.replace(path)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def start_exporter(registry: MetricsRegistry, target: str, interval: float = DEFAULT_EXPORT_INTERVAL) -> threading.Thread:
+    """
+    Export metrics in a daemon thread.
+
+    Args:
+        registry: Metrics to export
+        target: File path, rewritten every interval seconds, or unix:/path to
+            serve the current text to every client that connects
+        interval: Seconds between file writes
+
+    Returns:
+        The exporter thread
+    """
+    stop = registry._stop_exporting
+    stop.clear()
+    if target.startswith("unix:"):
+        import socket
+
+        path = target[len("unix:"):]
+        if os.path.exists(path):
+            os.unlink(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(8)
+        registry._listeners.append(server)
+
+        def serve() -> None:
+            with server:
+                while not stop.is_set():
+                    try:
+                        connection, _ = server.accept()
+                    except OSError:
+                        break  # The listening socket was shut down or is unusable
+                    try:
+                        with connection:
+                            connection.sendall(registry.prometheus_text().encode("utf-8"))
+                    except OSError:
+                        pass  # A client that disconnects early must not stop the exporter
+
+        thread = threading.Thread(target=serve, name="metrics-exporter", daemon=True)
+    else:
+        def write_periodically() -> None:
+            while not stop.is_set():
+                try:
+                    registry.write_prometheus(Path(target))
+                except OSError:
+                    pass
+                stop.wait(interval)
+
+        thread = threading.Thread(target=write_periodically, name="metrics-exporter", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_exporter_from_env(registry: MetricsRegistry) -> Optional[threading.Thread]:
+    """Start an exporter if $MICROSCOPY_METRICS_EXPORT is set."""
+    target = os.environ.get(EXPORT_ENV)
+    if not target or not registry.enabled:
+        return None
+    try:
+        interval = float(os.environ.get(INTERVAL_ENV, DEFAULT_EXPORT_INTERVAL))
+    except ValueError:
+        interval = DEFAULT_EXPORT_INTERVAL
+    if not interval > 0:
+        interval = DEFAULT_EXPORT_INTERVAL
+    return start_exporter(registry, target, interval)
+
+
+# Process-wide registry used by the server's tools
+METRICS = MetricsRegistry()
@@ -0,0 +1,23 @@
+"""
+Filesystem locations shared by the on-disk caches.
+"""
+
+import os
+from pathlib import Path
+
+CACHE_DIR_ENV = "MICROSCOPY_CACHE_DIR"
+
+
+def cache_dir() -> Path:
+    """
+    Directory for compiled caches; $MICROSCOPY_CACHE_DIR, else the XDG cache dir.
+
+    The directory is created on first use.
+    """
+    configured = os.environ.get(CACHE_DIR_ENV)
+    if configured:
+        path = Path(configured)
+    else:
+        path = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "microscopy-aesthetics"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
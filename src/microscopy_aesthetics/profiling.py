@@ -0,0 +1,340 @@
+"""
+Opt-in sampled profiling of tool calls with cProfile and tracemalloc.
+
+Tools opt in with the @PROFILER.profile decorator. Setting
+MICROSCOPY_PROFILING to a fraction (e.g. 0.01) profiles that share of each
+tool's calls; unset or 0 leaves tools unwrapped, so disabled profiling costs
+nothing. MICROSCOPY_PROFILING_MODE picks cpu (cProfile, the default), memory
+(tracemalloc) or both. Results are aggregated per tool and served by the
+profiling_report tool, which can also change the sample rate at runtime;
+with MICROSCOPY_PROFILING_DIR set they are written there every
+MICROSCOPY_PROFILING_INTERVAL seconds as pstats files (load with pstats or
+snakeviz), text summaries and a JSON report.
+
+One call is profiled at a time; sampled calls that overlap it run
+unprofiled and are counted as skipped. Memory samples report the blocks a
+call allocated that were still alive when it returned, by source line, and
+its traced peak. On Python 3.12+ cProfile observes every thread, so a CPU
+sample can include work other threads did meanwhile.
+"""
+
+import functools
+import inspect
+import io
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROFILING_ENV = "MICROSCOPY_PROFILING"
+MODE_ENV = "MICROSCOPY_PROFILING_MODE"
+DIR_ENV = "MICROSCOPY_PROFILING_DIR"
+INTERVAL_ENV = "MICROSCOPY_PROFILING_INTERVAL"
+DEFAULT_REPORT_INTERVAL = 60.0
+
+MODES = ("cpu", "memory", "both")
+DEFAULT_MODE = "cpu"
+# Report orderings: cumulative time (callees included) or self time
+SORTS = ("cumulative", "self")
+DEFAULT_REPORT_LIMIT = 10
+
+
+def _short_path(filename: str) -> str:
+    # Relative to the longest sys.path entry containing it
+    for prefix in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+def _function_name(function: Tuple[str, int, str]) -> str:
+    filename, line, name = function
+    if filename == "~":
+        return name  # Built-in, e.g. "<method 'join' of 'str' objects>"
+    return f"{_short_path(filename)}:{line}({name})"
+
+
+class ToolProfile:
+    """Aggregated samples for one tool."""
+
+    __slots__ = ("name", "calls", "sampled", "skipped", "credit", "stats", "allocations", "peak_bytes", "_lock")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.sampled = 0
+        self.skipped = 0
+        # Accumulates the sample rate per call; a call is sampled each time it reaches 1
+        self.credit = 0.0
+        self.stats = None  # pstats.Stats, once a CPU sample exists
+        # "file:line" -> [bytes, blocks] still allocated when sampled calls returned
+        self.allocations: Dict[str, List[int]] = {}
+        self.peak_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, profile: Any, allocations: List[Tuple[str, int, int]], peak_bytes: int) -> None:
+        """Fold one sample in: a cProfile.Profile (or None) and (site, bytes, blocks) allocations."""
+        import pstats
+
+        with self._lock:
+            self.sampled += 1
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            for site, size, count in allocations:
+                totals = self.allocations.setdefault(site, [0, 0])
+                totals[0] += size
+                totals[1] += count
+            self.peak_bytes = max(self.peak_bytes, peak_bytes)
+
+    def snapshot(self, limit: int = DEFAULT_REPORT_LIMIT, sort: str = "cumulative") -> Dict[str, Any]:
+        """Counts plus the hottest functions and largest allocation sites, per sample."""
+        with self._lock:
+            sampled = self.sampled
+            functions = dict(self.stats.stats) if self.stats is not None else {}
+            allocations = sorted(self.allocations.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+            peak_bytes = self.peak_bytes
+        index = 3 if sort == "cumulative" else 2
+        hottest = sorted(functions.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+        per_sample = max(sampled, 1)
+        return {
+            "calls": self.calls,
+            "sampled": sampled,
+            "skipped": self.skipped,
+            "functions": [
+                {
+                    "function": _function_name(function),
+                    "calls": calls,
+                    "self_ms": round(self_s * 1000 / per_sample, 4),
+                    "cumulative_ms": round(cumulative_s * 1000 / per_sample, 4),
+                }
+                for function, (_, calls, self_s, cumulative_s, _) in hottest
+            ],
+            "allocations": [
+                {"site": site, "kb": round(size / 1024 / per_sample, 3), "blocks": round(count / per_sample, 1)}
+                for site, (size, count) in allocations
+            ],
+            "peak_kb": round(peak_bytes / 1024, 3),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = self.sampled = self.skipped = 0
+            self.stats = None
+            self.allocations = {}
+            self.peak_bytes = 0
+
+
+class Profiler:
+    """Sampled profiles for every profiled tool in the process."""
+
+    def __init__(self, sample_rate: Optional[float] = None, mode: Optional[str] = None):
+        # Environment settings never fail the server's import: a bad rate
+        # disables profiling and a bad mode falls back to the default
+        if sample_rate is None:
+            try:
+                sample_rate = float(os.environ.get(PROFILING_ENV) or 0)
+            except ValueError:
+                sample_rate = 0.0
+            if not sample_rate > 0:
+                sample_rate = 0.0
+        if mode is None:
+            mode = (os.environ.get(MODE_ENV) or DEFAULT_MODE).strip().lower()
+            if mode not in MODES:
+                mode = DEFAULT_MODE
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}'. Available modes: {', '.join(MODES)}")
+        # Only a profiler enabled at startup wraps tools; the rate can change later
+        self.enabled = sample_rate > 0
+        self.sample_rate = min(sample_rate, 1.0)
+        self.mode = mode
+        self.started = time.time()
+        self.tools: Dict[str, ToolProfile] = {}
+        self._busy = threading.Lock()
+        self._stop_writing = threading.Event()
+
+    def profile(self, func: Callable) -> Callable:
+        """
+        Decorator sampling calls of a sync tool. Place it directly on the
+        function; the original signature is preserved.
+        """
+        if not self.enabled:
+            return func
+        if inspect.iscoroutinefunction(func):
+            raise TypeError(f"{func.__name__}: profile sync functions; a coroutine's awaits would be profiled too")
+        state = self.tools[func.__name__] = ToolProfile(func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Tools run in executor threads, so the counters are updated under the lock
+            with state._lock:
+                state.calls += 1
+                state.credit += self.sample_rate
+                sampled = state.credit >= 1.0
+                if sampled:
+                    state.credit -= 1.0
+            if not sampled:
+                return func(*args, **kwargs)
+            return self._sample(state, func, args, kwargs)
+        return wrapper
+
+    def _sample(self, state: ToolProfile, func: Callable, args: tuple, kwargs: dict) -> Any:
+        if not self._busy.acquire(blocking=False):
+            with state._lock:
+                state.skipped += 1
+            return func(*args, **kwargs)
+        try:
+            profile = None
+            if self.mode != "memory":
+                import cProfile
+                profile = cProfile.Profile()
+            tracing = self.mode != "cpu"
+            if tracing:
+                import tracemalloc
+                # Someone else's tracing is left running; only the call's own allocations are counted
+                owned = not tracemalloc.is_tracing()
+                before = None if owned else tracemalloc.take_snapshot()
+                if owned:
+                    tracemalloc.start()
+            if profile is not None:
+                profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                allocations: List[Tuple[str, int, int]] = []
+                peak_bytes = 0
+                if tracing:
+                    allocations, peak_bytes = _allocations(before)
+                    if owned:
+                        tracemalloc.stop()
+                state.add(profile, allocations, peak_bytes)
+        finally:
+            self._busy.release()
+
+    def report(
+        self,
+        tool: Optional[str] = None,
+        limit: int = DEFAULT_REPORT_LIMIT,
+        sort: str = "cumulative"
+    ) -> Dict[str, Any]:
+        """Settings and per-tool snapshots (of one tool, or of every tool sampled so far)."""
+        names = [tool] if tool is not None else [name for name, state in self.tools.items() if state.sampled]
+        return {
+            "uptime_s": round(time.time() - self.started, 3),
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "mode": self.mode,
+            "sort": sort,
+            "tools": {name: self.tools[name].snapshot(limit, sort) for name in names},
+        }
+
+    def reset(self) -> None:
+        for state in self.tools.values():
+            state.reset()
+
+    def write_reports(self, directory: Path, limit: int = 30) -> None:
+        """
+        Atomically write, per sampled tool, <tool>-<pid>.prof (pstats) and
+        <tool>-<pid>.txt, plus profiling-<pid>.json. The pid keeps the
+        reports of several worker processes sharing a directory apart.
+        """
+        import pstats
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        pid = os.getpid()
+        report = self.report(limit=limit)
+        for name in report["tools"]:
+            state = self.tools[name]
+            summary = io.StringIO()
+            # A copy, so sorting and printing happen outside the tool's lock
+            stats = pstats.Stats(stream=summary)
+            with state._lock:
+                if state.stats is not None:
+                    stats.add(state.stats)
+            if stats.stats:
+                path = directory / f"{name}-{pid}.prof"
+                stats.dump_stats(str(_replaced(path)))
+                _replace(path)
+                stats.sort_stats("cumulative").print_stats(limit)
+            allocations = report["tools"][name]["allocations"]
+            if allocations:
+                summary.write("Allocations still alive at return, per sampled call:\n")
+                summary.writelines(f"{a['kb']:>12.1f} KiB {a['blocks']:>10.1f} blocks  {a['site']}\n"
+                                   for a in allocations)
+            _write(directory / f"{name}-{pid}.txt", summary.getvalue())
+        _write(directory / f"profiling-{pid}.json", json.dumps(report, indent=2))
+
+    def write_periodically(self, directory: Path, interval: float = DEFAULT_REPORT_INTERVAL) -> None:
+        """Write reports every interval seconds until stop_writing()."""
+        while not self._stop_writing.wait(interval):
+            try:
+                self.write_reports(directory)
+            except OSError:
+                pass
+
+    def stop_writing(self) -> None:
+        self._stop_writing.set()
+
+
+def _allocations(before: Any) -> Tuple[List[Tuple[str, int, int]], int]:
+    # (site, bytes, blocks) allocated since tracing started (or since `before`) and the traced peak
+    import tracemalloc
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    after = tracemalloc.take_snapshot().filter_traces(filters)
+    if before is None:
+        statistics = [(s.traceback[0], s.size, s.count) for s in after.statistics("lineno")]
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    else:
+        diffs = after.compare_to(before.filter_traces(filters), "lineno")
+        statistics = [(d.traceback[0], d.size_diff, d.count_diff) for d in diffs if d.size_diff > 0]
+        peak_bytes = 0
+    return [(f"{_short_path(frame.filename)}:{frame.lineno}", size, count)
+            for frame, size, count in statistics], peak_bytes
+
+
+def _replaced(path: Path) -> Path:
+    return path.with_name(path.name + ".tmp")
+
+
+def _replace(path: Path) -> None:
+    _replaced(path).replace(path)
+
+
+def _write(path: Path, text: str) -> None:
+    _replaced(path).write_text(text)
+    _replace(path)
+
+
+def start_report_writer(profiler: Profiler, directory: str, interval: float = DEFAULT_REPORT_INTERVAL) -> threading.Thread:
+    """Write reports to a directory every interval seconds in a daemon thread."""
+    thread = threading.Thread(target=profiler.write_periodically, args=(Path(directory), interval),
+                              name="profiling-reports", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_report_writer_from_env(profiler: Profiler) -> Optional[threading.Thread]:
+    """Start a report writer if profiling is enabled and $MICROSCOPY_PROFILING_DIR is set."""
+    directory = os.environ.get(DIR_ENV)
+    if not directory or not profiler.enabled:
+        return None
+    try:
+        interval = float(os.environ.get(INTERVAL_ENV, DEFAULT_REPORT_INTERVAL))
+    except ValueError:
+        interval = DEFAULT_REPORT_INTERVAL
+    if not interval > 0:
+        interval = DEFAULT_REPORT_INTERVAL
+    return start_report_writer(profiler, directory, interval)
+
+
+# Process-wide profiler used by the server's tools
+PROFILER = Profiler()
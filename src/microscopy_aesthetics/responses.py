@@ -0,0 +1,117 @@
+"""
+Pre-serialized responses for list_microscopy_types and get_microscopy_profile.
+
+Profile data never changes within a profile-set version, so each distinct
+response (pretty or compact, optionally projected to a subset of fields) is
+serialized once and then served from the cache. A new profile set gets a new
+ResponseCache, derived from the previous one when only some profiles changed.
+"""
+
+import json
+from typing import AbstractSet, Dict, FrozenSet, Hashable, Iterable, List, Mapping, Optional
+
+from microscopy_aesthetics.compact import plain
+
+PRETTY = {"indent": 2}
+COMPACT = {"separators": (",", ":")}
+
+# Profile fields used only for resolving type names; never served
+INTERNAL_FIELDS = frozenset({"aliases"})
+
+
+class ResponseCache:
+    """Serialized payloads for one version of the profile set."""
+
+    def __init__(self, profiles: Mapping[str, Mapping], version: int = 0):
+        self.version = version
+        self._profiles = profiles
+        self._payloads: Dict[Hashable, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def derive(self, profiles: Mapping[str, Mapping], version: int,
+               changed: AbstractSet[str]) -> "ResponseCache":
+        """
+        Payloads for a new version of the profile set, keeping the profile
+        payloads of every type not in changed. The type list covers every
+        profile, so it is serialized again.
+        """
+        cache = ResponseCache(profiles, version)
+        cache._payloads = {
+            key: payload for key, payload in dict(self._payloads).items()
+            if key[0] == "profile" and key[1] not in changed and key[1] in profiles
+        }
+        return cache
+
+    def _serialize(self, key: Hashable, data, compact: bool) -> str:
+        payload = json.dumps(data, **(COMPACT if compact else PRETTY))
+        self._payloads[key] = payload
+        return payload
+
+    def list_types(self, compact: bool = False) -> str:
+        """JSON object of type -> display_name and description."""
+        key = ("list", compact)
+        payload = self._payloads.get(key)
+        if payload is not None:
+            return payload
+        types_info = {}
+        for name, profile in self._profiles.items():
+            types_info[name] = {
+                "display_name": profile["display_name"],
+                "description": profile["description"]
+            }
+        return self._serialize(key, types_info, compact)
+
+    @staticmethod
+    def _profile_key(microscopy_type: str, fields: Optional[Iterable[str]], compact: bool) -> Hashable:
+        projection: Optional[FrozenSet[str]] = None
+        if fields is not None:
+            projection = frozenset(fields)
+        return ("profile", microscopy_type, projection, compact)
+
+    def fields(self, microscopy_type: str) -> List[str]:
+        """Fields profile() serves for a type, in profile order."""
+        return [field for field in self._profiles[microscopy_type] if field not in INTERNAL_FIELDS]
+
+    def has_profile(
+        self,
+        microscopy_type: str,
+        fields: Optional[Iterable[str]] = None,
+        compact: bool = False
+    ) -> bool:
+        """Whether profile() would be served without loading or serializing anything."""
+        return self._profile_key(microscopy_type, fields, compact) in self._payloads
+
+    def profile(
+        self,
+        microscopy_type: str,
+        fields: Optional[Iterable[str]] = None,
+        compact: bool = False
+    ) -> str:
+        """
+        JSON for one profile, optionally limited to some fields. Internal
+        fields (aliases) are left out.
+
+        Args:
+            microscopy_type: Normalized profile key (must exist)
+            fields: Fields to include, in profile order; None for all fields
+            compact: Omit indentation
+
+        Raises:
+            KeyError: If a requested field is not served for the profile
+        """
+        key = self._profile_key(microscopy_type, fields, compact)
+        projection = key[2]
+        payload = self._payloads.get(key)
+        if payload is not None:
+            return payload
+
+        profile = {field: value for field, value in plain(self._profiles[microscopy_type]).items()
+                   if field not in INTERNAL_FIELDS}
+        if projection is not None:
+            missing = sorted(projection.difference(profile))
+            if missing:
+                raise KeyError(missing[0])
+            profile = {f: v for f, v in profile.items() if f in projection}
+        return self._serialize(key, profile, compact)
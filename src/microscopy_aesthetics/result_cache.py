@@ -0,0 +1,265 @@
+"""
+Opt-in memoization of enhanced prompts.
+
+Traffic repeats the same templated prompts with the same options, so results
+are kept in a bounded in-process LRU keyed on the normalized arguments (base
+prompt plus the resolved SuffixTable key). An optional SQLite tier shares
+results between server processes on one host; its rows are keyed by a digest
+of the suffix text and base prompt, so processes with different profile sets
+can never serve each other stale results.
+
+Enable with $MICROSCOPY_RESULT_CACHE=<max entries>; add
+$MICROSCOPY_RESULT_CACHE_SHARED=1 (or a database path) for the shared tier.
+The shared tier is best-effort: SQLite errors (a locked, corrupt or full
+database) are counted as shared_errors and the result is computed instead.
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import AbstractSet, Dict, List, Optional, Tuple
+
+from microscopy_aesthetics.paths import cache_dir
+
+CACHE_ENV = "MICROSCOPY_RESULT_CACHE"
+CACHE_BYTES_ENV = "MICROSCOPY_RESULT_CACHE_BYTES"
+SHARED_ENV = "MICROSCOPY_RESULT_CACHE_SHARED"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_SHARED_ROWS = 100_000
+# Rough per-entry bookkeeping cost on top of the two strings
+ENTRY_OVERHEAD = 200
+# Shared inserts between trims of the SQLite table
+TRIM_EVERY = 256
+
+# (base_prompt, microscopy_type, magnification, color_palette, num_characteristics)
+ResultKey = Tuple[str, str, str, str, int]
+
+COUNTERS = ("hits", "misses", "evictions", "shared_hits", "shared_misses", "shared_errors", "invalidations")
+
+
+class SharedResults:
+    """
+    SQLite-backed results shared by every process using the same file (WAL
+    mode). Rows past max_rows are trimmed least recently used first.
+
+    Raises:
+        sqlite3.Error: From every method, if the database is unusable
+    """
+
+    def __init__(self, path: Path, max_rows: int = DEFAULT_SHARED_ROWS):
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None,
+                                           check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "digest TEXT PRIMARY KEY, value TEXT NOT NULL, used INTEGER NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+    @staticmethod
+    def digest(base_prompt: str, suffix: str) -> str:
+        return hashlib.sha1(f"{suffix}\0{base_prompt}".encode("utf-8", "surrogatepass")).hexdigest()
+
+    def get(self, digest: str) -> Optional[str]:
+        """The stored result, marked as just used, or None."""
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM results WHERE digest = ?",
+                                           (digest,)).fetchone()
+            if row is not None:
+                self._connection.execute("UPDATE results SET used = ? WHERE digest = ?",
+                                         (time.time_ns(), digest))
+        return None if row is None else row[0]
+
+    def put(self, digest: str, value: str) -> int:
+        """
+        Store a result.
+
+        Returns:
+            Rows trimmed (least recently used first) to stay under max_rows
+        """
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (digest, value, used) VALUES (?, ?, ?)",
+                (digest, value, time.time_ns())
+            )
+            self._inserts += 1
+            if self._inserts % TRIM_EVERY:
+                return 0
+            excess = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_rows
+            if excess <= 0:
+                return 0
+            self._connection.execute(
+                "DELETE FROM results WHERE digest IN (SELECT digest FROM results ORDER BY used LIMIT ?)",
+                (excess,)
+            )
+            return excess
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM results")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class ResultCache:
+    """
+    Bounded LRU of enhanced prompts with hit, miss and eviction counters.
+
+    Args:
+        max_entries: Most results kept in memory
+        max_bytes: Approximate memory bound for the kept strings
+        shared: Optional cross-process tier consulted on in-memory misses
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = DEFAULT_MAX_BYTES,
+                 shared: Optional[SharedResults] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        # key -> (suffix, result)
+        self._entries: "OrderedDict[ResultKey, Tuple[str, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _size(key: ResultKey, value: str) -> int:
+        return len(key[0]) + len(value) + ENTRY_OVERHEAD
+
+    def get(self, key: ResultKey, suffix: str) -> Optional[str]:
+        """Cached result for key (whose suffix text is given), or None."""
+        # The lookup skips the lock: it is atomic and a concurrent eviction
+        # only makes the recency update fail
+        stored = self._entries.get(key)
+        # The suffix is compared too: a call still running against the previous
+        # profile set may store its result after a reload cleared the cache.
+        # Suffixes come from one table, so this is normally an identity check.
+        if stored is not None and (stored[0] is suffix or stored[0] == suffix):
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                pass
+            with self._lock:
+                self.counters["hits"] += 1
+            return stored[1]
+        with self._lock:
+            self.counters["misses"] += 1
+        if self.shared is None:
+            return None
+        try:
+            value = self.shared.get(SharedResults.digest(key[0], suffix))
+        except sqlite3.Error:
+            with self._lock:
+                self.counters["shared_errors"] += 1
+            return None
+        with self._lock:
+            self.counters["shared_hits" if value is not None else "shared_misses"] += 1
+        if value is not None:
+            self._remember(key, suffix, value)
+        return value
+
+    def put(self, key: ResultKey, suffix: str, value: str) -> None:
+        """Store a freshly computed result in memory and in the shared tier."""
+        self._remember(key, suffix, value)
+        if self.shared is not None:
+            try:
+                trimmed = self.shared.put(SharedResults.digest(key[0], suffix), value)
+            except sqlite3.Error:
+                with self._lock:
+                    self.counters["shared_errors"] += 1
+                return
+            if trimmed:
+                with self._lock:
+                    self.counters["evictions"] += trimmed
+
+    def _remember(self, key: ResultKey, suffix: str, value: str) -> None:
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._size(key, previous[1])
+            self._entries[key] = (suffix, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, (_, old_value) = self._entries.popitem(last=False)
+                self._bytes -= self._size(old_key, old_value)
+                self.counters["evictions"] += 1
+
+    def clear(self, microscopy_types: Optional[AbstractSet[str]] = None) -> None:
+        """Drop in-memory results: all of them, or those of some microscopy types (their profiles changed)."""
+        with self._lock:
+            if microscopy_types is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                for key in [k for k in self._entries if k[1] in microscopy_types]:
+                    self._bytes -= self._size(key, self._entries.pop(key)[1])
+            self.counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update(entries=len(self._entries), bytes=self._bytes,
+                         max_entries=self.max_entries, max_bytes=self.max_bytes,
+                         shared=self.shared is not None)
+        return stats
+
+    def prometheus_text(self) -> str:
+        """Counters in the Prometheus text exposition format."""
+        stats = self.stats()
+        lines: List[str] = []
+        for name in COUNTERS:
+            lines += [f"# TYPE microscopy_result_cache_{name}_total counter",
+                      f"microscopy_result_cache_{name}_total {stats[name]}"]
+        for name in ("entries", "bytes"):
+            lines += [f"# TYPE microscopy_result_cache_{name} gauge",
+                      f"microscopy_result_cache_{name} {stats[name]}"]
+        return "\n".join(lines) + "\n"
+
+
+def result_cache_from_env() -> Optional[ResultCache]:
+    """The cache configured by $MICROSCOPY_RESULT_CACHE*, or None when disabled (the default)."""
+    try:
+        max_entries = int(os.environ.get(CACHE_ENV, "0") or 0)
+    except ValueError:
+        max_entries = 0
+    if max_entries <= 0:
+        return None
+    setting = os.environ.get(CACHE_BYTES_ENV)
+    try:
+        max_bytes = int(setting) if setting else DEFAULT_MAX_BYTES
+    except ValueError:
+        max_bytes = 0
+    if max_bytes <= 0:
+        print(f"Ignoring {CACHE_BYTES_ENV}={setting!r}: expected a positive number of bytes; "
+              f"using {DEFAULT_MAX_BYTES}", file=sys.stderr)
+        max_bytes = DEFAULT_MAX_BYTES
+    shared = None
+    shared_setting = os.environ.get(SHARED_ENV, "")
+    if shared_setting and shared_setting.lower() not in ("0", "false", "no", "off"):
+        try:
+            path = (cache_dir() / "results.sqlite" if shared_setting.lower() in ("1", "true", "yes", "on")
+                    else Path(shared_setting))
+            shared = SharedResults(path)
+        except (OSError, sqlite3.Error) as e:
+            # The in-process tier still works without it
+            print(f"Shared result cache disabled: {e}", file=sys.stderr)
+    return ResultCache(max_entries, max_bytes, shared)
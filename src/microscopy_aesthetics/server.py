@@ -1,331 +1,391 @@
 from fastmcp import FastMCP
+import functools
 import json
-from typing import Optional
+import sys
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Mapping, Optional, Union
+
+from microscopy_aesthetics.batch import (
+    MAX_RESPONSE_BYTES,
+    OUTPUT_FORMATS,
+    BatchSpool,
+    items_from_prompts,
+    run_batch,
+)
+from microscopy_aesthetics.blending import blend_name, blend_spec, parse_blend
+from microscopy_aesthetics.concurrency import SingleFlight, executor_from_env
+from microscopy_aesthetics.enhancement import (
+    BUDGET_UNITS,
+    SuffixEntry,
+    compose,
+    compose_many,
+    compose_within,
+    normalize_type,
+    suffix_cost,
+)
+from microscopy_aesthetics.metrics import METRICS, ErrorResult
+from microscopy_aesthetics.paths import cache_dir
+from microscopy_aesthetics.profiling import PROFILER, SORTS as PROFILING_SORTS
+from microscopy_aesthetics.result_cache import ResultCache, result_cache_from_env
+from microscopy_aesthetics.snapshot import ProfileReloader, Snapshot
+from microscopy_aesthetics.store import ProfileStore
+from microscopy_aesthetics.variants import MAX_VARIANTS, new_seed, variants_json
 
 mcp = FastMCP("microscopy-aesthetics")
 
-# Profile data structure - all 7 microscopy types with aesthetic vocabulary
-MICROSCOPY_PROFILES = {
-    "fluorescence": {
-        "display_name": "Fluorescence",
-        "description": "Glowing cellular structures with luminous bodies and translucent layers",
-        "structure": ["glowing cellular structures", "illuminated organelles", "highlighted features", "distinct compartments", "labeled pathways"],
-        "material": ["translucent membranes", "luminous bodies", "transparent layers", "semi-permeable boundaries", "fluorescent markers"],
-        "color": ["vibrant greens", "electric blues", "hot pinks", "bright cyans", "neon yellows", "intense magentas"],
-        "texture": ["smooth membranes", "granular cytoplasm", "filamentous networks", "punctate signals", "diffuse glow"],
-        "composition": ["layered transparency", "overlapping signals", "depth through color", "selective illumination"],
-        "style": ["fluorescent microscopy", "immunofluorescence", "live cell imaging", "confocal projection"],
-        "quality": ["high contrast", "selective highlighting", "brilliant colors", "precise localization"],
-        "mood": ["scientific clarity", "targeted visualization", "functional mapping"],
-        "examples": ["fluorescent-stained cells", "immunolabeled tissues", "GFP expression", "multi-color FISH"],
-        "color_palette": {
-            "scientific": ["vibrant greens", "electric blues", "hot pinks", "bright cyans", "neon yellows", "intense magentas"],
-            "artistic": ["jewel tones", "ethereal glows", "luminescent accents", "chromatic intensity"],
-            "monochrome": ["bright highlights on dark background", "grayscale with fluorescent whites"]
-        },
-        "magnification_feel": {
-            "low": "tissue-level fluorescent regions with broad signal distribution",
-            "medium": "cellular organelle visualization with distinct compartmentalization",
-            "high": "subcellular molecular-scale localization with punctate detail"
-        }
-    },
-    "electron": {
-        "display_name": "Electron (SEM/TEM)",
-        "description": "Ultra-detailed nanoscale surfaces with dramatic shadows and three-dimensional relief",
-        "structure": ["ultra-detailed surfaces", "nanoscale textures", "fine filaments", "membrane ultrastructure", "crystalline arrays"],
-        "material": ["metallic surfaces", "shadowed topology", "three-dimensional relief", "textured coatings", "sharp edges"],
-        "color": ["grayscale gradients", "silver-white highlights", "deep blacks", "metallic sheens"],
-        "texture": ["rough surfaces", "smooth membranes", "fibrous networks", "granular details", "crystalline facets"],
-        "composition": ["dramatic shadows", "depth through contrast", "topographical relief", "textural emphasis"],
-        "style": ["scanning electron microscopy", "transmission electron microscopy", "ultra-high resolution"],
-        "quality": ["extreme detail", "nanoscale precision", "textural richness", "three-dimensional appearance"],
-        "mood": ["alien landscapes", "otherworldly surfaces", "microscopic terrain"],
-        "examples": ["cell surfaces", "bacterial structures", "tissue ultrastructure", "crystalline materials"],
-        "color_palette": {
-            "scientific": ["grayscale gradients", "silver-white highlights", "deep blacks", "metallic sheens"],
-            "artistic": ["platinum whites", "shadow blacks", "metallic accents", "high-contrast drama"],
-            "monochrome": ["pure grayscale", "silver-to-black gradient", "high-contrast relief"]
-        },
-        "magnification_feel": {
-            "low": "tissue-scale topography with broad textural variation and macro relief",
-            "medium": "cellular-scale ultrastructure with detailed surface features and membrane topology",
-            "high": "molecular-scale atomic arrangements with crystalline precision and nanoscale texturing"
-        }
-    },
-    "phase_contrast": {
-        "display_name": "Phase Contrast",
-        "description": "Transparent boundaries with refractive halos and ethereal ghost-like structures",
-        "structure": ["transparent boundaries", "cellular outlines", "refractive halos", "phase shifts", "gradient edges"],
-        "material": ["semi-transparent cells", "clear media", "refractive interfaces", "optical density variations"],
-        "color": ["grayscale with optical halos", "subtle contrast", "light-dark boundaries"],
-        "texture": ["smooth gradients", "halo effects", "edge enhancement", "translucent bodies"],
-        "composition": ["overlapping transparencies", "layered optical sections", "depth through refraction"],
-        "style": ["phase contrast microscopy", "differential interference contrast", "relief imaging"],
-        "quality": ["natural appearance", "living cell observation", "three-dimensional relief", "halo artifacts"],
-        "mood": ["ethereal", "ghost-like", "translucent", "observational"],
-        "examples": ["living cells", "unstained cellular dynamics", "transparent organisms", "culture monitoring"],
-        "color_palette": {
-            "scientific": ["grayscale with subtle contrast", "optical halos in light tones"],
-            "artistic": ["pearlescent halos", "translucent overlays", "subtle shadow depth"],
-            "monochrome": ["pure grayscale with halo emphasis", "high-key luminosity"]
-        },
-        "magnification_feel": {
-            "low": "broad cellular boundaries with subtle refractive halos across tissue regions",
-            "medium": "individual cell outlines with clear phase-shift effects and optical density variation",
-            "high": "subcellular membrane boundaries with fine refractive detail and edge-enhancement artifacts"
-        }
-    },
-    "confocal": {
-        "display_name": "Confocal",
-        "description": "Sharp optical sections with volumetric depth and three-dimensional reconstruction clarity",
-        "structure": ["sharp optical sections", "z-stack projections", "three-dimensional reconstructions", "layered imaging"],
-        "material": ["optically sectioned layers", "volumetric data", "stacked focal planes", "depth-resolved structures"],
-        "color": ["multiple fluorescence channels", "merged color overlays", "depth-coded colors"],
-        "texture": ["crisp details", "minimal blur", "sectioned appearance", "volumetric rendering"],
-        "composition": ["layered depth", "three-dimensional space", "focal plane stacking", "volumetric organization"],
-        "style": ["confocal laser scanning microscopy", "optical sectioning", "3D reconstruction"],
-        "quality": ["exceptional clarity", "depth resolution", "three-dimensional detail", "minimal out-of-focus light"],
-        "mood": ["precise", "analytical", "spatially resolved", "architecturally detailed"],
-        "examples": ["tissue architecture", "cellular 3D structure", "subcellular localization", "thick specimen imaging"],
-        "color_palette": {
-            "scientific": ["multiple fluorescence channels", "merged color overlays", "depth-coded color progression"],
-            "artistic": ["layered chromatic depth", "volumetric color shifts", "3D-aware palettes"],
-            "monochrome": ["depth-coded grayscale", "layered intensity variation"]
-        },
-        "magnification_feel": {
-            "low": "volumetric tissue architecture with broad three-dimensional organization visible across planes",
-            "medium": "cellular 3D structure with distinct focal planes revealing organelle arrangement and layering",
-            "high": "subcellular molecular-scale localization with precise z-depth mapping and volumetric detail"
-        }
-    },
-    "brightfield": {
-        "display_name": "Brightfield",
-        "description": "Natural tissue appearance with histological stains and recognizable anatomical features",
-        "structure": ["natural tissue appearance", "histological sections", "stained preparations", "anatomical features"],
-        "material": ["tissue texture", "cellular morphology", "stained components", "natural coloration"],
-        "color": ["histological stains", "pinks", "purples", "blues", "natural tissue colors", "H&E appearance"],
-        "texture": ["tissue grain", "cellular patterns", "fibrous structures", "glandular organization"],
-        "composition": ["tissue architecture", "organ structure", "anatomical arrangement", "pathological features"],
-        "style": ["brightfield microscopy", "histology", "pathology", "stained sections"],
-        "quality": ["natural appearance", "diagnostic clarity", "recognizable morphology", "classical microscopy"],
-        "mood": ["medical", "diagnostic", "anatomical", "educational"],
-        "examples": ["H&E stained tissue", "pathology slides", "histological sections", "medical diagnosis"],
-        "color_palette": {
-            "scientific": ["H&E pinks", "purples", "blues", "natural tissue browns"],
-            "artistic": ["warm histological tones", "rich stain colors", "subtle tissue variations"],
-            "monochrome": ["sepia tones", "grayscale histological rendering"]
-        },
-        "magnification_feel": {
-            "low": "tissue-level organ and glandular architecture with broad anatomical organization",
-            "medium": "cellular morphology and tissue type identification with clear histological detail",
-            "high": "subcellular features and stain localization with diagnostic precision at near-ultrastructural level"
-        }
-    },
-    "darkfield": {
-        "display_name": "Darkfield",
-        "description": "Bright objects on dark background with dramatic edge illumination and scattered light",
-        "structure": ["bright objects on dark background", "scattered light", "edge illumination", "suspended particles"],
-        "material": ["reflective surfaces", "light-scattering bodies", "bright against black", "rim lighting"],
-        "color": ["bright specimens against black void", "edge glow", "scattered light colors"],
-        "texture": ["glowing edges", "bright particles", "illuminated contours", "scattered highlights"],
-        "composition": ["dramatic contrast", "floating in darkness", "isolated subjects", "scattered light patterns"],
-        "style": ["darkfield microscopy", "scattered light imaging", "edge enhancement"],
-        "quality": ["high contrast", "dramatic lighting", "silhouette effects", "revealing transparency"],
-        "mood": ["dramatic", "mysterious", "isolated", "theatrical"],
-        "examples": ["microorganisms in liquid", "unstained specimens", "particle visualization", "spiral bacteria"],
-        "color_palette": {
-            "scientific": ["bright highlights on black", "edge glow colors", "scattered light spectrum"],
-            "artistic": ["dramatic rim lighting", "neon-like glow", "theatrical shadows"],
-            "monochrome": ["pure black background with bright white highlights", "extreme contrast"]
-        },
-        "magnification_feel": {
-            "low": "broad particles and structures glowing against dark field with visible scatter patterns",
-            "medium": "individual specimen edge illumination with clear rim lighting and defined contours",
-            "high": "molecular-scale structure revealed through scattered light with fine edge detail and transparency effects"
-        }
-    },
-    "multiphoton": {
-        "display_name": "Multiphoton",
-        "description": "Deep tissue penetration with autofluorescence and minimal phototoxicity appearance",
-        "structure": ["deep tissue penetration", "autofluorescence structures", "intact tissue architecture", "minimal photodamage"],
-        "material": ["endogenous fluorophores", "intact biological matrices", "native tissue layers", "minimal perturbation"],
-        "color": ["red autofluorescence", "green intrinsic signals", "infrared penetration tones", "warm tissue glows"],
-        "texture": ["natural tissue texture", "preserved architecture", "minimal blur", "native organization"],
-        "composition": ["three-dimensional depth", "layered tissue", "preserved structure", "volumetric clarity"],
-        "style": ["multiphoton microscopy", "two-photon excitation", "deep tissue imaging"],
-        "quality": ["deep penetration", "minimal phototoxicity", "native fluorescence", "three-dimensional detail"],
-        "mood": ["biological authenticity", "preserved vitality", "native structure", "gentle illumination"],
-        "examples": ["in vivo imaging", "intact tissue stacks", "neuronal architecture", "vascular networks"],
-        "color_palette": {
-            "scientific": ["red autofluorescence", "green intrinsic signals", "warm tissue tones"],
-            "artistic": ["warm biological glows", "preserved color authenticity", "soft luminescence"],
-            "monochrome": ["warm grayscale", "golden-toned depth"]
-        },
-        "magnification_feel": {
-            "low": "broad tissue architecture with deep volumetric penetration showing interconnected structures",
-            "medium": "cellular and organelle detail within preserved tissue context with depth-resolved clarity",
-            "high": "subcellular organelles and molecular structures within intact biological environment"
-        }
-    }
+# Profile data - one YAML file per microscopy type under ologs/ (plus
+# $MICROSCOPY_PROFILE_PATH), parsed lazily on first access
+MICROSCOPY_PROFILES = ProfileStore()
+
+# Hand-picked suggestion keywords, matched alongside every vocabulary phrase
+SUGGESTION_KEYWORDS = {
+    "fluorescence": ["glow", "luminous", "neon", "fluorescent", "bright", "vivid", "color", "channel"],
+    "electron": ["detail", "ultra", "nanoscale", "texture", "rough", "metallic", "relief", "shadow"],
+    "phase_contrast": ["transparent", "ghost", "ethereal", "refract", "halo", "living", "natural", "unstained"],
+    "confocal": ["3d", "three-dimensional", "depth", "volumetric", "layer", "optical section", "stack", "precise"],
+    "brightfield": ["tissue", "histology", "pathology", "stain", "medical", "diagnostic", "anatomy", "section"],
+    "darkfield": ["contrast", "dramatic", "dark", "rim", "light", "particle", "edge", "theatrical"],
+    "multiphoton": ["deep", "penetration", "intact", "native", "autofluorescence", "in vivo", "biological", "preserved"]
 }
 
-@mcp.tool()
+SUGGESTION_MODES = ("keywords", "similarity")
+# Top matches mixed into a suggested blend
+BLEND_SUGGESTION_TYPES = 3
+METRICS_FORMATS = ("json", "prometheus")
+
+# Opt-in memoization of enhance_prompt_with_microscopy ($MICROSCOPY_RESULT_CACHE)
+_RESULT_CACHE: Optional[ResultCache] = result_cache_from_env()
+
+
+def _profiles_published(changed: Optional[FrozenSet[str]]) -> None:
+    if _RESULT_CACHE is not None:
+        _RESULT_CACHE.clear(changed)
+
+
+# The current profile set and everything derived from it. Tools read
+# PROFILE_SNAPSHOTS.current once per call; reloads publish a new snapshot.
+PROFILE_SNAPSHOTS = ProfileReloader(MICROSCOPY_PROFILES, SUGGESTION_KEYWORDS, _profiles_published)
+
+
+def profiles_changed() -> int:
+    """
+    Re-read profile files and rebuild everything derived from MICROSCOPY_PROFILES.
+    
+    Call after editing profile files or assigning profiles in code.
+    
+    Returns:
+        The new profile-set version
+    """
+    return PROFILE_SNAPSHOTS.rebuild().version
+
+
+def reload_profiles() -> FrozenSet[str]:
+    """
+    Reload only the profiles whose files (or in-code assignments) changed.
+    
+    Returns:
+        The changed microscopy types; empty if nothing changed
+    """
+    return PROFILE_SNAPSHOTS.reload()
+
+
+@PROFILER.profile
 def enhance_prompt_with_microscopy(
     base_prompt: str,
-    microscopy_type: str,
+    microscopy_type: Union[str, Dict[str, float]],
     magnification: str = "medium",
     color_palette: str = "scientific",
-    aesthetic_strength: str = "balanced"
+    aesthetic_strength: str = "balanced",
+    variants: int = 1,
+    seed: Optional[int] = None,
+    budget: Optional[int] = None,
+    budget_unit: str = "words"
 ) -> str:
     """
     Enhance an image generation prompt with microscopy aesthetic vocabulary.
     
     Args:
         base_prompt: The original image description to enhance
-        microscopy_type: Type of microscopy (fluorescence, electron, phase_contrast, confocal, brightfield, darkfield, multiphoton)
+        microscopy_type: Type of microscopy (fluorescence, electron, phase_contrast, confocal, brightfield, darkfield, multiphoton),
+            or a weighted blend such as {"confocal": 0.7, "darkfield": 0.3} or "confocal:0.7+darkfield:0.3"
         magnification: Scale level - low (tissue), medium (cellular), high (subcellular/molecular)
         color_palette: Color mode - scientific (authentic), artistic (stylized), monochrome
         aesthetic_strength: How prominently to apply characteristics - subtle (2-3), balanced (4-5), strong (6+)
+        variants: Number of distinct enhancements with different phrase combinations (1-1000);
+            a long base prompt is shortened so every variant keeps its whole suffix
+        seed: Seed for choosing variant phrases; the same seed returns the same variants
+        budget: Maximum length of the enhanced prompt; only the base prompt is shortened to fit (replaces the 80-word limit)
+        budget_unit: Unit of the budget - words, chars, or tokens (CLIP-style word and punctuation pieces)
     
     Returns:
-        Enhanced prompt (60-80 words) with microscopy aesthetic vocabulary
+        Enhanced prompt (60-80 words) with microscopy aesthetic vocabulary; with
+        variants > 1 or a seed, JSON with the variants, the seed used and how
+        many phrase combinations are available (an upper bound on distinct variants)
     """
     
-    microscopy_type = microscopy_type.lower().replace(" ", "_")
+    microscopy_type = blend_spec(microscopy_type)
+    snapshot = PROFILE_SNAPSHOTS.current
     
-    if microscopy_type not in MICROSCOPY_PROFILES:
-        available = ", ".join(MICROSCOPY_PROFILES.keys())
-        return f"Error: Unknown microscopy type '{microscopy_type}'. Available types: {available}"
+    if variants != 1 or seed is not None:
+        return _enhance_variants(snapshot, base_prompt, microscopy_type, magnification, color_palette,
+                                 aesthetic_strength, variants, seed, budget, budget_unit)
     
-    profile = MICROSCOPY_PROFILES[microscopy_type]
+    if budget is not None:
+        key = snapshot.suffix_table.resolve(microscopy_type, magnification, color_palette, aesthetic_strength)
+        if key is None:
+            return ErrorResult(f"Error: {snapshot.suffix_table.unknown_message(microscopy_type)}")
+        enhanced = _compose_all_within(base_prompt, [snapshot.suffix_table.entry(key)], budget, budget_unit)
+        return enhanced if isinstance(enhanced, str) else enhanced[0]
     
-    # Select characteristics based on strength
-    strength_map = {
-        "subtle": 2,
-        "balanced": 4,
-        "strong": 6
-    }
-    num_characteristics = strength_map.get(aesthetic_strength.lower(), 4)
-    
-    # Build characteristic pool
-    characteristics = []
-    characteristics.extend(profile["structure"][:2])  # Always include structure
-    characteristics.extend(profile["material"][:1])
-    characteristics.extend(profile["color"][:1])
-    characteristics.extend(profile["texture"][:1])
-    
-    if num_characteristics >= 5:
-        characteristics.extend(profile["composition"][:1])
-    if num_characteristics >= 6:
-        characteristics.extend(profile["style"][:1])
-    
-    # Get magnification-appropriate language
-    mag_key = magnification.lower()
-    if mag_key not in profile["magnification_feel"]:
-        mag_key = "medium"
-    mag_language = profile["magnification_feel"][mag_key]
-    
-    # Get color palette selection
-    color_key = color_palette.lower()
-    if color_key not in profile["color_palette"]:
-        color_key = "scientific"
-    color_selection = profile["color_palette"][color_key]
-    
-    # Build enhanced prompt
-    enhanced = f"{base_prompt}, rendered with {profile['display_name'].lower()} microscopy aesthetics. "
-    enhanced += f"Features {', '.join(characteristics[:num_characteristics])}. "
-    enhanced += f"Color palette emphasizes {color_selection[0]}. "
-    enhanced += f"Captures {mag_language}. "
-    enhanced += "Highly detailed 8k scientific visualization."
-    
-    # Trim to 60-80 words and ensure natural flow
-    words = enhanced.split()
-    if len(words) > 80:
-        enhanced = " ".join(words[:80]) + "."
-    
-    return enhanced.strip()
+    if _RESULT_CACHE is not None:
+        return _enhance_cached(_RESULT_CACHE, snapshot, base_prompt, microscopy_type, magnification,
+                               color_palette, aesthetic_strength)
+    
+    entry = snapshot.suffix_table.lookup(microscopy_type, magnification, color_palette, aesthetic_strength)
+    if entry is None:
+        return ErrorResult(f"Error: {snapshot.suffix_table.unknown_message(microscopy_type)}")
+    
+    suffix, suffix_words = entry
+    return compose(base_prompt, suffix, suffix_words)
 
 
-@mcp.tool()
-def list_microscopy_types() -> str:
+def _enhance_cached(
+    cache: ResultCache,
+    snapshot: Snapshot,
+    base_prompt: str,
+    microscopy_type: str,
+    magnification: str,
+    color_palette: str,
+    aesthetic_strength: str
+) -> str:
+    table = snapshot.suffix_table
+    key = table.resolve(microscopy_type, magnification, color_palette, aesthetic_strength)
+    if key is None:
+        return ErrorResult(f"Error: {table.unknown_message(microscopy_type)}")
+    suffix, suffix_words = table.entry(key)
+    result_key = (base_prompt,) + key
+    result = cache.get(result_key, suffix)
+    if result is None:
+        result = compose(base_prompt, suffix, suffix_words)
+        cache.put(result_key, suffix, result)
+    return result
+
+
+def _enhance_variants(
+    snapshot: Snapshot,
+    base_prompt: str,
+    microscopy_type: str,
+    magnification: str,
+    color_palette: str,
+    aesthetic_strength: str,
+    variants: int,
+    seed: Optional[int],
+    budget: Optional[int],
+    budget_unit: str
+) -> str:
+    if not 1 <= variants <= MAX_VARIANTS:
+        return ErrorResult(f"Error: variants must be between 1 and {MAX_VARIANTS}")
+    key = snapshot.suffix_table.resolve(microscopy_type, magnification, color_palette, aesthetic_strength)
+    if key is None:
+        return ErrorResult(f"Error: {snapshot.suffix_table.unknown_message(microscopy_type)}")
+    space = snapshot.variant_space(key)
+    if seed is None:
+        seed = new_seed()
+    entries = space.sample(variants, seed)
+    if budget is None:
+        enhanced = compose_many(base_prompt, entries)
+    else:
+        enhanced = _compose_all_within(base_prompt, entries, budget, budget_unit)
+        if isinstance(enhanced, str):
+            return enhanced
+    # Suffixes are distinct and kept whole; this only matters for a suffix over the word limit
+    enhanced = list(dict.fromkeys(enhanced))
+    return variants_json(seed, len(space), enhanced)
+
+
+def _compose_all_within(base_prompt: str, entries: List[SuffixEntry], budget: int, budget_unit: str):
+    # Enhanced prompts for each suffix within the budget, or an error message
+    if budget_unit not in BUDGET_UNITS:
+        return ErrorResult(f"Error: Unknown budget unit '{budget_unit}'. Available units: {', '.join(BUDGET_UNITS)}")
+    needed = max(suffix_cost(suffix, words, budget_unit) for suffix, words in entries)
+    if budget < needed:
+        return ErrorResult(f"Error: A budget of {budget} {budget_unit} cannot fit the microscopy suffix "
+                           f"({needed} {budget_unit})")
+    return [compose_within(base_prompt, suffix, words, budget, budget_unit) for suffix, words in entries]
+
+
+@PROFILER.profile
+def enhance_prompts_batch(
+    items: Optional[List[Dict[str, Any]]] = None,
+    prompts: Optional[List[str]] = None,
+    microscopy_type: Optional[Union[str, Dict[str, float]]] = None,
+    magnification: str = "medium",
+    color_palette: str = "scientific",
+    aesthetic_strength: str = "balanced",
+    output_format: str = "json",
+    offset: int = 0,
+    max_response_bytes: int = MAX_RESPONSE_BYTES,
+    cursor: Optional[str] = None
+) -> str:
+    """
+    Enhance many prompts in one call.
+    
+    Pass either `items` (each with base_prompt, microscopy_type and optional
+    magnification, color_palette, aesthetic_strength) or `prompts` plus one
+    shared configuration. A microscopy_type can be a weighted blend, as in
+    enhance_prompt_with_microscopy. Results keep input order; invalid items get an error
+    entry instead of failing the whole batch.
+    
+    A batch whose results do not fit one response returns a cursor; call
+    again with only the cursor (plus output_format and max_response_bytes)
+    for the next results. Items are sent once, however many calls it takes.
+    
+    Args:
+        items: Per-item enhancement requests
+        prompts: Base prompts that all use the configuration below
+        microscopy_type: Type of microscopy (or weighted blend) applied to every entry in `prompts`
+        magnification: Scale level for `prompts` - low, medium, high
+        color_palette: Color mode for `prompts` - scientific, artistic, monochrome
+        aesthetic_strength: Strength for `prompts` - subtle, balanced, strong
+        output_format: json (one object) or jsonl (one line per item plus a summary line)
+        offset: Index of the first item to process; only needed to resume a
+            truncated batch that returned no cursor
+        max_response_bytes: Response size cap, summary included; remaining items are continued via cursor
+        cursor: Cursor from a truncated response, to continue that batch
+    
+    Returns:
+        Per-item results with count, errors, next_offset and cursor (both null
+        when the batch is complete)
+    """
+    if sum(source is not None for source in (items, prompts, cursor)) != 1:
+        return ErrorResult("Error: Provide exactly one of 'items', 'prompts' or 'cursor'")
+    if output_format not in OUTPUT_FORMATS:
+        formats = ", ".join(OUTPUT_FORMATS)
+        return ErrorResult(f"Error: Unknown output format '{output_format}'. Available formats: {formats}")
+    if offset < 0:
+        return ErrorResult("Error: offset must be non-negative")
+    table = PROFILE_SNAPSHOTS.current.suffix_table
+    spool = _batch_spool()
+    
+    if cursor is not None:
+        spooled = spool.open(cursor) if spool is not None else None
+        if spooled is None:
+            return ErrorResult(f"Error: Unknown or expired cursor '{cursor}'. "
+                               "Resend the remaining items with offset set to the last next_offset")
+        return run_batch(table, spooled, 0, output_format, max_response_bytes)
+    
+    if prompts is not None:
+        if microscopy_type is None:
+            return ErrorResult("Error: 'microscopy_type' is required with 'prompts'")
+        config = {
+            "microscopy_type": microscopy_type,
+            "magnification": magnification,
+            "color_palette": color_palette,
+            "aesthetic_strength": aesthetic_strength
+        }
+        items = items_from_prompts(prompts, config)
+    
+    return run_batch(table, items, offset, output_format, max_response_bytes, spool)
+
+
+def _batch_spool() -> Optional[BatchSpool]:
+    # Under the cache directory, so every worker on the host sees the same batches
+    try:
+        return BatchSpool(cache_dir() / "batches")
+    except OSError:
+        return None
+
+
+@PROFILER.profile
+def list_microscopy_types(compact: bool = False) -> str:
     """
     List all available microscopy types with brief descriptions.
     
+    Args:
+        compact: Return JSON without indentation
+    
     Returns:
         JSON string with all available microscopy profiles
     """
-    types_info = {}
-    for key, profile in MICROSCOPY_PROFILES.items():
-        types_info[key] = {
-            "display_name": profile["display_name"],
-            "description": profile["description"]
-        }
-    return json.dumps(types_info, indent=2)
+    return PROFILE_SNAPSHOTS.current.responses.list_types(compact)
 
 
-@mcp.tool()
-def get_microscopy_profile(microscopy_type: str) -> str:
+@PROFILER.profile
+def get_microscopy_profile(
+    microscopy_type: str,
+    fields: Optional[List[str]] = None,
+    compact: bool = False
+) -> str:
     """
     Get the complete aesthetic vocabulary for a specific microscopy type.
     
     Args:
         microscopy_type: The microscopy type to inspect (e.g., 'fluorescence', 'electron')
+        fields: Only return these profile fields (e.g., ['color_palette', 'magnification_feel'])
+        compact: Return JSON without indentation
     
     Returns:
         Complete profile with all aesthetic characteristics
     """
-    microscopy_type = microscopy_type.lower().replace(" ", "_")
+    snapshot = PROFILE_SNAPSHOTS.current
+    name = normalize_type(microscopy_type)
+    microscopy_type = snapshot.suffix_table.canonical_type(name)
     
-    if microscopy_type not in MICROSCOPY_PROFILES:
-        available = ", ".join(MICROSCOPY_PROFILES.keys())
-        return f"Error: Unknown microscopy type '{microscopy_type}'. Available types: {available}"
+    if microscopy_type is None:
+        return ErrorResult(f"Error: {snapshot.suffix_table.unknown_message(name)}")
     
-    profile = MICROSCOPY_PROFILES[microscopy_type]
-    return json.dumps(profile, indent=2)
+    try:
+        return snapshot.responses.profile(microscopy_type, fields, compact)
+    except KeyError as e:
+        available = ", ".join(snapshot.responses.fields(microscopy_type))
+        return ErrorResult(f"Error: Unknown profile field '{e.args[0]}'. Available fields: {available}")
 
 
-@mcp.tool()
-def suggest_microscopy_type(description: str) -> str:
+@PROFILER.profile
+def suggest_microscopy_type(description: str, mode: str = "keywords", blend: bool = False) -> str:
     """
     Suggest matching microscopy types from a natural language description.
     
     Args:
         description: Natural language description of desired aesthetic
+        mode: keywords (count matched vocabulary) or similarity (TF-IDF cosine similarity, needs numpy)
+        blend: Also rank first a blend of the top matches weighted by their scores, usable as microscopy_type
         
     Returns:
         Ranked suggestions with match explanations
     """
-    description_lower = description.lower()
-    
-    # Keyword mapping for suggestions
-    keyword_map = {
-        "fluorescence": ["glow", "luminous", "neon", "fluorescent", "bright", "vivid", "color", "channel"],
-        "electron": ["detail", "ultra", "nanoscale", "texture", "rough", "metallic", "relief", "shadow"],
-        "phase_contrast": ["transparent", "ghost", "ethereal", "refract", "halo", "living", "natural", "unstained"],
-        "confocal": ["3d", "three-dimensional", "depth", "volumetric", "layer", "optical section", "stack", "precise"],
-        "brightfield": ["tissue", "histology", "pathology", "stain", "medical", "diagnostic", "anatomy", "section"],
-        "darkfield": ["contrast", "dramatic", "dark", "rim", "light", "particle", "edge", "theatrical"],
-        "multiphoton": ["deep", "penetration", "intact", "native", "autofluorescence", "in vivo", "biological", "preserved"]
-    }
-    
-    scores = {}
-    for microscopy_type, keywords in keyword_map.items():
-        score = sum(1 for keyword in keywords if keyword in description_lower)
-        scores[microscopy_type] = score
-    
-    # Sort by score
-    sorted_suggestions = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    if mode not in SUGGESTION_MODES:
+        return ErrorResult(f"Error: Unknown suggestion mode '{mode}'. Available modes: {', '.join(SUGGESTION_MODES)}")
     
+    snapshot = PROFILE_SNAPSHOTS.current
     suggestions = []
-    for microscopy_type, score in sorted_suggestions[:3]:
-        if score > 0:
-            profile = MICROSCOPY_PROFILES[microscopy_type]
+    scores = []
+    if mode == "similarity":
+        try:
+            index = snapshot.similarity_index()
+        except ImportError:
+            return ErrorResult("Error: similarity mode requires numpy "
+                               "(pip install microscopy-aesthetics-mcp[similarity])")
+        for microscopy_type, score in index.rank(description):
+            scores.append((microscopy_type, score))
+            profile = snapshot.profiles[microscopy_type]
             suggestions.append({
                 "type": microscopy_type,
                 "display_name": profile["display_name"],
-                "confidence": "high" if score >= 3 else "medium" if score >= 1 else "low",
-                "reason": f"Matched {score} aesthetic keywords"
+                "confidence": "high" if score >= 0.35 else "medium" if score >= 0.15 else "low",
+                "score": round(score, 4),
+                "reason": f"TF-IDF cosine similarity {score:.2f}"
             })
+    else:
+        for microscopy_type, score in snapshot.keyword_matcher().rank(description)[:3]:
+            if score > 0:
+                scores.append((microscopy_type, score))
+                profile = snapshot.profiles[microscopy_type]
+                suggestions.append({
+                    "type": microscopy_type,
+                    "display_name": profile["display_name"],
+                    "confidence": "high" if score >= 3 else "medium" if score >= 1 else "low",
+                    "reason": f"Matched {score} aesthetic keywords"
+                })
     
     if not suggestions:
         # Return default if no matches
@@ -335,9 +395,212 @@ def suggest_microscopy_type(description: str) -> str:
             "confidence": "low",
             "reason": "No strong matches; brightfield recommended as versatile default"
         })
+    elif blend:
+        mixed = _suggested_blend(snapshot, scores)
+        if mixed is not None:
+            mixed["confidence"] = suggestions[0]["confidence"]
+            suggestions.insert(0, mixed)
     
     return json.dumps(suggestions, indent=2)
 
 
+def _suggested_blend(snapshot: Snapshot, scores: List[Any]) -> Optional[Dict[str, Any]]:
+    # The top positive matches as one blend, weighted by score
+    top = [(microscopy_type, score) for microscopy_type, score in scores[:BLEND_SUGGESTION_TYPES] if score > 0]
+    if len(top) < 2:
+        return None
+    members = parse_blend("+".join(f"{t}:{score}" for t, score in top), snapshot.profiles)
+    if len(members) < 2:
+        return None
+    name = blend_name(members)
+    return {
+        "type": name,
+        "display_name": snapshot.suffix_table.profile(name)["display_name"],
+        "confidence": None,
+        "weights": dict(members),
+        "reason": f"Blend of the top {len(members)} matches weighted by score"
+    }
+
+
+# Async tool variants - what MCP clients call. Cheap calls run inline on the
+# event loop (no thread hop); CPU-heavy ones go to a bounded executor, and
+# concurrent identical profile and enhancement requests share one computation.
+# The sync functions above stay importable for direct use.
+
+# Work larger than these is offloaded from the event loop
+OFFLOAD_PROMPT_CHARS = 4096
+OFFLOAD_BATCH_ITEMS = 64
+
+_EXECUTOR = executor_from_env()
+_SINGLE_FLIGHT = SingleFlight()
+
+
+def _type_label(microscopy_type: Any) -> Any:
+    # Blends passed as {type: weight} are counted under their blend string, not a dict repr
+    return blend_spec(microscopy_type) if isinstance(microscopy_type, Mapping) else microscopy_type
+
+
+def _async_tool(sync_tool: Callable[..., str], *tracked: str):
+    """Register the decorated coroutine as the MCP tool for sync_tool (same name, signature and docs)."""
+    def register(variant: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+        functools.update_wrapper(variant, sync_tool)
+        instrument = METRICS.instrument(*tracked, labels={"microscopy_type": _type_label})
+        return mcp.tool()(instrument(variant))
+    return register
+
+
+@_async_tool(enhance_prompt_with_microscopy,
+             "microscopy_type", "magnification", "color_palette", "aesthetic_strength")
+async def enhance_prompt_with_microscopy_async(
+    base_prompt: str,
+    microscopy_type: Union[str, Dict[str, float]],
+    magnification: str = "medium",
+    color_palette: str = "scientific",
+    aesthetic_strength: str = "balanced",
+    variants: int = 1,
+    seed: Optional[int] = None,
+    budget: Optional[int] = None,
+    budget_unit: str = "words"
+) -> str:
+    args = (base_prompt, microscopy_type, magnification, color_palette, aesthetic_strength)
+    if variants != 1 or seed is not None:
+        if variants <= OFFLOAD_BATCH_ITEMS:
+            return enhance_prompt_with_microscopy(*args, variants, seed, budget, budget_unit)
+        return await _EXECUTOR.run(enhance_prompt_with_microscopy, *args, variants, seed, budget, budget_unit)
+    if budget is not None:
+        # O(budget) whatever the prompt length, so never worth a thread
+        return enhance_prompt_with_microscopy(*args, budget=budget, budget_unit=budget_unit)
+    if len(base_prompt) < OFFLOAD_PROMPT_CHARS:
+        return enhance_prompt_with_microscopy(*args)
+    snapshot = PROFILE_SNAPSHOTS.current
+    key = snapshot.suffix_table.resolve(blend_spec(microscopy_type), magnification, color_palette,
+                                        aesthetic_strength)
+    if key is None:
+        return enhance_prompt_with_microscopy(*args)
+    return await _SINGLE_FLIGHT.run(("enhance", snapshot.version, base_prompt) + key,
+                                    _EXECUTOR.run, enhance_prompt_with_microscopy, *args)
+
+
+@_async_tool(enhance_prompts_batch, "microscopy_type", "output_format")
+async def enhance_prompts_batch_async(
+    items: Optional[List[Dict[str, Any]]] = None,
+    prompts: Optional[List[str]] = None,
+    microscopy_type: Optional[Union[str, Dict[str, float]]] = None,
+    magnification: str = "medium",
+    color_palette: str = "scientific",
+    aesthetic_strength: str = "balanced",
+    output_format: str = "json",
+    offset: int = 0,
+    max_response_bytes: int = MAX_RESPONSE_BYTES,
+    cursor: Optional[str] = None
+) -> str:
+    args = (items, prompts, microscopy_type, magnification, color_palette, aesthetic_strength,
+            output_format, offset, max_response_bytes, cursor)
+    # A cursor continues a batch that already filled a response, so it is never small
+    if cursor is None and len(items or prompts or ()) <= OFFLOAD_BATCH_ITEMS:
+        return enhance_prompts_batch(*args)
+    return await _EXECUTOR.run(enhance_prompts_batch, *args)
+
+
+@_async_tool(list_microscopy_types, "compact")
+async def list_microscopy_types_async(compact: bool = False) -> str:
+    return list_microscopy_types(compact)
+
+
+@_async_tool(get_microscopy_profile, "microscopy_type", "compact")
+async def get_microscopy_profile_async(
+    microscopy_type: str,
+    fields: Optional[List[str]] = None,
+    compact: bool = False
+) -> str:
+    snapshot = PROFILE_SNAPSHOTS.current
+    normalized = snapshot.suffix_table.canonical_type(normalize_type(microscopy_type))
+    if normalized is None or snapshot.responses.has_profile(normalized, fields, compact):
+        return get_microscopy_profile(microscopy_type, fields, compact)
+    # Cold: the profile is loaded and serialized once, however many sessions ask at the same time
+    projection = None if fields is None else frozenset(fields)
+    return await _SINGLE_FLIGHT.run(("profile", snapshot.version, normalized, projection, compact),
+                                    _EXECUTOR.run, get_microscopy_profile, microscopy_type, fields, compact)
+
+
+@_async_tool(suggest_microscopy_type, "mode", "blend")
+async def suggest_microscopy_type_async(description: str, mode: str = "keywords", blend: bool = False) -> str:
+    if mode == "keywords" and len(description) < OFFLOAD_PROMPT_CHARS:
+        return suggest_microscopy_type(description, mode, blend)
+    # Similarity scoring runs in numpy, which releases the GIL
+    return await _EXECUTOR.run(suggest_microscopy_type, description, mode, blend)
+
+
+@mcp.tool()
+@PROFILER.profile
+def get_server_metrics(format: str = "json") -> str:
+    """
+    Get per-tool call counts, error counts, latency histograms and argument value counts.
+    
+    Args:
+        format: json (nested object) or prometheus (text exposition format)
+    
+    Returns:
+        Metrics collected since the server started
+    """
+    if format not in METRICS_FORMATS:
+        return ErrorResult(f"Error: Unknown metrics format '{format}'. Available formats: {', '.join(METRICS_FORMATS)}")
+    if format == "prometheus":
+        text = METRICS.prometheus_text() + PROFILE_SNAPSHOTS.prometheus_text()
+        return text + _RESULT_CACHE.prometheus_text() if _RESULT_CACHE is not None else text
+    snapshot = METRICS.snapshot()
+    snapshot["profiles"] = PROFILE_SNAPSHOTS.stats()
+    snapshot["result_cache"] = _RESULT_CACHE.stats() if _RESULT_CACHE is not None else None
+    snapshot["executor"] = _EXECUTOR.stats()
+    snapshot["single_flight"] = _SINGLE_FLIGHT.stats()
+    return json.dumps(snapshot, indent=2)
+
+
+@mcp.tool()
+def profiling_report(
+    tool: Optional[str] = None,
+    limit: int = 10,
+    sort: str = "cumulative",
+    sample_rate: Optional[float] = None,
+    reset: bool = False
+) -> str:
+    """
+    Get the hottest functions and allocation sites of sampled tool calls.
+    
+    Args:
+        tool: Only report this tool (default: every tool sampled so far)
+        limit: Functions and allocation sites listed per tool
+        sort: cumulative (time including callees) or self (time in the function itself)
+        sample_rate: Profile this fraction of calls from now on (0 pauses profiling)
+        reset: Clear the collected samples after reporting
+    
+    Returns:
+        JSON with per-tool call counts, hottest functions (ms per sampled call)
+        and allocation sites (KiB per sampled call); profiling must be enabled
+        with $MICROSCOPY_PROFILING when the server starts
+    """
+    if not PROFILER.enabled:
+        return ErrorResult("Error: Profiling is disabled. Start the server with MICROSCOPY_PROFILING set to the "
+                           "fraction of calls to profile (e.g. 0.01)")
+    if sort not in PROFILING_SORTS:
+        return ErrorResult(f"Error: Unknown sort '{sort}'. Available sorts: {', '.join(PROFILING_SORTS)}")
+    if tool is not None and tool not in PROFILER.tools:
+        return ErrorResult(f"Error: Unknown tool '{tool}'. Profiled tools: {', '.join(PROFILER.tools)}")
+    if sample_rate is not None:
+        if not 0 <= sample_rate <= 1:
+            return ErrorResult("Error: sample_rate must be between 0 and 1")
+        PROFILER.sample_rate = sample_rate
+    report = PROFILER.report(tool, max(limit, 0), sort)
+    if reset:
+        PROFILER.reset()
+    return json.dumps(report, indent=2)
+
+
+def main() -> None:
+    """Run the command line interface; see microscopy_aesthetics.cli for commands."""
+    from microscopy_aesthetics.cli import main as cli_main
+    sys.exit(cli_main())
+
+
 if __name__ == "__main__":
-    mcp.run()
+    main()
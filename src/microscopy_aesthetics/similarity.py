@@ -0,0 +1,201 @@
+"""
+TF-IDF cosine similarity between descriptions and microscopy profiles.
+
+Each profile's vocabulary is one document. The L2-normalized TF-IDF term
+weights form a matrix built once and cached to disk, so a description is
+scored against every type with one matrix-vector product and many
+descriptions with one matrix-matrix product. The matrix is stored term-major
+(terms x types) so the rows for a query's few terms are contiguous.
+
+Requires numpy (pip install microscopy-aesthetics-mcp[similarity]).
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from microscopy_aesthetics.paths import cache_dir
+
+# Bump when the matrix layout or weighting changes to invalidate disk caches
+CACHE_FORMAT = 1
+
+# Descriptions scored per matrix-matrix product in score_many
+BATCH_ROWS = 256
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; hyphenated words stay whole."""
+    return _TOKEN.findall(text.lower())
+
+
+def documents_key(documents: Mapping[str, Sequence[str]]) -> str:
+    """Content hash identifying a document set (and so its cached matrix)."""
+    payload = json.dumps([CACHE_FORMAT, list(documents.items())], sort_keys=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class SimilarityIndex:
+    """
+    Precomputed TF-IDF matrix over microscopy type documents.
+
+    Scores are cosine similarities in [0, 1]: both profile rows and query
+    vectors use sublinear term frequency times smoothed IDF, L2-normalized.
+    """
+
+    def __init__(self, types: Sequence[str], terms: Sequence[str], idf: np.ndarray, weights: np.ndarray):
+        self.types: Tuple[str, ...] = tuple(types)
+        self._columns: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self._terms = list(terms)
+        self._idf = idf
+        self._weights = weights  # (terms x types)
+
+    @classmethod
+    def build(cls, documents: Mapping[str, Iterable[str]]) -> "SimilarityIndex":
+        """
+        Build the matrix from type -> phrases.
+
+        Args:
+            documents: Phrases describing each microscopy type
+
+        Returns:
+            A new index
+        """
+        counts = {t: Counter(tok for phrase in phrases for tok in tokenize(phrase))
+                  for t, phrases in documents.items()}
+        terms = sorted({tok for c in counts.values() for tok in c})
+        columns = {term: i for i, term in enumerate(terms)}
+
+        n = len(counts)
+        df = np.zeros(len(terms), dtype=np.float32)
+        for c in counts.values():
+            df[[columns[tok] for tok in c]] += 1
+        idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+
+        matrix = np.zeros((n, len(terms)), dtype=np.float32)
+        for row, c in enumerate(counts.values()):
+            for tok, tf in c.items():
+                matrix[row, columns[tok]] = 1 + math.log(tf)
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1)
+        return cls(list(counts), terms, idf, np.ascontiguousarray(matrix.T))
+
+    @classmethod
+    def load_or_build(
+        cls,
+        documents: Mapping[str, Sequence[str]],
+        directory: Optional[Path] = None
+    ) -> "SimilarityIndex":
+        """
+        Load the matrix for these documents from the disk cache, building and
+        saving it on a miss. Unreadable cache files are rebuilt, and a cache
+        that cannot be written is skipped.
+        """
+        try:
+            path = Path(directory or cache_dir()) / f"tfidf-{documents_key(documents)}.npz"
+        except OSError:
+            return cls.build(documents)
+        if path.exists():
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    return cls(data["types"].tolist(), data["terms"].tolist(), data["idf"], data["weights"])
+            except Exception:
+                pass  # Truncated or corrupt (e.g. BadZipFile); rebuilt below
+
+        index = cls.build(documents)
+        try:
+            index.save(path)
+        except OSError:
+            pass  # The cache is an optimization; a read-only location is fine
+        return index
+
+    def save(self, path: Path) -> None:
+        """Write the matrix to path atomically; concurrent writers never share a temporary file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp",
+                                         delete=False) as f:
+            try:
+                np.savez(
+                    f,
+                    types=np.array(self.types, dtype=str),
+                    terms=np.array(self._terms, dtype=str),
+                    idf=self._idf,
+                    weights=self._weights,
+                )
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """(types, terms)"""
+        return len(self.types), len(self._terms)
+
+    def _query(self, description: str) -> Tuple[np.ndarray, np.ndarray]:
+        # Sparse query: (column indices, normalized weights) of known terms
+        counts = Counter(tok for tok in tokenize(description) if tok in self._columns)
+        if not counts:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        cols = np.fromiter((self._columns[tok] for tok in counts), dtype=np.intp, count=len(counts))
+        weights = (1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts))))
+        weights *= self._idf[cols]
+        weights /= np.linalg.norm(weights)
+        return cols, weights
+
+    def score(self, description: str) -> np.ndarray:
+        """Cosine similarity of one description to every type, in type order."""
+        cols, weights = self._query(description)
+        if not len(cols):
+            return np.zeros(len(self.types), dtype=np.float32)
+        return weights @ self._weights[cols]
+
+    def score_many(self, descriptions: Sequence[str]) -> np.ndarray:
+        """
+        (descriptions x types) cosine similarities, one matrix product per block.
+
+        Each block's query matrix only spans the terms its descriptions use,
+        so the product stays small however large the vocabulary grows.
+        """
+        scores = np.zeros((len(descriptions), len(self.types)), dtype=np.float32)
+        for start in range(0, len(descriptions), BATCH_ROWS):
+            queries = [self._query(d) for d in descriptions[start:start + BATCH_ROWS]]
+            used, positions = np.unique(
+                np.concatenate([cols for cols, _ in queries] or [np.empty(0, dtype=np.intp)]),
+                return_inverse=True
+            )
+            block = np.zeros((len(queries), len(used)), dtype=np.float32)
+            offset = 0
+            for row, (cols, weights) in enumerate(queries):
+                block[row, positions[offset:offset + len(cols)]] = weights
+                offset += len(cols)
+            scores[start:start + len(queries)] = block @ self._weights[used]
+        return scores
+
+    def rank(self, description: str, limit: int = 3) -> List[Tuple[str, float]]:
+        """Top (type, similarity) pairs with non-zero similarity, best first."""
+        return self._top(self.score(description), limit)
+
+    def rank_many(self, descriptions: Sequence[str], limit: int = 3) -> List[List[Tuple[str, float]]]:
+        """rank() for many descriptions at once."""
+        return [self._top(row, limit) for row in self.score_many(descriptions)]
+
+    def _top(self, scores: np.ndarray, limit: int) -> List[Tuple[str, float]]:
+        if limit < len(scores):
+            candidates = np.argpartition(-scores, limit)[:limit]
+        else:
+            candidates = np.arange(len(scores))
+        # Stable on ties so equal scores keep profile order
+        order = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(self.types[i], float(scores[i])) for i in order if scores[i] > 0]
@@ -0,0 +1,400 @@
+"""
+Versioned, immutable views of the profile set for hot reloading.
+
+A Snapshot bundles one version of the profile set with everything derived
+from it (compiled suffixes, variant spaces, serialized responses, suggestion
+terms, keyword matcher, similarity index). Tools read the current snapshot once per call, so
+a call never mixes two versions. A snapshot reads profiles on first use
+through its own copy of the store, so a profile it holds never changes under
+it. ProfileReloader.reload() compares the
+sources' signatures with the current snapshot, loads only the changed
+profiles and derives a new snapshot that reuses everything already built for
+the unchanged types; a changed profile that fails to load keeps its previous
+version. Publishing is a single reference assignment: readers
+never wait for a reload, and calls already running finish on the snapshot
+they started with.
+
+While serving, profile sources are polled every $MICROSCOPY_PROFILE_WATCH
+seconds (default 2; 0 disables).
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from microscopy_aesthetics.blending import BlendSuffixTable
+from microscopy_aesthetics.compact import CompactProfile
+from microscopy_aesthetics.enhancement import SuffixKey
+from microscopy_aesthetics.matching import KeywordMatcher, vocabulary_terms
+from microscopy_aesthetics.responses import ResponseCache
+from microscopy_aesthetics.store import ProfileError, ProfileStore
+from microscopy_aesthetics.variants import VariantSpace
+
+WATCH_ENV = "MICROSCOPY_PROFILE_WATCH"
+DEFAULT_WATCH_INTERVAL = 2.0
+
+
+class ProfileSet(Mapping):
+    """
+    The profiles of one snapshot: a fixed set of keys, each loaded at most once.
+
+    The set reads through its own copy of the store, listed when the snapshot
+    was built, so reloads never touch the profiles it already holds. Profiles
+    are read on first access. A profile that fails to load breaks only its
+    type: looking it up raises the ProfileError again, iteration skips it and
+    the error is kept in `errors`.
+
+    Args:
+        store: Store to read from; the set takes it over
+        keys: Every type in the set, in serving order
+        loaded: Profiles already read
+    """
+
+    def __init__(self, store: ProfileStore, keys: Iterable[str],
+                 loaded: Optional[Mapping[str, CompactProfile]] = None):
+        self._store = store
+        self._keys = tuple(keys)
+        self._members = frozenset(self._keys)
+        self._loaded: Dict[str, CompactProfile] = dict(loaded or {})
+        self.errors: Dict[str, ProfileError] = {}
+
+    def __getitem__(self, key: str) -> CompactProfile:
+        profile = self._loaded.get(key)
+        if profile is None:
+            if key not in self._members:
+                raise KeyError(key)
+            error = self.errors.get(key)
+            if error is not None:
+                raise error
+            try:
+                profile = self._loaded[key] = self._store[key]
+            except ProfileError as e:
+                self.errors[key] = e
+                raise
+        return profile
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._members
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._keys:
+            if key not in self._loaded:
+                try:
+                    self[key]
+                except ProfileError:
+                    continue
+            yield key
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def keys_listed(self) -> Tuple[str, ...]:
+        """Every type in the set, without loading any."""
+        return self._keys
+
+    def loaded(self) -> Dict[str, CompactProfile]:
+        """Profiles read so far."""
+        return dict(self._loaded)
+
+
+class Snapshot:
+    """
+    One version of the profile set and its derived structures.
+
+    Args:
+        version: Profile-set version, increasing with every publish
+        profiles: The profiles of this version
+        signatures: Source signatures the profiles were read from
+        keywords: Hand-picked suggestion keywords per type
+    """
+
+    def __init__(
+        self,
+        version: int,
+        profiles: ProfileSet,
+        signatures: Mapping[str, Hashable],
+        keywords: Mapping[str, List[str]],
+        suffix_table: Optional[BlendSuffixTable] = None,
+        responses: Optional[ResponseCache] = None,
+        suggestion_terms: Optional[Dict[str, List[str]]] = None,
+        variant_spaces: Optional[Dict[SuffixKey, VariantSpace]] = None
+    ):
+        self.version = version
+        self.profiles = profiles
+        self.signatures = dict(signatures)
+        self.keywords = keywords
+        # Every type x magnification x palette x strength suffix, compiled per type
+        # (or blend of types) on first use
+        self.suffix_table = suffix_table if suffix_table is not None else BlendSuffixTable(profiles)
+        self.responses = responses if responses is not None else ResponseCache(profiles, version)
+        # Built lazily so startup does not load every profile
+        self._suggestion_terms = suggestion_terms
+        self._variant_spaces: Dict[SuffixKey, VariantSpace] = variant_spaces or {}
+        self._keyword_matcher: Optional[KeywordMatcher] = None
+        self._similarity_index = None  # TF-IDF index (needs numpy)
+
+    @classmethod
+    def build(cls, store: ProfileStore, version: int, keywords: Mapping[str, List[str]]) -> "Snapshot":
+        """A snapshot of the store's current contents with nothing loaded or derived yet."""
+        signatures = store.signatures()
+        store = store.copy()
+        return cls(version, ProfileSet(store, list(store)), signatures, keywords)
+
+    def _terms(self, key: str, profile: Mapping) -> List[str]:
+        return self.keywords.get(key, []) + vocabulary_terms(profile)
+
+    def suggestion_terms(self) -> Dict[str, List[str]]:
+        """Suggestion terms per type: hand-picked keywords plus every vocabulary phrase."""
+        if self._suggestion_terms is None:
+            self._suggestion_terms = {key: self._terms(key, profile) for key, profile in self.profiles.items()}
+        return self._suggestion_terms
+
+    def keyword_matcher(self) -> KeywordMatcher:
+        """All suggestion terms compiled into one single-pass matcher."""
+        if self._keyword_matcher is None:
+            self._keyword_matcher = KeywordMatcher(self.suggestion_terms())
+        return self._keyword_matcher
+
+    def similarity_index(self):
+        """TF-IDF index over descriptions and suggestion terms (needs numpy)."""
+        if self._similarity_index is None:
+            from microscopy_aesthetics.similarity import SimilarityIndex
+            self._similarity_index = SimilarityIndex.load_or_build({
+                key: [self.profiles[key]["description"]] + terms
+                for key, terms in self.suggestion_terms().items()
+            })
+        return self._similarity_index
+
+    def variant_space(self, key: SuffixKey) -> VariantSpace:
+        """Phrase combinations for a key returned by suffix_table.resolve()."""
+        space = self._variant_spaces.get(key)
+        if space is None:
+            microscopy_type, magnification, color_palette, num = key
+            if microscopy_type not in self.profiles:
+                # Blend spaces live with the blend, in the suffix table's bounded cache
+                return self.suffix_table.blend_variant_space(key)
+            space = self._variant_spaces[key] = VariantSpace(
+                self.profiles[microscopy_type], magnification, color_palette, num
+            )
+        return space
+
+    def derive(self, store: ProfileStore, signatures: Mapping[str, Hashable],
+               changed: AbstractSet[str]) -> Tuple["Snapshot", Dict[str, ProfileError]]:
+        """
+        The next version, reloading only the changed types.
+
+        Changed profiles are read now from `store`, which the new snapshot
+        takes over, so a bad file is found here instead of in a tool call. A
+        changed profile that fails to load keeps the version this snapshot
+        holds, if it read one. Suffixes, variant spaces, profile payloads and
+        suggestion terms of the other types are carried over. The keyword
+        matcher and similarity index span every type; they are rebuilt before
+        publishing if this snapshot had built them.
+
+        Returns:
+            The new snapshot and the changed profiles that failed to load
+        """
+        held = self.profiles.loaded()
+        loaded = {key: profile for key, profile in held.items() if key not in changed}
+        keys = list(store)
+        signatures = dict(signatures)
+        failed: Dict[str, ProfileError] = {}
+        for key in changed & set(keys):
+            try:
+                loaded[key] = store[key]
+            except ProfileError as e:
+                failed[key] = e
+                if key in held:
+                    loaded[key] = held[key]
+                    signatures[key] = self.signatures.get(key)
+        # Types still serving their previous version did not change
+        changed = changed - {key for key in failed if key in held}
+        profiles = ProfileSet(store, keys, loaded)
+        terms = None
+        if self._suggestion_terms is not None:
+            terms = {
+                key: self._suggestion_terms[key] if key not in changed and key in self._suggestion_terms
+                else self._terms(key, profiles[key])
+                for key in profiles
+            }
+        spaces = {key: space for key, space in dict(self._variant_spaces).items()
+                  if key[0] not in changed and key[0] in profiles}
+        version = self.version + 1
+        snapshot = Snapshot(version, profiles, signatures, self.keywords,
+                            self.suffix_table.derive(profiles, changed),
+                            self.responses.derive(profiles, version, changed), terms, spaces)
+        if self._keyword_matcher is not None:
+            snapshot.keyword_matcher()
+        if self._similarity_index is not None:
+            snapshot.similarity_index()
+        return snapshot, failed
+
+
+class ProfileReloader:
+    """
+    Publishes snapshots of a ProfileStore.
+
+    Args:
+        store: Profile sources
+        keywords: Hand-picked suggestion keywords per type
+        on_publish: Called after a new snapshot is published with the changed
+            types, or None when everything was rebuilt
+    """
+
+    def __init__(self, store: ProfileStore, keywords: Mapping[str, List[str]],
+                 on_publish: Optional[Callable[[Optional[FrozenSet[str]]], None]] = None):
+        self.store = store
+        self.keywords = keywords
+        self.on_publish = on_publish
+        self._lock = threading.Lock()
+        self._stop_watching = threading.Event()
+        self.current = Snapshot.build(store, 0, keywords)
+        self.checks = 0
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload_ms: Optional[float] = None
+        self.last_changed: FrozenSet[str] = frozenset()
+        self.last_error: Optional[str] = None
+        self._failed_signatures: Optional[Dict[str, Hashable]] = None
+
+    def rebuild(self) -> Snapshot:
+        """Forget every profile read so far and publish a snapshot with nothing carried over."""
+        with self._lock:
+            start = time.perf_counter()
+            candidate = self.store.copy()
+            candidate.invalidate()
+            self.current = Snapshot.build(candidate, self.current.version + 1, self.keywords)
+            self.store.invalidate()
+            self._published(start, None)
+            return self.current
+
+    def reload(self) -> FrozenSet[str]:
+        """
+        Publish a new snapshot if any profile source was added, removed or edited.
+
+        Changed profiles are read through a private copy of the store, which
+        the new snapshot takes over. A changed profile that fails to load
+        keeps serving the version the current snapshot read, if any, and
+        the error is kept in last_error; the same sources are not retried
+        until they change again. Nothing is published when every changed
+        profile failed.
+
+        Returns:
+            The changed types (empty when nothing was published)
+        """
+        with self._lock:
+            start = time.perf_counter()
+            self.checks += 1
+            current = self.current
+            signatures = self.store.signatures()
+            if signatures == current.signatures or signatures == self._failed_signatures:
+                return frozenset()
+            changed = frozenset(
+                key for key in signatures.keys() | current.signatures.keys()
+                if signatures.get(key) != current.signatures.get(key)
+            )
+            candidate = self.store.copy()
+            for key in changed:
+                candidate.invalidate(key)
+            snapshot, failed = current.derive(candidate, signatures, changed)
+            published = changed - failed.keys()
+            if failed:
+                self.failures += 1
+                self.last_error = "; ".join(str(e) for e in failed.values())
+                self._failed_signatures = signatures
+            if not published:
+                return frozenset()
+            for key in changed:
+                self.store.invalidate(key)
+            self.current = snapshot
+            self._published(start, published, bool(failed))
+            return published
+
+    def _published(self, start: float, changed: Optional[FrozenSet[str]], failed: bool = False) -> None:
+        self.reloads += 1
+        self.last_reload_ms = (time.perf_counter() - start) * 1000
+        self.last_changed = changed if changed is not None else frozenset(self.current.profiles.keys_listed)
+        if not failed:
+            self.last_error = None
+            self._failed_signatures = None
+        if self.on_publish is not None:
+            self.on_publish(changed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.current.version,
+            "types": len(self.current.profiles),
+            "checks": self.checks,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_reload_ms": None if self.last_reload_ms is None else round(self.last_reload_ms, 3),
+            "last_changed": sorted(self.last_changed),
+            "last_error": self.last_error,
+        }
+
+    def prometheus_text(self) -> str:
+        """Version, reload counters and last reload latency in the Prometheus text format."""
+        lines = [
+            "# TYPE microscopy_profiles_version gauge",
+            f"microscopy_profiles_version {self.current.version}",
+            "# TYPE microscopy_profiles_reloads_total counter",
+            f"microscopy_profiles_reloads_total {self.reloads}",
+            "# TYPE microscopy_profiles_reload_failures_total counter",
+            f"microscopy_profiles_reload_failures_total {self.failures}",
+        ]
+        if self.last_reload_ms is not None:
+            lines += ["# TYPE microscopy_profiles_last_reload_seconds gauge",
+                      f"microscopy_profiles_last_reload_seconds {self.last_reload_ms / 1000:.6f}"]
+        return "\n".join(lines) + "\n"
+
+    def watch(self, interval: float = DEFAULT_WATCH_INTERVAL) -> threading.Thread:
+        """Poll the profile sources in a daemon thread and reload on change."""
+        self._stop_watching.clear()
+
+        def poll() -> None:
+            while not self._stop_watching.wait(interval):
+                failures = self.failures
+                try:
+                    changed = self.reload()
+                except OSError as e:
+                    print(f"Profile reload failed: {e}", file=sys.stderr)
+                    continue
+                if changed:
+                    print(f"Reloaded profiles {', '.join(sorted(changed))} "
+                          f"(version {self.current.version}, {self.last_reload_ms:.1f} ms)", file=sys.stderr)
+                if self.failures != failures:
+                    print(f"Profile reload failed: {self.last_error}", file=sys.stderr)
+
+        thread = threading.Thread(target=poll, name="profile-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def stop_watching(self) -> None:
+        self._stop_watching.set()
+
+
+def start_watcher_from_env(reloader: ProfileReloader) -> Optional[threading.Thread]:
+    """Watch profile sources every $MICROSCOPY_PROFILE_WATCH seconds (default 2; 0 disables)."""
+    try:
+        interval = float(os.environ.get(WATCH_ENV, DEFAULT_WATCH_INTERVAL))
+    except ValueError:
+        interval = DEFAULT_WATCH_INTERVAL
+    if interval <= 0:
+        return None
+    return reloader.watch(interval)
@@ -0,0 +1,306 @@
+"""
+Microscopy profiles loaded from YAML files, one profile per file.
+
+Profiles live in `ologs/<type>.yaml` inside the package plus any directories
+listed in $MICROSCOPY_PROFILE_PATH (os.pathsep separated); later directories
+override earlier ones. A directory may list its types, one per line, in an
+`order.txt` file; listed types come first in that order, the rest follow by
+file name. The packaged list keeps the order the types were always served
+in. Nothing is read at construction: a profile is parsed on first access,
+and the parsed result is written to a compiled marshal cache so later
+processes skip YAML parsing entirely. Loaded profiles are held as
+CompactProfile objects over one shared, interned vocabulary table.
+"""
+
+import hashlib
+import itertools
+import marshal
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterator, List, Mapping, MutableMapping, Optional, Sequence, Set
+
+from microscopy_aesthetics.compact import SHARED_VOCABULARY, CompactProfile, VocabularyTable
+from microscopy_aesthetics.paths import cache_dir
+
+PACKAGED_DIR = Path(__file__).parent / "ologs"
+PROFILE_PATH_ENV = "MICROSCOPY_PROFILE_PATH"
+PROFILE_SUFFIX = ".yaml"
+ORDER_FILE = "order.txt"
+
+# Bump when the cached representation changes
+CACHE_FORMAT = 1
+
+REQUIRED_FIELDS = (
+    "display_name", "description", "structure", "material", "color", "texture",
+    "composition", "style", "quality", "mood", "examples", "color_palette", "magnification_feel"
+)
+
+_VALID_KEY = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+class ProfileError(ValueError):
+    """A profile file is unreadable or missing required fields."""
+
+
+def configured_directories() -> List[Path]:
+    """Packaged profiles followed by the user-configured directories."""
+    extra = os.environ.get(PROFILE_PATH_ENV, "")
+    return [PACKAGED_DIR] + [Path(p) for p in extra.split(os.pathsep) if p]
+
+
+def parse_profile(path: Path, data: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Parse and validate one profile file.
+
+    Args:
+        path: Profile file
+        data: File contents, if already read
+
+    Raises:
+        ProfileError: If the file is not a mapping with all required fields,
+            or has aliases that are not a list of names
+    """
+    # Imported here: profiles served from the compiled cache never need a YAML parser
+    import yaml
+
+    if data is None:
+        data = path.read_bytes()
+    try:
+        profile = yaml.load(data, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+    except yaml.YAMLError as e:
+        raise ProfileError(f"{path}: {e}") from e
+    if not isinstance(profile, dict):
+        raise ProfileError(f"{path}: expected a mapping of profile fields")
+    missing = [field for field in REQUIRED_FIELDS if field not in profile]
+    if missing:
+        raise ProfileError(f"{path}: missing fields {', '.join(missing)}")
+    aliases = profile.get("aliases", [])
+    if not isinstance(aliases, list) or not all(isinstance(alias, str) for alias in aliases):
+        raise ProfileError(f"{path}: aliases must be a list of names")
+    return profile
+
+
+class ProfileStore(MutableMapping):
+    """
+    Lazily loaded mapping of microscopy type -> CompactProfile.
+
+    Looking up one type probes the configured directories for its file and
+    parses only that file (or loads its compiled cache entry). Iterating lists
+    the directories once, in directory order and then each directory's
+    order.txt and file name order; a file overriding an earlier directory's
+    type keeps that type's position.
+    Profiles assigned in code (any mapping in the plain profile shape) are
+    kept in memory and shadow files.
+    """
+
+    def __init__(
+        self,
+        directories: Optional[Sequence[Path]] = None,
+        cache_directory: Optional[Path] = None,
+        use_cache: bool = True,
+        vocabulary: VocabularyTable = SHARED_VOCABULARY
+    ):
+        self.directories = [Path(d) for d in (directories if directories is not None
+                                                else configured_directories())]
+        self._cache_directory = cache_directory
+        self._use_cache = use_cache
+        self.vocabulary = vocabulary
+        self._loaded: Dict[str, CompactProfile] = {}
+        self._overrides: Dict[str, CompactProfile] = {}
+        # Distinguishes successive in-code assignments to the same key
+        self._generations: Dict[str, int] = {}
+        self._generation = itertools.count()
+        self._deleted: Set[str] = set()
+        self._index: Optional[Dict[str, Path]] = None
+
+    # Source discovery
+
+    def _file_index(self) -> Dict[str, Path]:
+        if self._index is None:
+            index: Dict[str, Path] = {}
+            for directory in self.directories:
+                try:
+                    names = os.listdir(directory)
+                except OSError:
+                    continue
+                keys = sorted(name[:-len(PROFILE_SUFFIX)] for name in names
+                              if name.endswith(PROFILE_SUFFIX) and not name.startswith("."))
+                for key in _ordered(directory, keys):
+                    index[key] = directory / f"{key}{PROFILE_SUFFIX}"
+            self._index = index
+        return self._index
+
+    def source(self, key: str) -> Optional[Path]:
+        """File backing a profile, or None for in-memory or unknown profiles."""
+        if key in self._overrides or key in self._deleted or not _VALID_KEY.match(key):
+            return None
+        if self._index is not None:
+            return self._index.get(key)
+        for directory in reversed(self.directories):
+            path = directory / f"{key}{PROFILE_SUFFIX}"
+            if path.is_file():
+                return path
+        return None
+
+    def signatures(self) -> Dict[str, Hashable]:
+        """
+        A value per profile that changes whenever the profile's source does.
+
+        Re-lists the directories and stats each profile file (files are not
+        read); in-code profiles are identified by their assignment. Comparing
+        two results tells which profiles were added, removed or edited.
+        """
+        self._index = None
+        signatures: Dict[str, Hashable] = {}
+        for key, path in self._file_index().items():
+            if key in self._deleted or key in self._overrides:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # Removed since listing
+            signatures[key] = (str(path), stat.st_mtime_ns, stat.st_size)
+        for key, generation in self._generations.items():
+            signatures[key] = ("memory", generation)
+        return signatures
+
+    # Compiled cache
+
+    def _cache_path(self, path: Path) -> Path:
+        directory = self._cache_directory or cache_dir() / "profiles"
+        digest = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:24]
+        return Path(directory) / f"{digest}.marshal"
+
+    def _read_cache(self, path: Path, stat: os.stat_result) -> Optional[Dict[str, Any]]:
+        try:
+            # Resolving the default location creates it, which can fail too
+            cache_path = self._cache_path(path)
+            with open(cache_path, "rb") as f:
+                fmt, mtime_ns, size, digest, profile = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if fmt != CACHE_FORMAT:
+            return None
+        if (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size):
+            return profile
+        # Touched but possibly unchanged (e.g. a fresh checkout): compare content
+        if _digest(path.read_bytes()) == digest:
+            self._write_cache(path, stat, digest, profile)
+            return profile
+        return None
+
+    def _write_cache(self, path: Path, stat: os.stat_result, digest: str, profile: Dict[str, Any]) -> None:
+        try:
+            target = self._cache_path(path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                marshal.dump((CACHE_FORMAT, stat.st_mtime_ns, stat.st_size, digest, profile), f)
+            tmp.replace(target)
+        except OSError:
+            pass  # The cache is an optimization; a read-only location is fine
+
+    def _load(self, path: Path) -> CompactProfile:
+        stat = path.stat()
+        profile = self._read_cache(path, stat) if self._use_cache else None
+        if profile is None:
+            # Parse and hash the same bytes so the cache never pairs stale content with a new hash
+            data = path.read_bytes()
+            profile = parse_profile(path, data)
+            if self._use_cache:
+                self._write_cache(path, stat, _digest(data), profile)
+        try:
+            return CompactProfile.from_mapping(profile, self.vocabulary)
+        except TypeError as e:
+            raise ProfileError(f"{path}: {e}") from e
+
+    # Mapping interface
+
+    def __getitem__(self, key: str) -> CompactProfile:
+        if key in self._overrides:
+            return self._overrides[key]
+        profile = self._loaded.get(key)
+        if profile is None:
+            path = self.source(key)
+            if path is None:
+                raise KeyError(key)
+            profile = self._loaded[key] = self._load(path)
+        return profile
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        return key in self._overrides or key in self._loaded or self.source(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._file_index():
+            if key not in self._deleted:
+                yield key
+        for key in list(self._overrides):
+            if key not in self._file_index() or key in self._deleted:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __setitem__(self, key: str, profile: Mapping[str, Any]) -> None:
+        if not isinstance(profile, CompactProfile):
+            profile = CompactProfile.from_mapping(profile, self.vocabulary)
+        self._overrides[key] = profile
+        self._generations[key] = next(self._generation)
+        self._loaded.pop(key, None)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._overrides.pop(key, None)
+        self._generations.pop(key, None)
+        self._loaded.pop(key, None)
+        if key in self._file_index():
+            self._deleted.add(key)
+
+    def __repr__(self) -> str:
+        return f"ProfileStore({[str(d) for d in self.directories]!r})"
+
+    def copy(self) -> "ProfileStore":
+        """An independent store over the same sources, with the profiles parsed and assigned so far."""
+        store = ProfileStore(self.directories, self._cache_directory, self._use_cache, self.vocabulary)
+        store._loaded = dict(self._loaded)
+        store._overrides = dict(self._overrides)
+        store._generations = dict(self._generations)
+        store._generation = self._generation
+        store._deleted = set(self._deleted)
+        store._index = None if self._index is None else dict(self._index)
+        return store
+
+    def revert(self) -> None:
+        """Drop profiles assigned or deleted in code and re-read files."""
+        self._overrides.clear()
+        self._generations.clear()
+        self._deleted.clear()
+        self.invalidate()
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Forget parsed profiles (one or all) and the directory listing so files are re-read."""
+        if key is None:
+            self._loaded.clear()
+            self._index = None
+        else:
+            self._loaded.pop(key, None)
+
+
+def _ordered(directory: Path, keys: List[str]) -> List[str]:
+    # Keys listed in the directory's order file first, in that order
+    try:
+        listed = (directory / ORDER_FILE).read_text(encoding="utf-8").split()
+    except OSError:
+        return keys
+    present = set(keys)
+    first = list(dict.fromkeys(key for key in listed if key in present))
+    chosen = set(first)
+    return first + [key for key in keys if key not in chosen]
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
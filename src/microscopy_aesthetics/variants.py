@@ -0,0 +1,144 @@
+"""
+Diverse enhancement variants for enhance_prompt_with_microscopy(variants=N).
+
+The regular suffix always uses the first phrases of each vocabulary field.
+A variant instead picks one structure phrase, num_characteristics - 1
+phrases from the other vocabulary fields (at most one per field) and one
+color palette phrase. For one (type, magnification, palette, strength) the
+possible picks form a VariantSpace: each field subset is listed once with
+its number of phrase combinations, so variant number r decodes to its
+phrases in O(num_characteristics) (bisect the subset, then mixed-radix
+digits). N distinct variants are N distinct numbers drawn with
+random.Random(seed).sample, so no pipeline runs more than once and no
+combination repeats. The size of the space counts phrase combinations; when
+two fields share a phrase, different combinations can spell the same text,
+so it is an upper bound on the distinct variants.
+"""
+
+import itertools
+import json
+import math
+import random
+from bisect import bisect_right
+from json.encoder import encode_basestring_ascii
+from typing import Iterator, List, Mapping, Set, Tuple
+
+from microscopy_aesthetics.enhancement import SuffixEntry
+
+# Fields the non-structure characteristics are drawn from, in output order
+VARIANT_FIELDS = ("material", "texture", "composition", "style", "quality", "mood")
+MAX_VARIANTS = 1000
+
+
+def new_seed() -> int:
+    """A seed for callers that did not pass one; reported so the run can be repeated."""
+    return random.randrange(2 ** 32)
+
+
+class VariantSpace:
+    """
+    Every distinct phrase combination for one resolved suffix key.
+
+    Args:
+        profile: Microscopy profile
+        magnification: Resolved magnification key (must exist in the profile)
+        color_palette: Resolved color palette key (must exist in the profile)
+        num_characteristics: Phrases listed after "Features"
+    """
+
+    def __init__(self, profile: Mapping, magnification: str, color_palette: str, num_characteristics: int):
+        head = f", rendered with {profile['display_name'].lower()} microscopy aesthetics. Features "
+        tail = (f". Captures {profile['magnification_feel'][magnification]}. "
+                "Highly detailed 8k scientific visualization.")
+        # Fixed text around each structure and color phrase, with word counts,
+        # so a variant is a few concatenations and no splitting
+        self._leads: Tuple[SuffixEntry, ...] = tuple(
+            _entry(head + phrase) for phrase in profile["structure"]
+        )
+        self._trails: Tuple[SuffixEntry, ...] = tuple(
+            _continuation(f". Color palette emphasizes {phrase}{tail}")
+            for phrase in profile["color_palette"][color_palette]
+        )
+        fields = [tuple(_continuation(", " + p) for p in profile[f]) for f in VARIANT_FIELDS if profile.get(f)]
+        extra = min(max(num_characteristics - 1, 0), len(fields))
+        self._subsets: List[Tuple[Tuple[SuffixEntry, ...], ...]] = list(itertools.combinations(fields, extra))
+        # Index of the first combination of each subset
+        self._starts: List[int] = []
+        total = 0
+        for subset in self._subsets:
+            self._starts.append(total)
+            total += math.prod(len(phrases) for phrases in subset)
+        self._size = total * len(self._leads) * len(self._trails)
+
+    def __len__(self) -> int:
+        """Number of phrase combinations, an upper bound on distinct suffixes."""
+        return self._size
+
+    def entry(self, number: int) -> SuffixEntry:
+        """(suffix, suffix_word_count) for variant number (0 <= number < len(self))."""
+        number, trail = divmod(number, len(self._trails))
+        number, lead = divmod(number, len(self._leads))
+        i = bisect_right(self._starts, number) - 1
+        number -= self._starts[i]
+        suffix, words = self._leads[lead]
+        for field in self._subsets[i]:
+            number, j = divmod(number, len(field))
+            phrase, phrase_words = field[j]
+            suffix += phrase
+            words += phrase_words
+        phrase, phrase_words = self._trails[trail]
+        return suffix + phrase, words + phrase_words
+
+    def sample(self, count: int, seed: int) -> List[SuffixEntry]:
+        """
+        Up to count entries with distinct suffixes, the same ones for the same seed.
+
+        Fewer are returned only when the space holds fewer distinct texts.
+        """
+        rng = random.Random(seed)
+        count = min(count, self._size)
+        numbers = rng.sample(range(self._size), count)
+        entries = list(dict(map(self.entry, numbers)).items())
+        if len(entries) < count:
+            # Two fields sharing a phrase can spell the same text twice; draw replacements
+            seen = {suffix for suffix, _ in entries}
+            for n in _undrawn(rng, self._size, set(numbers)):
+                entry = self.entry(n)
+                if entry[0] not in seen:
+                    seen.add(entry[0])
+                    entries.append(entry)
+                    if len(entries) == count:
+                        break
+        return entries
+
+
+def _undrawn(rng: random.Random, size: int, drawn: Set[int]) -> Iterator[int]:
+    # Numbers below size not yet in drawn, each once, in random order. Draws
+    # at random while most numbers are still free; only once half the space
+    # has been drawn is the rest listed, so the work stays proportional to
+    # the numbers yielded rather than to size.
+    while 2 * len(drawn) < size:
+        n = rng.randrange(size)
+        if n not in drawn:
+            drawn.add(n)
+            yield n
+    rest = [n for n in range(size) if n not in drawn]
+    rng.shuffle(rest)
+    yield from rest
+
+
+def _entry(text: str) -> SuffixEntry:
+    return text, len(text.split())
+
+
+def _continuation(text: str) -> SuffixEntry:
+    # The leading "," or "." attaches to the previous piece's last word
+    return text, len(text.split()) - 1
+
+
+def variants_json(seed: int, available: int, variants: List[str]) -> str:
+    """The variants response, formatted exactly like json.dumps(..., indent=2) but much faster."""
+    if not variants:
+        return json.dumps({"seed": seed, "available": available, "variants": variants}, indent=2)
+    items = ",\n    ".join(map(encode_basestring_ascii, variants))
+    return f'{{\n  "seed": {seed},\n  "available": {available},\n  "variants": [\n    {items}\n  ]\n}}'
@@ -0,0 +1,19 @@
+"""
+tests/conftest.py - Shared fixtures
+"""
+
+import os
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def isolated_cache_dir(tmp_path_factory):
+    """Keep compiled caches out of the user's cache directory."""
+    previous = os.environ.get("MICROSCOPY_CACHE_DIR")
+    os.environ["MICROSCOPY_CACHE_DIR"] = str(tmp_path_factory.mktemp("cache"))
+    yield
+    if previous is None:
+        del os.environ["MICROSCOPY_CACHE_DIR"]
+    else:
+        os.environ["MICROSCOPY_CACHE_DIR"] = previous
@@ -0,0 +1,81 @@
+"""
+tests/reference.py - Original per-call implementations kept as oracles.
+
+Optimized code paths are checked byte-for-byte against these, and the
+benchmarks time against them.
+"""
+
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES
+
+# Key order of the original MICROSCOPY_PROFILES dict literal. The oracles
+# below read the profile store, so this pins the order on its own.
+LEGACY_TYPE_ORDER = ("fluorescence", "electron", "phase_contrast", "confocal", "brightfield",
+                     "darkfield", "multiphoton")
+
+
+def legacy_enhance_prompt(
+    base_prompt,
+    microscopy_type,
+    magnification="medium",
+    color_palette="scientific",
+    aesthetic_strength="balanced",
+    profiles=MICROSCOPY_PROFILES
+):
+    """The original enhance_prompt_with_microscopy body, unchanged."""
+    microscopy_type = microscopy_type.lower().replace(" ", "_")
+
+    if microscopy_type not in profiles:
+        available = ", ".join(profiles.keys())
+        return f"Error: Unknown microscopy type '{microscopy_type}'. Available types: {available}"
+
+    profile = profiles[microscopy_type]
+
+    strength_map = {
+        "subtle": 2,
+        "balanced": 4,
+        "strong": 6
+    }
+    num_characteristics = strength_map.get(aesthetic_strength.lower(), 4)
+
+    characteristics = []
+    characteristics.extend(profile["structure"][:2])
+    characteristics.extend(profile["material"][:1])
+    characteristics.extend(profile["color"][:1])
+    characteristics.extend(profile["texture"][:1])
+
+    if num_characteristics >= 5:
+        characteristics.extend(profile["composition"][:1])
+    if num_characteristics >= 6:
+        characteristics.extend(profile["style"][:1])
+
+    mag_key = magnification.lower()
+    if mag_key not in profile["magnification_feel"]:
+        mag_key = "medium"
+    mag_language = profile["magnification_feel"][mag_key]
+
+    color_key = color_palette.lower()
+    if color_key not in profile["color_palette"]:
+        color_key = "scientific"
+    color_selection = profile["color_palette"][color_key]
+
+    enhanced = f"{base_prompt}, rendered with {profile['display_name'].lower()} microscopy aesthetics. "
+    enhanced += f"Features {', '.join(characteristics[:num_characteristics])}. "
+    enhanced += f"Color palette emphasizes {color_selection[0]}. "
+    enhanced += f"Captures {mag_language}. "
+    enhanced += "Highly detailed 8k scientific visualization."
+
+    words = enhanced.split()
+    if len(words) > 80:
+        enhanced = " ".join(words[:80]) + "."
+
+    return enhanced.strip()
+
+
+def legacy_keyword_scores(description, keyword_map):
+    """The original suggest_microscopy_type scoring loop: one substring scan per keyword."""
+    description_lower = description.lower()
+    scores = {}
+    for microscopy_type, keywords in keyword_map.items():
+        score = sum(1 for keyword in keywords if keyword in description_lower)
+        scores[microscopy_type] = score
+    return scores
@@ -0,0 +1,210 @@
+"""
+tests/test_aliases.py - Unit tests for type aliases and near-miss resolution
+"""
+
+import asyncio
+import json
+import random
+import string
+import time
+
+import pytest
+
+from microscopy_aesthetics import aliases, server
+from microscopy_aesthetics.aliases import TypeIndex, alias_key, trigrams
+from microscopy_aesthetics.blending import BlendSuffixTable
+from microscopy_aesthetics.compact import plain
+from microscopy_aesthetics.server import (
+    MICROSCOPY_PROFILES,
+    enhance_prompt_with_microscopy,
+    enhance_prompts_batch,
+    get_microscopy_profile,
+)
+from microscopy_aesthetics.store import ProfileError, parse_profile
+
+ALIASES = {
+    'SEM': 'electron',
+    'tem': 'electron',
+    'Cryo-EM': 'electron',
+    'Electron (SEM/TEM)': 'electron',
+    'two-photon': 'multiphoton',
+    '2P': 'multiphoton',
+    'DIC': 'phase_contrast',
+    'Phase-Contrast': 'phase_contrast',
+    'phase contrast microscopy': 'phase_contrast',
+    'Confocal Microscopy': 'confocal',
+}
+NEAR_MISSES = {
+    'confocl': 'confocal',
+    'flourescence': 'fluorescence',
+    'brightfeild': 'brightfield',
+    'darkfeild': 'darkfield',
+    'electrn': 'electron',
+    'multifoton': 'multiphoton',
+}
+
+
+def _word(i, length=9):
+    rng = random.Random(i)
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def _synthetic_profiles(count):
+    base = plain(MICROSCOPY_PROFILES['brightfield'])
+    return {
+        f'scope_{i:05d}': dict(base, display_name=f'{_word(i)} scope', aliases=[f'sc{i}x'],
+                               style=[f'{_word(-i)} style'])
+        for i in range(count)
+    }
+
+
+class TestTypeIndex:
+    """Test alias keys, trigram scoring and resolution."""
+
+    def test_alias_key(self):
+        """Test that case, separators and noise words fold away."""
+        assert alias_key('Phase-Contrast') == alias_key('phase_contrast') == alias_key('PHASE CONTRAST') \
+            == alias_key('phase contrast microscopy') == 'phase_contrast'
+        assert alias_key('microscopy') == ''
+        assert trigrams('ab') == {'  a', ' ab', 'ab '}
+
+    def test_exact_and_alias_names(self):
+        """Test keys, display names and declared aliases."""
+        index = TypeIndex(MICROSCOPY_PROFILES)
+        for name, expected in ALIASES.items():
+            assert index.canonical(name) == expected, name
+        for key, profile in MICROSCOPY_PROFILES.items():
+            assert index.canonical(key) == index.canonical(profile['display_name']) == key
+
+    def test_near_misses_resolve(self):
+        """Test that clear typos resolve to their type."""
+        index = TypeIndex(MICROSCOPY_PROFILES)
+        for name, expected in NEAR_MISSES.items():
+            assert index.canonical(name) is None
+            assert index.resolve(name) == expected, name
+
+    @pytest.mark.parametrize("name", ['x-ray', 'microscopy', 'cell', 'zzz', ''])
+    def test_unclear_names_do_not_resolve(self, name):
+        """Test that names without one clear match stay unknown."""
+        assert TypeIndex(MICROSCOPY_PROFILES).resolve(name) is None
+
+    def test_keys_win_over_aliases(self):
+        """Test precedence: keys, then display names, then aliases in profile order."""
+        profiles = {
+            'alpha': {'display_name': 'Alpha', 'aliases': ['beta', 'shared']},
+            'beta': {'display_name': 'Gamma', 'aliases': ['alpha']},
+            'delta': {'display_name': 'Shared'},
+        }
+        index = TypeIndex(profiles)
+        assert index.canonical('beta') == 'beta'
+        assert index.canonical('alpha') == 'alpha'
+        assert index.canonical('shared') == 'delta'
+
+    def test_resolve_is_memoized(self, monkeypatch):
+        """Test that a repeated name is scored once and the memo stays bounded."""
+        index = TypeIndex(MICROSCOPY_PROFILES)
+        calls = []
+        original = index.ranked
+        monkeypatch.setattr(index, 'ranked', lambda name: calls.append(name) or original(name))
+        for _ in range(3):
+            assert index.resolve('confocl') == 'confocal'
+        assert calls == ['confocl']
+        monkeypatch.setattr(aliases, 'MEMO_SIZE', 4)
+        for name in ('a1', 'a2', 'a3', 'a4', 'a5'):
+            index.resolve(name)
+        assert len(index._memo) <= 4
+
+    def test_scales_to_thousands_of_profiles(self):
+        """Test that lookups stay fast and correct with 5000 profiles."""
+        profiles = _synthetic_profiles(5000)
+        index = TypeIndex(profiles)
+        assert index.canonical('SC4321X') == 'scope_04321'
+        assert index.canonical(f'{_word(42).upper()} Scope') == 'scope_00042'
+        # Each synthetic display name with one letter dropped
+        names = [f'{_word(i)[:4]}{_word(i)[5:]} scope' for i in range(0, 5000, 50)]
+        started = time.perf_counter()
+        resolved = [index.resolve(name) for name in names]
+        elapsed = time.perf_counter() - started
+        assert resolved == [f'scope_{i:05d}' for i in range(0, 5000, 50)]
+        # Generous bound for slow machines; a scan of every name takes far longer
+        assert elapsed / len(names) < 0.05
+
+
+class TestAliasTools:
+    """Test aliases and near misses through the MCP tools."""
+
+    @pytest.mark.parametrize("name, expected", list(ALIASES.items()) + list(NEAR_MISSES.items()))
+    def test_enhance(self, name, expected):
+        """Test that an alias enhances exactly like its type."""
+        assert enhance_prompt_with_microscopy('a cell', name) == enhance_prompt_with_microscopy('a cell', expected)
+
+    @pytest.mark.parametrize("name, expected", [('SEM', 'electron'), ('two-photon', 'multiphoton'),
+                                                ('flourescence', 'fluorescence')])
+    def test_get_profile(self, name, expected):
+        """Test that the profile tool resolves aliases, sync and async."""
+        assert get_microscopy_profile(name) == get_microscopy_profile(expected)
+        assert asyncio.run(server.get_microscopy_profile_async(name, compact=True)) == \
+            get_microscopy_profile(expected, compact=True)
+
+    def test_aliases_are_not_served(self):
+        """Test that profile responses keep their original fields."""
+        profile = json.loads(get_microscopy_profile('confocal'))
+        assert 'aliases' not in profile
+        assert list(profile) == [f for f in MICROSCOPY_PROFILES['confocal'] if f != 'aliases']
+        assert 'aliases' not in json.loads(get_microscopy_profile('SEM', compact=True))
+        error = get_microscopy_profile('confocal', fields=['aliases'])
+        assert error.startswith("Error: Unknown profile field 'aliases'. Available fields: display_name, ")
+        assert 'aliases' not in error.split('Available fields: ')[1].split(', ')
+
+    def test_options_variants_and_budget(self):
+        """Test that aliases work with every enhancement option."""
+        kwargs = dict(magnification='high', color_palette='artistic', aesthetic_strength='strong')
+        assert enhance_prompt_with_microscopy('a', 'DIC', **kwargs) == \
+            enhance_prompt_with_microscopy('a', 'phase_contrast', **kwargs)
+        assert enhance_prompt_with_microscopy('a', 'tem', variants=5, seed=2) == \
+            enhance_prompt_with_microscopy('a', 'electron', variants=5, seed=2)
+        assert enhance_prompt_with_microscopy('cell ' * 100, '2p', budget=90) == \
+            enhance_prompt_with_microscopy('cell ' * 100, 'multiphoton', budget=90)
+
+    def test_blend_members(self):
+        """Test that blend members may be aliases."""
+        assert enhance_prompt_with_microscopy('a', {'SEM': 0.7, 'confocl': 0.3}) == \
+            enhance_prompt_with_microscopy('a', 'electron:0.7+confocal:0.3')
+
+    def test_batch(self):
+        """Test aliases as batch item types."""
+        result = json.loads(enhance_prompts_batch(items=[
+            {'base_prompt': 'a', 'microscopy_type': 'two-photon'},
+            {'base_prompt': 'b', 'microscopy_type': 'microscope'},
+        ]))
+        assert result['results'][0]['enhanced_prompt'] == enhance_prompt_with_microscopy('a', 'multiphoton')
+        assert result['results'][1]['error'].startswith("Unknown microscopy type 'microscope'")
+
+    def test_errors_suggest_close_types(self):
+        """Test that unknown names list their best matches before the available types."""
+        result = enhance_prompt_with_microscopy('a', 'field')
+        assert result.startswith("Error: Unknown microscopy type 'field'. Did you mean: darkfield, brightfield")
+        assert get_microscopy_profile('x-ray') == (
+            "Error: Unknown microscopy type 'x-ray'. Available types: fluorescence, electron, "
+            "phase_contrast, confocal, brightfield, darkfield, multiphoton")
+        assert 'Did you mean: ' in enhance_prompt_with_microscopy('a', {'confocal': 1, 'darkfeld_scope': 1})
+
+    def test_derived_table_keeps_index_warm(self):
+        """Test that a table derived after its index was used builds its own eagerly."""
+        table = BlendSuffixTable(MICROSCOPY_PROFILES)
+        assert table.derive(MICROSCOPY_PROFILES, set())._index is None
+        assert table.canonical_type('sem') == 'electron'
+        derived = table.derive(MICROSCOPY_PROFILES, {'electron'})
+        assert derived._index is not None
+        assert derived.canonical_type('sem') == 'electron'
+
+
+def test_profile_aliases_are_validated(tmp_path):
+    """Test that aliases must be a list of names."""
+    path = tmp_path / 'sepia.yaml'
+    profile = plain(MICROSCOPY_PROFILES['brightfield'])
+    path.write_text(json.dumps(dict(profile, aliases='sepia tone')))
+    with pytest.raises(ProfileError, match='aliases must be a list'):
+        parse_profile(path)
+    path.write_text(json.dumps(dict(profile, aliases=['sepia tone'])))
+    assert parse_profile(path)['aliases'] == ['sepia tone']
@@ -0,0 +1,147 @@
+"""
+tests/test_batch.py - Unit tests for batch enhancement
+"""
+
+import json
+import os
+import time
+
+from microscopy_aesthetics.batch import BatchSpool
+from microscopy_aesthetics.paths import cache_dir
+from microscopy_aesthetics.server import enhance_prompt_with_microscopy, enhance_prompts_batch
+
+
+class TestBatchEnhancement:
+    """Test the enhance_prompts_batch tool."""
+
+    def test_items_match_single_calls(self):
+        """Test that each item matches enhance_prompt_with_microscopy."""
+        items = [
+            {'base_prompt': 'a butterfly wing', 'microscopy_type': 'fluorescence'},
+            {'base_prompt': 'pollen', 'microscopy_type': 'Electron', 'magnification': 'high',
+             'color_palette': 'monochrome', 'aesthetic_strength': 'strong'},
+        ]
+        data = json.loads(enhance_prompts_batch(items=items))
+        assert data['count'] == 2
+        assert data['errors'] == 0
+        assert data['next_offset'] is None
+        for item, result in zip(items, data['results']):
+            assert result['enhanced_prompt'] == enhance_prompt_with_microscopy(**item)
+
+    def test_shared_config(self):
+        """Test that one configuration applies to many prompts."""
+        data = json.loads(enhance_prompts_batch(
+            prompts=['cells', 'tissue', 'crystals'],
+            microscopy_type='darkfield',
+            magnification='low'
+        ))
+        assert [r['index'] for r in data['results']] == [0, 1, 2]
+        assert data['results'][1]['enhanced_prompt'] == enhance_prompt_with_microscopy(
+            'tissue', 'darkfield', magnification='low'
+        )
+
+    def test_errors_reported_in_input_order(self):
+        """Test that invalid items get errors without failing the batch."""
+        items = [
+            {'base_prompt': 'ok', 'microscopy_type': 'confocal'},
+            {'base_prompt': 'bad', 'microscopy_type': 'invalid_type'},
+            {'microscopy_type': 'confocal'},
+            {'base_prompt': 3, 'microscopy_type': 'confocal'},
+            'not an object',
+        ]
+        data = json.loads(enhance_prompts_batch(items=items))
+        results = data['results']
+        assert data['errors'] == 4
+        assert 'enhanced_prompt' in results[0]
+        assert 'Unknown microscopy type' in results[1]['error']
+        assert 'base_prompt' in results[2]['error']
+        assert 'must be a string' in results[3]['error']
+        assert results[4]['error'] == 'Item must be an object'
+
+    def test_jsonl_output(self):
+        """Test JSON Lines output with a trailing summary line."""
+        result = enhance_prompts_batch(prompts=['a', 'b'], microscopy_type='brightfield',
+                                       output_format='jsonl')
+        lines = [json.loads(line) for line in result.splitlines()]
+        assert [line['index'] for line in lines[:2]] == [0, 1]
+        assert lines[-1]['summary']['count'] == 2
+
+    def test_response_size_cap_and_resume(self):
+        """Test that large batches are split across calls via next_offset."""
+        prompts = [f'prompt {i}' for i in range(200)]
+        collected = []
+        offset = 0
+        while offset is not None:
+            data = json.loads(enhance_prompts_batch(
+                prompts=prompts, microscopy_type='confocal',
+                offset=offset, max_response_bytes=10000
+            ))
+            assert len(json.dumps(data['results'])) <= 10000
+            collected.extend(data['results'])
+            offset = data['next_offset']
+        assert [r['index'] for r in collected] == list(range(200))
+
+    def test_cursor_continues_without_resending(self):
+        """Test that a cursor returns every remaining item once, with items sent only in the first call."""
+        prompts = [f'prompt {i}' for i in range(300)]
+        for output_format in ('json', 'jsonl'):
+            collected = []
+            kwargs = {'prompts': prompts, 'microscopy_type': 'confocal'}
+            while True:
+                result = enhance_prompts_batch(output_format=output_format, max_response_bytes=5000, **kwargs)
+                assert len(result.encode('utf-8')) <= 5000
+                if output_format == 'jsonl':
+                    lines = [json.loads(line) for line in result.splitlines()]
+                    summary, results = lines[-1]['summary'], lines[:-1]
+                else:
+                    summary = json.loads(result)
+                    results = summary['results']
+                collected.extend(results)
+                if summary['cursor'] is None:
+                    assert summary['next_offset'] is None
+                    break
+                assert summary['next_offset'] == results[-1]['index'] + 1
+                kwargs = {'cursor': summary['cursor']}
+                batch_id = summary['cursor'].split('-')[0]
+            assert [r['index'] for r in collected] == list(range(300))
+            assert collected[123]['enhanced_prompt'] == enhance_prompt_with_microscopy('prompt 123', 'confocal')
+            # A finished batch leaves no spool file behind
+            assert not (cache_dir() / 'batches' / f'{batch_id}.jsonl').exists()
+
+    def test_unknown_cursor(self):
+        """Test that unknown, malformed and finished cursors are errors."""
+        assert enhance_prompts_batch(cursor='../../etc/passwd').startswith("Error: Unknown or expired cursor")
+        first = json.loads(enhance_prompts_batch(prompts=['a'] * 50, microscopy_type='confocal',
+                                                 max_response_bytes=2000))
+        assert enhance_prompts_batch(cursor=first['cursor']).startswith('{')
+        assert enhance_prompts_batch(cursor=first['cursor']).startswith("Error: Unknown or expired cursor")
+        assert enhance_prompts_batch(prompts=['a'], cursor=first['cursor']).startswith('Error: Provide exactly one')
+
+    def test_unused_spools_expire(self, tmp_path):
+        """Test that spool files untouched for the TTL are removed when a new batch is spooled."""
+        spool = BatchSpool(tmp_path, ttl=60)
+        stale = spool.save(0, [{'base_prompt': 'a'}])
+        path = tmp_path / f"{stale.split('-')[0]}.jsonl"
+        old = time.time() - 120
+        os.utime(path, (old, old))
+        spool.save(0, [{'base_prompt': 'b'}])
+        assert not path.exists() and spool.open(stale) is None
+
+    def test_response_never_exceeds_cap(self):
+        """Test that separators and the summary are counted against max_response_bytes."""
+        prompts = [f'prompt {i}' for i in range(300)]
+        for output_format in ('json', 'jsonl'):
+            for cap in (1000, 2500, 10000, 50000):
+                result = enhance_prompts_batch(prompts=prompts, microscopy_type='confocal',
+                                               output_format=output_format, max_response_bytes=cap)
+                assert len(result.encode('utf-8')) <= cap
+                last = json.loads(result.splitlines()[-1])['summary'] if output_format == 'jsonl' \
+                    else json.loads(result)
+                assert last['next_offset'] is not None
+
+    def test_invalid_arguments(self):
+        """Test argument validation errors."""
+        assert enhance_prompts_batch().startswith('Error')
+        assert enhance_prompts_batch(prompts=['a']).startswith('Error')
+        assert enhance_prompts_batch(prompts=['a'], microscopy_type='confocal',
+                                     output_format='xml').startswith('Error')
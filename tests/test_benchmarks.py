@@ -0,0 +1,65 @@
+"""
+tests/test_benchmarks.py - Unit tests for the benchmark suite's reporting and gating
+"""
+
+import asyncio
+import json
+
+from benchmarks.suite import build_cases, compare, main, percentile, run_suite
+
+
+def _results(**p50s):
+    return {'results': {name: {'p50_us': value, 'p95_us': value} for name, value in p50s.items()}}
+
+
+class TestGating:
+    """Test baseline comparison."""
+
+    def test_regression_past_threshold(self):
+        """Test that only slowdowns past the threshold are flagged."""
+        rows = compare(_results(a=130.0, b=110.0, c=50.0), _results(a=100.0, b=100.0, c=100.0),
+                       threshold=0.25)
+        assert {row['name']: row['regressed'] for row in rows} == {'a': True, 'b': False, 'c': False}
+
+    def test_noise_floor(self):
+        """Test that tiny absolute slowdowns are ignored."""
+        rows = compare(_results(fast=0.6), _results(fast=0.3), threshold=0.25, min_delta_us=1.0)
+        assert not rows[0]['regressed']
+
+    def test_new_benchmarks_are_skipped(self):
+        """Test that benchmarks missing from the baseline are not compared."""
+        assert compare(_results(new=5.0), _results(old=5.0)) == []
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = list(range(1, 101))
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([7], 0.95) == 7
+
+
+class TestSuite:
+    """Smoke test the suite itself."""
+
+    def test_cases_cover_every_tool(self):
+        """Test that every registered tool is benchmarked."""
+        from microscopy_aesthetics.server import mcp
+        tools = {tool.name for tool in asyncio.run(mcp.list_tools())}
+        assert tools <= {case.tool for case in build_cases()}
+
+    def test_run_and_gate(self, tmp_path):
+        """Test a tiny run end to end, including a failing gate."""
+        results = run_suite(iterations=5, client_iterations=2, warmup=1, only='list/')
+        assert set(results['results']) == {
+            'direct/list/pretty', 'direct/list/compact', 'client/list/pretty', 'client/list/compact'
+        }
+        baseline = tmp_path / 'baseline.json'
+        assert main(['--iterations', '5', '--no-client', '--only', 'list/',
+                     '--baseline', str(baseline), '--save-baseline']) == 0
+        # A baseline 1000x faster than reality must fail the gate
+        recorded = json.loads(baseline.read_text())
+        for stats in recorded['results'].values():
+            stats['p50_us'] /= 1000
+        baseline.write_text(json.dumps(recorded))
+        assert main(['--iterations', '5', '--no-client', '--only', 'list/',
+                     '--baseline', str(baseline), '--min-delta-us', '0']) == 1
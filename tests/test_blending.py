@@ -0,0 +1,234 @@
+"""
+tests/test_blending.py - Unit tests for weighted multi-type blends
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from microscopy_aesthetics import blending, server
+from microscopy_aesthetics.blending import (
+    BlendError,
+    BlendSuffixTable,
+    apportion,
+    blend_name,
+    blend_profile,
+    blend_spec,
+    parse_blend,
+)
+from microscopy_aesthetics.enhancement import STRENGTH_LEVELS, build_suffix
+from microscopy_aesthetics.matching import VOCABULARY_FIELDS
+from microscopy_aesthetics.server import (
+    MICROSCOPY_PROFILES,
+    enhance_prompt_with_microscopy,
+    enhance_prompts_batch,
+    suggest_microscopy_type,
+)
+
+
+def _features(suffix):
+    return suffix.split('Features ', 1)[1].split('. Color palette', 1)[0].split(', ')
+
+
+class TestParseBlend:
+    """Test blend strings, mappings and their canonical names."""
+
+    def test_normalized_and_ordered(self):
+        """Test that weights sum to 1 and members are heaviest first."""
+        blend = parse_blend(blend_spec({'Phase Contrast': 1, 'confocal': 3}), MICROSCOPY_PROFILES)
+        assert blend == (('confocal', 0.75), ('phase_contrast', 0.25))
+        assert blend_name(blend) == 'confocal:0.75+phase_contrast:0.25'
+
+    def test_spaced_string(self):
+        """Test that spaces around separators are ignored."""
+        spec = blend_spec('Phase Contrast : 0.5 + Confocal')
+        assert blend_name(parse_blend(spec, MICROSCOPY_PROFILES)) == 'confocal:0.667+phase_contrast:0.333'
+
+    def test_equal_weights_keep_profile_order(self):
+        """Test that ties are ordered like the profile set and repeats add up."""
+        blend = parse_blend('darkfield+confocal', MICROSCOPY_PROFILES)
+        assert blend == (('confocal', 0.5), ('darkfield', 0.5))
+        assert parse_blend('confocal+darkfield+confocal', MICROSCOPY_PROFILES) == \
+            (('confocal', 0.667), ('darkfield', 0.333))
+
+    def test_negligible_member_drops_out(self):
+        """Test that a member rounding to zero weight leaves a single type."""
+        assert blend_name(parse_blend('confocal:9999+darkfield:1', MICROSCOPY_PROFILES)) == 'confocal'
+
+    @pytest.mark.parametrize("spec, message", [
+        ('confocal+x-ray', "Unknown microscopy type 'x-ray'"),
+        ('confocal:0+darkfield', "Blend weight for 'confocal' must be a positive number"),
+        ('confocal:-1+darkfield', "Blend weight for 'confocal' must be a positive number"),
+        ('confocal:lots+darkfield', "Blend weight for 'confocal' must be a positive number"),
+        ('confocal:nan+darkfield', "Blend weight for 'confocal' must be a positive number"),
+        ('confocal:inf+darkfield', "Blend weight for 'confocal' must be a positive number"),
+    ])
+    def test_invalid(self, spec, message):
+        """Test unknown members and bad weights."""
+        with pytest.raises(BlendError, match=message):
+            parse_blend(spec, MICROSCOPY_PROFILES)
+
+
+class TestBlendProfile:
+    """Test merging member vocabularies in proportion to their weights."""
+
+    def test_single_type_is_unchanged(self):
+        """Test that a one-member blend compiles to the type's own suffixes."""
+        for key, profile in MICROSCOPY_PROFILES.items():
+            merged = blend_profile(MICROSCOPY_PROFILES, ((key, 1.0),))
+            for mag in profile['magnification_feel']:
+                for palette in profile['color_palette']:
+                    for num in set(STRENGTH_LEVELS.values()):
+                        assert build_suffix(merged, mag, palette, num) == build_suffix(profile, mag, palette, num)
+
+    def test_apportionment(self):
+        """Test Sainte-Lague order: a 0.3 share gets the second pick."""
+        picks = apportion((('confocal', 0.7), ('darkfield', 0.3)))
+        assert [next(picks) for _ in range(10)].count('darkfield') == 3
+        picks = apportion((('confocal', 0.7), ('darkfield', 0.3)))
+        assert [next(picks) for _ in range(2)] == ['confocal', 'darkfield']
+
+    @pytest.mark.parametrize("weights, expected", [
+        ({'confocal': 0.7, 'darkfield': 0.3}, (4, 2)),
+        ({'confocal': 0.5, 'darkfield': 0.5}, (3, 3)),
+        ({'confocal': 0.9, 'darkfield': 0.1}, (5, 1)),
+    ])
+    def test_characteristics_follow_weights(self, weights, expected):
+        """Test how many characteristics each member contributes."""
+        blend = parse_blend(blend_spec(weights), MICROSCOPY_PROFILES)
+        merged = blend_profile(MICROSCOPY_PROFILES, blend)
+        features = _features(build_suffix(merged, 'medium', 'scientific', 6))
+        vocabulary = {key: {p for f in VOCABULARY_FIELDS for p in MICROSCOPY_PROFILES[key].get(f, ())}
+                      for key in weights}
+        confocal = sum(p in vocabulary['confocal'] for p in features)
+        darkfield = sum(p in vocabulary['darkfield'] and p not in vocabulary['confocal'] for p in features)
+        assert (confocal, darkfield) == expected
+
+    def test_palette_and_magnification_join_members(self):
+        """Test that both members' palette and magnification language is used."""
+        merged = blend_profile(MICROSCOPY_PROFILES, (('confocal', 0.7), ('darkfield', 0.3)))
+        confocal, darkfield = MICROSCOPY_PROFILES['confocal'], MICROSCOPY_PROFILES['darkfield']
+        assert merged['color_palette']['artistic'][0] == \
+            f"{confocal['color_palette']['artistic'][0]} and {darkfield['color_palette']['artistic'][0]}"
+        assert merged['magnification_feel']['high'] == \
+            f"{confocal['magnification_feel']['high']} and {darkfield['magnification_feel']['high']}"
+        assert merged['display_name'] == 'Confocal and Darkfield'
+
+    def test_merged_fields_are_deduplicated(self):
+        """Test that phrases shared by members appear once."""
+        merged = blend_profile(MICROSCOPY_PROFILES, parse_blend('fluorescence+confocal+multiphoton',
+                                                                MICROSCOPY_PROFILES))
+        for field in VOCABULARY_FIELDS:
+            assert len(merged[field]) == len(set(merged[field]))
+        for phrases in merged['color_palette'].values():
+            assert len(phrases) == len(set(phrases))
+
+
+class TestBlendSuffixTable:
+    """Test memoized blend lookups."""
+
+    def test_repeat_blend_is_memoized(self, monkeypatch):
+        """Test that a blend's vocabularies are merged once, whatever spelling is used."""
+        merges = []
+        original = blending.blend_profile
+        monkeypatch.setattr(blending, 'blend_profile', lambda *a: merges.append(a) or original(*a))
+        table = BlendSuffixTable(MICROSCOPY_PROFILES)
+        first = table.lookup('confocal:0.7+darkfield:0.3')
+        for _ in range(3):
+            assert table.lookup('confocal:0.7+darkfield:0.3') is first
+        key = table.resolve('confocal:7+darkfield:3', 'high', 'artistic', 'strong')
+        assert key == ('confocal:0.7+darkfield:0.3', 'high', 'artistic', 6)
+        assert table.entry(key) is table.lookup('confocal:7+darkfield:3', 'high', 'artistic', 'strong')
+        assert len(merges) == 1
+
+    def test_cache_is_bounded(self):
+        """Test that old blends are evicted and rebuilt on demand."""
+        table = BlendSuffixTable(MICROSCOPY_PROFILES, max_blends=4)
+        entries = [table.lookup(f'confocal:{w}+darkfield:1') for w in range(2, 10)]
+        assert len(table._blends) <= 4
+        assert table.lookup('confocal:2+darkfield:1') == entries[0]
+
+    def test_plain_types_unaffected(self):
+        """Test that single types and their errors are unchanged."""
+        table = BlendSuffixTable(MICROSCOPY_PROFILES)
+        assert table.lookup('confocal') == server.PROFILE_SNAPSHOTS.current.suffix_table.lookup('confocal')
+        assert table.lookup('confocal:1') is table.lookup('confocal')
+        assert table.resolve('x-ray') is None
+        assert table.unknown_message('x-ray').startswith("Unknown microscopy type 'x-ray'")
+        assert table.unknown_message('confocal+x-ray').startswith("Unknown microscopy type 'x-ray'")
+
+    def test_derive_drops_blends_of_changed_types(self):
+        """Test that reloads keep only blends whose members did not change."""
+        table = BlendSuffixTable(MICROSCOPY_PROFILES)
+        kept = table.lookup('confocal+electron')
+        table.lookup('confocal+darkfield')
+        derived = table.derive(MICROSCOPY_PROFILES, frozenset({'darkfield'}))
+        assert isinstance(derived, BlendSuffixTable)
+        assert set(derived._blends) == {'confocal+electron', 'electron:0.5+confocal:0.5'}
+        assert derived.lookup('confocal+electron') is kept
+
+
+class TestBlendTools:
+    """Test blends through the MCP tools."""
+
+    def test_mapping_and_string_agree(self):
+        """Test that both spellings give the same enhancement."""
+        result = enhance_prompt_with_microscopy('a cell', {'confocal': 0.7, 'darkfield': 0.3})
+        assert result == enhance_prompt_with_microscopy('a cell', 'confocal:0.7+darkfield:0.3')
+        assert result.startswith('a cell, rendered with confocal and darkfield microscopy aesthetics')
+
+    def test_single_type_mapping_matches_type(self):
+        """Test that a one-type mapping is the plain type."""
+        assert enhance_prompt_with_microscopy('a cell', {'electron': 2}, 'high') == \
+            enhance_prompt_with_microscopy('a cell', 'electron', 'high')
+
+    def test_errors(self):
+        """Test unknown members and bad weights in the tool."""
+        assert enhance_prompt_with_microscopy('a cell', {'confocal': 1, 'x-ray': 1}).startswith(
+            "Error: Unknown microscopy type 'x-ray'")
+        assert enhance_prompt_with_microscopy('a cell', {'confocal': 0, 'darkfield': 1}) == \
+            "Error: Blend weight for 'confocal' must be a positive number"
+
+    def test_variants_and_budget(self):
+        """Test that blends work with variants and budgets."""
+        result = json.loads(enhance_prompt_with_microscopy('a cell', {'confocal': 0.5, 'electron': 0.5},
+                                                           variants=20, seed=3))
+        assert len(set(result['variants'])) == 20
+        assert all('electron (sem/tem) and confocal microscopy' in v for v in result['variants'])
+        result = enhance_prompt_with_microscopy('cell ' * 100, 'confocal+electron', budget=120)
+        assert len(result.split()) == 120
+
+    def test_batch(self):
+        """Test blends as item types and as the shared prompts type."""
+        result = json.loads(enhance_prompts_batch(items=[
+            {'base_prompt': 'a', 'microscopy_type': {'confocal': 0.7, 'darkfield': 0.3}},
+            {'base_prompt': 'b', 'microscopy_type': 'confocal+x-ray'},
+            {'base_prompt': 'c', 'microscopy_type': 7},
+        ]))
+        assert result['results'][0]['enhanced_prompt'] == \
+            enhance_prompt_with_microscopy('a', 'confocal:0.7+darkfield:0.3')
+        assert result['results'][1]['error'].startswith("Unknown microscopy type 'x-ray'")
+        assert result['results'][2]['error'] == "Field 'microscopy_type' must be a string"
+        result = json.loads(enhance_prompts_batch(prompts=['a', 'b'], microscopy_type={'electron': 1, 'confocal': 1}))
+        assert result['errors'] == 0
+        assert result['results'][1]['enhanced_prompt'] == enhance_prompt_with_microscopy('b', 'confocal+electron')
+
+    def test_suggest_blend(self):
+        """Test that the top matches are offered as one weighted blend."""
+        suggestions = json.loads(suggest_microscopy_type('dramatic dark glowing neon 3d depth layers', blend=True))
+        mixed = suggestions[0]
+        assert mixed['type'] == blend_name(tuple(mixed['weights'].items()))
+        assert list(mixed['weights']) == [s['type'] for s in suggestions[1:4]]
+        assert abs(sum(mixed['weights'].values()) - 1) < 0.01
+        assert not enhance_prompt_with_microscopy('a cell', mixed['type']).startswith('Error')
+        # Unchanged without blend=True, and with fewer than two matches
+        assert json.loads(suggest_microscopy_type('dramatic dark glowing neon 3d depth layers')) == suggestions[1:]
+        assert len(json.loads(suggest_microscopy_type('zzz qqq', blend=True))) == 1
+
+    def test_async_variants(self):
+        """Test the registered async tools accept blends."""
+        result = asyncio.run(server.enhance_prompt_with_microscopy_async('a cell', {'confocal': 1, 'darkfield': 1}))
+        assert result == enhance_prompt_with_microscopy('a cell', 'confocal+darkfield')
+        result = asyncio.run(server.suggest_microscopy_type_async('glowing dark rim', blend=True))
+        assert result == suggest_microscopy_type('glowing dark rim', blend=True)
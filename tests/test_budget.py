@@ -0,0 +1,156 @@
+"""
+tests/test_budget.py - Budget-aware composition must never exceed its budget
+"""
+
+import itertools
+import json
+
+import pytest
+from microscopy_aesthetics import enhancement, server
+from microscopy_aesthetics.enhancement import (
+    BUDGET_UNITS,
+    MAX_WORDS,
+    STRENGTH_LEVELS,
+    compose,
+    compose_within,
+    count_tokens,
+    leading_words,
+    suffix_cost,
+)
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES, enhance_prompt_with_microscopy
+
+from tests.reference import legacy_enhance_prompt
+
+BASE_PROMPTS = [
+    'a butterfly wing',
+    '',
+    '   ',
+    '  padded  prompt  ',
+    'ends with newline\n',
+    'naïve façade, 3 cells; don\'t stop!!',
+    'supercalifragilisticexpialidocious',
+    'word ' * 10_000,
+    'long, punctuated! ' * 3_000 + 'tail',
+]
+# Extra room on top of the suffix's own length
+SLACK = [0, 1, 2, 7, 40, 400]
+
+
+def _length(text, unit):
+    if unit == 'words':
+        return len(text.split())
+    if unit == 'chars':
+        return len(text)
+    return count_tokens(text)
+
+
+def _entries():
+    table = server.PROFILE_SNAPSHOTS.current.suffix_table
+    for combo in itertools.product(MICROSCOPY_PROFILES, ['low', 'medium', 'high'],
+                                   ['scientific', 'artistic', 'monochrome'], STRENGTH_LEVELS):
+        yield combo, table.lookup(*combo)
+
+
+class TestComposeWithin:
+    """Test compose_within() across every option combination."""
+
+    @pytest.mark.parametrize("unit", BUDGET_UNITS)
+    def test_never_exceeds_budget(self, unit):
+        """Test length guarantees for every type, magnification, palette and strength."""
+        for combo, (suffix, words) in _entries():
+            cost = suffix_cost(suffix, words, unit)
+            assert cost == _length(suffix, unit)
+            for base, slack in itertools.product(BASE_PROMPTS, SLACK):
+                result = compose_within(base, suffix, words, cost + slack, unit)
+                assert _length(result, unit) <= cost + slack, (combo, base[:20], slack)
+                # Only the base prompt is shortened, from its end
+                assert result.endswith(suffix)
+                head = result[:len(result) - len(suffix)]
+                assert ' '.join(base.split()).startswith(' '.join(head.split()))
+
+    @pytest.mark.parametrize("unit", BUDGET_UNITS)
+    def test_fitting_prompt_matches_compose(self, unit):
+        """Test that a budget with room to spare changes nothing."""
+        for _, (suffix, words) in _entries():
+            for base in BASE_PROMPTS[:7]:
+                assert compose_within(base, suffix, words, 10_000, unit) == compose(base, suffix, words)
+
+    def test_cut_falls_on_word_boundary(self):
+        """Test that shortened prompts keep whole words."""
+        suffix, words = server.PROFILE_SNAPSHOTS.current.suffix_table.lookup('confocal')
+        base = 'alpha beta gamma delta epsilon'
+        assert compose_within(base, suffix, words, words + 1, 'words') == 'alpha beta' + suffix
+        assert compose_within(base, suffix, words, len(suffix) + 13, 'chars') == 'alpha beta' + suffix
+        assert compose_within("it's done", suffix, words, count_tokens(suffix) + 1, 'tokens') == 'it' + suffix
+        assert compose_within("it's done", suffix, words, count_tokens(suffix) + 2, 'tokens') == "it's" + suffix
+
+    def test_words_budget_fills_exactly(self):
+        """Test that the word budget is used in full when the base prompt is long enough."""
+        for _, (suffix, words) in _entries():
+            for budget in (words, words + 1, 80, 120):
+                assert len(compose_within('word ' * 500, suffix, words, budget).split()) == budget
+
+    def test_huge_prompt_scans_only_the_budget(self, monkeypatch):
+        """Test that the base prompt is never split or joined in full."""
+        suffix, words = server.PROFILE_SNAPSHOTS.current.suffix_table.lookup('electron')
+        base = 'grain ' * 2_000_000
+        splits = []
+        original = leading_words
+        monkeypatch.setattr(enhancement, 'leading_words',
+                            lambda text, limit: splits.append(limit) or original(text, limit))
+        for unit in BUDGET_UNITS:
+            cost = suffix_cost(suffix, words, unit)
+            assert len(compose_within(base, suffix, words, cost + 50, unit)) < 1000
+        assert compose(base, suffix, words) == ' '.join(['grain'] * MAX_WORDS) + '.'
+        assert splits == [51, MAX_WORDS]
+
+
+class TestBudgetTool:
+    """Test enhance_prompt_with_microscopy(budget=...)."""
+
+    def test_default_output_unchanged(self):
+        """Test that calls without a budget still match the original pipeline."""
+        for base in BASE_PROMPTS:
+            assert enhance_prompt_with_microscopy(base, 'confocal') == legacy_enhance_prompt(base, 'confocal')
+
+    @pytest.mark.parametrize("unit", BUDGET_UNITS)
+    def test_budget_applies(self, unit):
+        """Test the tool's output fits the budget and keeps the whole suffix."""
+        for strength in STRENGTH_LEVELS:
+            result = enhance_prompt_with_microscopy('a diatom ' * 100, 'darkfield', aesthetic_strength=strength,
+                                                    budget=500 if unit == 'chars' else 70, budget_unit=unit)
+            assert _length(result, unit) <= (500 if unit == 'chars' else 70)
+            assert result.startswith('a diatom')
+            assert result.endswith('Highly detailed 8k scientific visualization.')
+
+    def test_budget_allows_more_than_eighty_words(self):
+        """Test that a budget replaces the default word limit."""
+        result = enhance_prompt_with_microscopy('cell ' * 200, 'confocal', budget=150)
+        assert len(result.split()) == 150
+
+    def test_budget_with_variants(self):
+        """Test every variant fits the budget."""
+        result = json.loads(enhance_prompt_with_microscopy('a coral reef ' * 50, 'fluorescence', variants=50,
+                                                           seed=4, budget=400, budget_unit='chars'))
+        assert len(result['variants']) == 50
+        assert all(len(v) <= 400 and v.startswith('a coral reef') for v in result['variants'])
+
+    def test_budget_too_small(self):
+        """Test that a budget the suffix cannot fit is an error rather than a cut suffix."""
+        suffix, words = server.PROFILE_SNAPSHOTS.current.suffix_table.lookup('confocal')
+        result = enhance_prompt_with_microscopy('a cell', 'confocal', budget=words - 1)
+        assert result == (f"Error: A budget of {words - 1} words cannot fit the microscopy suffix "
+                          f"({words} words)")
+        result = enhance_prompt_with_microscopy('a cell', 'confocal', variants=3, seed=1, budget=5,
+                                                budget_unit='tokens')
+        assert result.startswith("Error: A budget of 5 tokens cannot fit")
+
+    def test_unknown_unit(self):
+        """Test the unit error lists the available units."""
+        assert enhance_prompt_with_microscopy('a cell', 'confocal', budget=50, budget_unit='bytes') == \
+            "Error: Unknown budget unit 'bytes'. Available units: words, chars, tokens"
+
+    def test_unknown_type(self):
+        """Test the unknown type error is unchanged."""
+        result = enhance_prompt_with_microscopy('a cell', 'x-ray', budget=50)
+        assert result.startswith("Error: Unknown microscopy type 'x-ray'")
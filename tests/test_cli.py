@@ -0,0 +1,77 @@
+"""
+tests/test_cli.py - Unit tests for the streaming enhancement pipeline
+"""
+
+import csv
+import io
+import json
+
+from microscopy_aesthetics.cli import enhance_stream, main
+from microscopy_aesthetics.server import enhance_prompt_with_microscopy
+
+
+def _jsonl(records):
+    return io.StringIO("".join(json.dumps(r) + "\n" for r in records))
+
+
+class TestEnhanceStream:
+    """Test enhance_stream over JSONL and CSV."""
+
+    def test_jsonl_round_trip(self):
+        """Test that JSONL records keep their fields and gain enhanced_prompt."""
+        out = io.StringIO()
+        stats = enhance_stream(_jsonl([
+            {'base_prompt': 'cells', 'microscopy_type': 'confocal', 'id': 7},
+            {'base_prompt': 'wing', 'magnification': 'high'},
+        ]), out, defaults={'microscopy_type': 'electron'})
+        first, second = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert first['id'] == 7
+        assert first['enhanced_prompt'] == enhance_prompt_with_microscopy('cells', 'confocal')
+        assert second['enhanced_prompt'] == enhance_prompt_with_microscopy(
+            'wing', 'electron', magnification='high'
+        )
+        assert (stats.records, stats.errors) == (2, 0)
+
+    def test_jsonl_errors_counted(self):
+        """Test that bad lines become error records instead of aborting."""
+        out = io.StringIO()
+        stats = enhance_stream(io.StringIO('not json\n\n[1, 2]\n{"base_prompt": "x"}\n'), out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert len(lines) == 3
+        assert all('error' in line for line in lines)
+        assert (stats.records, stats.errors) == (3, 3)
+
+    def test_csv_round_trip(self):
+        """Test CSV input with empty cells falling back to defaults."""
+        out = io.StringIO()
+        stats = enhance_stream(
+            io.StringIO('base_prompt,microscopy_type,note\ncells,confocal,a\npollen,,b\n'),
+            out, fmt='csv', defaults={'microscopy_type': 'darkfield'}
+        )
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        assert [row['note'] for row in rows] == ['a', 'b']
+        assert rows[1]['enhanced_prompt'] == enhance_prompt_with_microscopy('pollen', 'darkfield')
+        assert stats.errors == 0
+
+    def test_chunks_and_workers_preserve_order(self):
+        """Test that output order survives chunking across a process pool."""
+        records = [{'base_prompt': f'prompt {i}', 'microscopy_type': 'brightfield'}
+                   for i in range(50)]
+        out = io.StringIO()
+        stats = enhance_stream(_jsonl(records), out, workers=2, chunk_size=7)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [r['base_prompt'] for r in results] == [r['base_prompt'] for r in records]
+        assert stats.records == 50
+
+
+class TestMain:
+    """Test the console entry point."""
+
+    def test_enhance_files(self, tmp_path, capsys):
+        """Test enhancing a file to a file and reporting throughput."""
+        source = tmp_path / 'prompts.jsonl'
+        target = tmp_path / 'out.jsonl'
+        source.write_text('{"base_prompt": "cells"}\n{"base_prompt": "tissue"}\n')
+        assert main(['enhance', str(source), '-o', str(target), '-t', 'multiphoton']) == 0
+        assert len(target.read_text().splitlines()) == 2
+        assert '2 records, 0 errors' in capsys.readouterr().err
@@ -0,0 +1,77 @@
+"""
+tests/test_compact.py - Unit tests for the compact profile representation
+"""
+
+import pickle
+
+import pytest
+import yaml
+
+from microscopy_aesthetics.compact import CompactProfile, VocabularyTable, plain
+from microscopy_aesthetics.store import PACKAGED_DIR
+
+
+@pytest.fixture
+def raw_profiles():
+    return {path.stem: yaml.safe_load(path.read_text()) for path in sorted(PACKAGED_DIR.glob('*.yaml'))}
+
+
+class TestCompactProfile:
+    """Test that compact profiles read like the original dicts."""
+
+    def test_round_trip(self, raw_profiles):
+        """Test that as_dict() reproduces every packaged profile exactly."""
+        table = VocabularyTable()
+        for raw in raw_profiles.values():
+            profile = CompactProfile.from_mapping(raw, table)
+            assert profile.as_dict() == raw
+            assert list(profile.as_dict()) == list(raw)
+            assert profile == raw
+
+    def test_mapping_access(self, raw_profiles):
+        """Test field access returns tuples and read-only sections."""
+        profile = CompactProfile.from_mapping(raw_profiles['confocal'], VocabularyTable())
+        assert profile['display_name'] == 'Confocal'
+        assert profile['structure'] == tuple(raw_profiles['confocal']['structure'])
+        assert profile['magnification_feel']['low'] == raw_profiles['confocal']['magnification_feel']['low']
+        assert profile['color_palette']['artistic'][0] == raw_profiles['confocal']['color_palette']['artistic'][0]
+        assert set(profile.keys()) == set(raw_profiles['confocal'])
+        assert profile.get('missing') is None
+
+    def test_immutable(self, raw_profiles):
+        """Test that profiles and their sections cannot be modified."""
+        profile = CompactProfile.from_mapping(raw_profiles['confocal'], VocabularyTable())
+        with pytest.raises(AttributeError):
+            profile.extra = 1
+        with pytest.raises(TypeError):
+            profile['color_palette']['scientific'] = ('x',)
+        assert not hasattr(profile, '__dict__')
+
+    def test_shared_vocabulary(self, raw_profiles):
+        """Test that repeated phrases and layouts are stored once."""
+        table = VocabularyTable()
+        profiles = [CompactProfile.from_mapping(raw, table) for raw in raw_profiles.values()]
+        total = sum(len(plain_phrases(p)) for p in raw_profiles.values())
+        assert len(table) < total
+        assert profiles[0]._layout is profiles[1]._layout
+
+    def test_pickle(self, raw_profiles):
+        """Test that profiles survive pickling (e.g. to worker processes)."""
+        profile = CompactProfile.from_mapping(raw_profiles['darkfield'], VocabularyTable())
+        assert pickle.loads(pickle.dumps(profile)) == profile
+
+    def test_empty_section_and_unsupported_values(self):
+        """Test edge-case field shapes."""
+        profile = CompactProfile.from_mapping({'name': 'x', 'empty': {}, 'none': []}, VocabularyTable())
+        assert plain(profile) == {'name': 'x', 'empty': {}, 'none': []}
+        with pytest.raises(TypeError, match="'rank'"):
+            CompactProfile.from_mapping({'rank': 3}, VocabularyTable())
+
+
+def plain_phrases(raw):
+    phrases = []
+    for value in raw.values():
+        values = value.values() if isinstance(value, dict) else [value]
+        for v in values:
+            phrases.extend([v] if isinstance(v, str) else v)
+    return phrases
@@ -0,0 +1,187 @@
+"""
+tests/test_concurrency.py - Tests for the async tool variants, executor and single-flight
+"""
+
+import asyncio
+import inspect
+import json
+import threading
+
+import pytest
+
+from microscopy_aesthetics import server
+from microscopy_aesthetics.concurrency import BoundedExecutor, SingleFlight
+
+
+class TestSingleFlight:
+    """Test coalescing of concurrent identical calls."""
+
+    def test_concurrent_calls_share_one_computation(self):
+        """Test that callers arriving while a call is in flight await its result."""
+        flight = SingleFlight()
+        calls = []
+
+        async def compute(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        async def scenario():
+            return await asyncio.gather(*(flight.run("k", compute, 21) for _ in range(10)))
+
+        assert asyncio.run(scenario()) == [42] * 10
+        assert calls == [21]
+        assert flight.stats() == {"started": 1, "coalesced": 9, "in_flight": 0}
+
+    def test_sequential_calls_recompute(self):
+        """Test that a finished flight is not reused as a cache."""
+        flight = SingleFlight()
+
+        async def compute():
+            return object()
+
+        async def scenario():
+            return await flight.run("k", compute), await flight.run("k", compute)
+
+        first, second = asyncio.run(scenario())
+        assert first is not second
+
+    def test_errors_reach_every_caller(self):
+        """Test that a failure is raised to each coalesced caller."""
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def scenario():
+            return await asyncio.gather(*(flight.run("k", fail) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(r, ValueError) for r in asyncio.run(scenario()))
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        """Test that the first caller going away leaves the computation running."""
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def scenario():
+            first = asyncio.ensure_future(flight.run("k", compute))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(flight.run("k", compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(scenario()) == "done"
+
+
+class TestBoundedExecutor:
+    """Test the offload executor."""
+
+    def test_runs_off_the_event_loop(self):
+        """Test that work runs on a worker thread."""
+        executor = BoundedExecutor(2)
+
+        async def scenario():
+            return await executor.run(threading.current_thread)
+
+        try:
+            assert asyncio.run(scenario()) is not threading.main_thread()
+        finally:
+            executor.shutdown()
+
+    def test_pending_work_is_bounded(self):
+        """Test that callers past max_pending wait for a slot."""
+        executor = BoundedExecutor(1, max_pending=2)
+        release = threading.Event()
+        running = []
+
+        def work(i):
+            running.append(i)
+            release.wait(5)
+            return i
+
+        async def scenario():
+            tasks = [asyncio.ensure_future(executor.run(work, i)) for i in range(5)]
+            await asyncio.sleep(0.05)
+            submitted = executor.submitted
+            release.set()
+            return submitted, await asyncio.gather(*tasks)
+
+        try:
+            submitted, results = asyncio.run(scenario())
+        finally:
+            executor.shutdown()
+        assert submitted == 2
+        assert results == list(range(5))
+        assert executor.stats()["waited"] == 3
+
+
+class TestAsyncTools:
+    """Test the registered async variants."""
+
+    def test_registered_tools_are_coroutines(self):
+        """Test that MCP clients reach async functions with the original signatures."""
+        tools = {tool.name: tool for tool in asyncio.run(server.mcp.list_tools())}
+        for name in ("enhance_prompt_with_microscopy", "enhance_prompts_batch", "list_microscopy_types",
+                     "get_microscopy_profile", "suggest_microscopy_type"):
+            variant = getattr(server, f"{name}_async")
+            assert inspect.iscoroutinefunction(variant)
+            assert variant.__name__ == name
+            assert inspect.signature(variant) == inspect.signature(getattr(server, name))
+            assert tools[name].description == tools[name].description.strip()
+
+    def test_results_match_sync_tools(self):
+        """Test inline and offloaded paths return what the sync tools return."""
+        long_prompt = "a coral reef teeming with life " * 200
+
+        async def scenario():
+            return await asyncio.gather(
+                server.enhance_prompt_with_microscopy_async("a cell", "Confocal"),
+                server.enhance_prompt_with_microscopy_async(long_prompt, "electron", "high"),
+                server.enhance_prompt_with_microscopy_async(long_prompt, "x-ray"),
+                server.enhance_prompts_batch_async(prompts=["a cell"] * 100, microscopy_type="darkfield"),
+                server.get_microscopy_profile_async("phase contrast", ["display_name"]),
+                server.suggest_microscopy_type_async("glowing " * 1000),
+            )
+
+        before = server._EXECUTOR.submitted
+        results = asyncio.run(scenario())
+        assert results == [
+            server.enhance_prompt_with_microscopy("a cell", "Confocal"),
+            server.enhance_prompt_with_microscopy(long_prompt, "electron", "high"),
+            server.enhance_prompt_with_microscopy(long_prompt, "x-ray"),
+            server.enhance_prompts_batch(prompts=["a cell"] * 100, microscopy_type="darkfield"),
+            server.get_microscopy_profile("phase contrast", ["display_name"]),
+            server.suggest_microscopy_type("glowing " * 1000),
+        ]
+        # Long prompt, large batch and long description were offloaded
+        assert server._EXECUTOR.submitted - before >= 3
+
+    def test_cold_profile_fan_out_is_coalesced(self):
+        """Test that concurrent requests for an unloaded profile share one load."""
+        server.profiles_changed()
+        before = server._SINGLE_FLIGHT.stats()
+
+        async def scenario():
+            return await asyncio.gather(*(server.get_microscopy_profile_async("confocal") for _ in range(50)))
+
+        results = asyncio.run(scenario())
+        after = server._SINGLE_FLIGHT.stats()
+        assert len(set(results)) == 1
+        assert json.loads(results[0])["display_name"] == "Confocal"
+        assert after["started"] - before["started"] == 1
+        assert after["coalesced"] - before["coalesced"] == 49
+
+    @pytest.mark.parametrize("fields", [None, ["nope"]])
+    def test_unknown_inputs_stay_inline(self, fields):
+        """Test error paths are answered without offloading."""
+        before = server._EXECUTOR.submitted
+        result = asyncio.run(server.get_microscopy_profile_async("x-ray" if fields is None else "confocal",
+                                                                 fields))
+        assert result.startswith("Error:")
+        if fields is None:
+            assert server._EXECUTOR.submitted == before
@@ -0,0 +1,276 @@
+"""
+tests/test_dispatch.py - Tests for multi-process serving behind the dispatcher
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.load_generator import read_response, request_bytes
+from microscopy_aesthetics.cli import main
+from microscopy_aesthetics.dispatch import Dispatcher, worker_environment
+
+
+async def _call(socket_path, tool, arguments, request_id=1):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        writer.write(request_bytes(request_id, tool, arguments))
+        return json.loads(await read_response(reader))
+    finally:
+        writer.close()
+
+
+class _Running:
+    """Stand-in for a live worker process."""
+
+    def poll(self):
+        return None
+
+    def terminate(self):
+        pass
+
+    def wait(self, timeout=None):
+        return 0
+
+
+class _StubWorker:
+    """A worker socket that records requests and answers them, or drops them unanswered."""
+
+    def __init__(self, socket_path, answer=True):
+        self.socket_path = socket_path
+        self.answer = answer
+        self.requests = []
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.lower().split(b"content-length:", 1)[1].split(b"\r\n", 1)[0])
+                self.requests.append((head, await reader.readexactly(length)))
+                if not self.answer:
+                    break
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_unix_server(self._serve, str(self.socket_path))
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+
+
+async def _read_status(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    return head.split(b"\r\n", 1)[0]
+
+
+class TestDispatcher:
+    """Test request relaying, balancing and worker restarts."""
+
+    def test_requests_spread_across_workers(self, tmp_path):
+        """Test that concurrent connections reach every worker and get correct answers."""
+        socket_path = str(tmp_path / "dispatch.sock")
+
+        async def scenario():
+            dispatcher = Dispatcher(2, socket_path=socket_path)
+            await dispatcher.start()
+            try:
+                results = await asyncio.gather(*(
+                    _call(socket_path, "get_microscopy_profile",
+                          {"microscopy_type": "confocal", "fields": ["display_name"], "compact": True}, i)
+                    for i in range(8)
+                ))
+                # Relays finish shortly after clients disconnect
+                for _ in range(100):
+                    if not any(worker.active for worker in dispatcher.workers):
+                        break
+                    await asyncio.sleep(0.02)
+                return results, dispatcher.stats()
+            finally:
+                dispatcher.stop()
+
+        results, stats = asyncio.run(scenario())
+        for result in results:
+            assert json.loads(result["result"]["content"][0]["text"]) == {"display_name": "Confocal"}
+        assert all(worker["requests"] > 0 for worker in stats)
+        assert all(worker["active"] == 0 for worker in stats)
+
+    def test_keep_alive_requests_are_balanced(self, tmp_path):
+        """Test that requests on one keep-alive connection are spread over the workers."""
+        socket_path = str(tmp_path / "dispatch.sock")
+
+        async def scenario():
+            dispatcher = Dispatcher(2, socket_path=socket_path)
+            await dispatcher.start()
+            try:
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+                try:
+                    results = []
+                    for i in range(6):
+                        writer.write(request_bytes(i, "list_microscopy_types", {"compact": True}))
+                        results.append(json.loads(await read_response(reader)))
+                finally:
+                    writer.close()
+                return results, dispatcher.stats()
+            finally:
+                dispatcher.stop()
+
+        results, stats = asyncio.run(scenario())
+        assert [result["id"] for result in results] == list(range(6))
+        assert [worker["requests"] for worker in stats] == [3, 3]
+        # Worker connections are reused rather than opened per request
+        assert sum(worker["idle_connections"] for worker in stats) == 2
+
+    def test_least_loaded_worker_is_chosen(self):
+        """Test that busy and dead workers are skipped."""
+        dispatcher = Dispatcher(3)
+        try:
+            busy, idle, dead = dispatcher.workers
+            busy.process = idle.process = _Running()
+            busy.active, idle.active, dead.active = 5, 1, 0
+            assert all(dispatcher._choose() is idle for _ in range(3))
+        finally:
+            dispatcher.stop()
+
+    def test_exited_worker_is_restarted(self, tmp_path):
+        """Test that the supervisor restarts a dead worker."""
+        socket_path = str(tmp_path / "dispatch.sock")
+
+        async def scenario():
+            dispatcher = Dispatcher(1, socket_path=socket_path)
+            await dispatcher.start()
+            supervisor = asyncio.ensure_future(dispatcher._supervise())
+            try:
+                worker = dispatcher.workers[0]
+                worker.process.kill()
+                worker.process.wait()
+                for _ in range(100):
+                    await asyncio.sleep(0.1)
+                    if worker.restarts:
+                        break
+                await worker.wait_ready()
+                result = await _call(socket_path, "list_microscopy_types", {"compact": True})
+                return worker.restarts, result
+            finally:
+                supervisor.cancel()
+                dispatcher.stop()
+
+        restarts, result = asyncio.run(scenario())
+        assert restarts == 1
+        assert "confocal" in json.loads(result["result"]["content"][0]["text"])
+
+    def test_failed_request_gets_bad_gateway_and_is_not_resent(self, tmp_path):
+        """Test that a request dropped on a pooled connection is answered 502, not retried."""
+        socket_path = str(tmp_path / "dispatch.sock")
+
+        async def scenario():
+            dispatcher = Dispatcher(1, socket_path=socket_path)
+            worker = dispatcher.workers[0]
+            worker.process = _Running()
+            server = await asyncio.start_unix_server(dispatcher._handle, socket_path)
+            try:
+                async with _StubWorker(worker.socket_path, answer=False) as stub:
+                    # A pooled connection that looks healthy until the request is sent
+                    worker.idle.append(await asyncio.open_unix_connection(str(worker.socket_path)))
+                    reader, writer = await asyncio.open_unix_connection(socket_path)
+                    try:
+                        writer.write(request_bytes(1, "list_microscopy_types", {}))
+                        status = await _read_status(reader)
+                    finally:
+                        writer.close()
+                    return status, len(stub.requests), dispatcher.stats()
+            finally:
+                server.close()
+                dispatcher.stop()
+
+        status, received, stats = asyncio.run(scenario())
+        assert status == b"HTTP/1.1 502 Bad Gateway"
+        assert received == 1
+        assert stats[0]["failures"] == 1
+
+    def test_dead_worker_gets_bad_gateway(self, tmp_path):
+        """Test that a worker that cannot be reached is answered 502 and the connection stays usable."""
+        socket_path = str(tmp_path / "dispatch.sock")
+
+        async def scenario():
+            dispatcher = Dispatcher(1, socket_path=socket_path)
+            server = await asyncio.start_unix_server(dispatcher._handle, socket_path)
+            try:
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+                try:
+                    statuses = []
+                    for i in range(2):
+                        writer.write(request_bytes(i, "list_microscopy_types", {}))
+                        statuses.append(await _read_status(reader))
+                        await reader.readuntil(b"\n")
+                    return statuses
+                finally:
+                    writer.close()
+            finally:
+                server.close()
+                dispatcher.stop()
+
+        assert asyncio.run(scenario()) == [b"HTTP/1.1 502 Bad Gateway"] * 2
+
+    def test_expect_continue_is_answered(self, tmp_path):
+        """Test that the dispatcher answers 100 Continue and does not forward the expectation."""
+        socket_path = str(tmp_path / "dispatch.sock")
+
+        async def scenario():
+            dispatcher = Dispatcher(1, socket_path=socket_path)
+            worker = dispatcher.workers[0]
+            worker.process = _Running()
+            server = await asyncio.start_unix_server(dispatcher._handle, socket_path)
+            try:
+                async with _StubWorker(worker.socket_path) as stub:
+                    reader, writer = await asyncio.open_unix_connection(socket_path)
+                    try:
+                        writer.write(b"POST /mcp HTTP/1.1\r\nHost: localhost\r\nContent-Length: 4\r\n"
+                                     b"Expect: 100-continue\r\n\r\n")
+                        interim = await asyncio.wait_for(_read_status(reader), 5)
+                        writer.write(b"body")
+                        final = await _read_status(reader)
+                    finally:
+                        writer.close()
+                    return interim, final, stub.requests
+            finally:
+                server.close()
+                dispatcher.stop()
+
+        interim, final, requests = asyncio.run(scenario())
+        assert (interim, final) == (b"HTTP/1.1 100 Continue", b"HTTP/1.1 200 OK")
+        [(head, body)] = requests
+        assert b"expect" not in head.lower() and body == b"body"
+
+
+def test_worker_environment():
+    """Test that exporters and report directories are private to each worker."""
+    env = worker_environment(1, {"MICROSCOPY_METRICS_EXPORT": "/var/lib/node/microscopy.prom",
+                                 "MICROSCOPY_PROFILING_DIR": "/tmp/profiles",
+                                 "MICROSCOPY_PROFILE_WATCH": "5"})
+    assert env == {"MICROSCOPY_METRICS_EXPORT": "/var/lib/node/microscopy.worker-1.prom",
+                   "MICROSCOPY_PROFILING_DIR": "/tmp/profiles/worker-1",
+                   "MICROSCOPY_PROFILE_WATCH": "5"}
+    assert worker_environment(0, {"MICROSCOPY_METRICS_EXPORT": "unix:/run/m.sock"}) == \
+        {"MICROSCOPY_METRICS_EXPORT": "unix:/run/m.worker-0.sock"}
+    assert worker_environment(0, {}) == {}
+
+
+class TestServeCommand:
+    """Test serve option validation."""
+
+    @pytest.mark.parametrize("argv", [
+        ["serve", "--workers", "2"],
+        ["serve", "--transport", "sse", "--workers", "2"],
+        ["serve", "--transport", "sse", "--stateless"],
+    ])
+    def test_invalid_combinations(self, argv, capsys):
+        """Test that unsupported transport combinations are rejected."""
+        assert main(argv) == 2
+        assert capsys.readouterr().err.startswith("Error:")
@@ -0,0 +1,92 @@
+"""
+tests/test_enhancement.py - Precompiled suffix table must match the original pipeline
+"""
+
+import itertools
+
+import pytest
+from microscopy_aesthetics.enhancement import (
+    MAX_WORDS,
+    SuffixTable,
+    compose,
+    count_joined_words,
+)
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES, enhance_prompt_with_microscopy
+
+from tests.reference import legacy_enhance_prompt
+
+BASE_PROMPTS = [
+    'a butterfly wing',
+    '',
+    '   ',
+    '  leading and trailing  ',
+    'ends with newline\n',
+    'unicode space prompt',
+    'word ' * 60,
+    'long ' * 200 + 'tail',
+    'single',
+]
+MAGNIFICATIONS = ['low', 'medium', 'high', 'HIGH', 'unknown']
+PALETTES = ['scientific', 'artistic', 'monochrome', 'Artistic', 'sepia']
+STRENGTHS = ['subtle', 'balanced', 'strong', 'STRONG', 'extreme']
+
+
+class TestSuffixTable:
+    """Test table construction and lookup fallbacks."""
+
+    def test_table_covers_every_combination(self):
+        """Test that 7 types x 3 magnifications x 3 palettes x 3 strengths are compiled."""
+        table = SuffixTable(MICROSCOPY_PROFILES)
+        table.compile()
+        assert len(table) == 7 * 3 * 3 * 3
+
+    def test_types_compile_on_first_lookup(self):
+        """Test that only looked-up types are compiled."""
+        table = SuffixTable(MICROSCOPY_PROFILES)
+        table.lookup('darkfield', 'low')
+        assert len(table) == 3 * 3 * 3
+
+    def test_unknown_type_returns_none(self):
+        """Test that lookups for unknown types miss."""
+        table = SuffixTable(MICROSCOPY_PROFILES)
+        assert table.lookup('invalid_type') is None
+        assert 'invalid_type' not in table
+        assert 'confocal' in table
+
+    def test_word_counts_match_suffixes(self):
+        """Test that cached word counts match the suffix text."""
+        table = SuffixTable(MICROSCOPY_PROFILES)
+        suffix, words = table.lookup('electron', 'high', 'artistic', 'strong')
+        assert words == len(suffix.split())
+
+    @pytest.mark.parametrize("base_prompt", BASE_PROMPTS)
+    def test_joined_word_count(self, base_prompt):
+        """Test that word counts are computed without joining."""
+        suffix, words = SuffixTable(MICROSCOPY_PROFILES).lookup('confocal')
+        assert count_joined_words(base_prompt, words) == len((base_prompt + suffix).split())
+
+    def test_trim_to_max_words(self):
+        """Test that long prompts are trimmed to MAX_WORDS plus a period."""
+        suffix, words = SuffixTable(MICROSCOPY_PROFILES).lookup('confocal')
+        result = compose('word ' * 100, suffix, words)
+        assert len(result.split()) == MAX_WORDS
+        assert result.endswith('.')
+
+
+class TestByteForByteEquivalence:
+    """Test that precompiled output is identical to the original pipeline."""
+
+    @pytest.mark.parametrize("mtype", list(MICROSCOPY_PROFILES) + ['Phase Contrast', 'DARKFIELD'])
+    def test_all_option_combinations(self, mtype):
+        """Test every option combination, including fallbacks, for each type."""
+        for base_prompt, mag, palette, strength in itertools.product(
+            BASE_PROMPTS, MAGNIFICATIONS, PALETTES, STRENGTHS
+        ):
+            expected = legacy_enhance_prompt(base_prompt, mtype, mag, palette, strength)
+            actual = enhance_prompt_with_microscopy(base_prompt, mtype, mag, palette, strength)
+            assert actual == expected, (base_prompt, mtype, mag, palette, strength)
+
+    def test_error_message_unchanged(self):
+        """Test that unknown types produce the original error text."""
+        assert (enhance_prompt_with_microscopy('x', 'Not A Type')
+                == legacy_enhance_prompt('x', 'Not A Type'))
@@ -0,0 +1,104 @@
+"""
+tests/test_load_test.py - Tests for the end-to-end stdio/HTTP load-test harness
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.load_generator import CALLS
+from benchmarks.load_test import (
+    HttpTarget,
+    ResourceSampler,
+    Sample,
+    StdioTarget,
+    load_workload,
+    main,
+    process_tree,
+    run_load,
+    summarize,
+    tree_usage,
+)
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs Linux /proc")
+
+TOOLS = {tool for tool, _ in CALLS}
+
+
+class TestResources:
+    """Test process-tree CPU and RSS readings."""
+
+    def test_tree_includes_children(self):
+        """Test that a child process is counted with its parent."""
+        child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        try:
+            assert child.pid in process_tree(os.getpid())
+            cpu_s, rss, count = tree_usage(os.getpid())
+            assert cpu_s > 0 and rss > 2**20 and count >= 2
+        finally:
+            child.kill()
+            child.wait()
+
+    def test_sampler(self):
+        """Test that samples accumulate until stop()."""
+        sampler = ResourceSampler(os.getpid(), interval=0.02)
+        sampler.start()
+        while len(sampler.samples) < 2:
+            sum(range(10_000))
+        samples = sampler.stop()
+        assert samples and all(s.rss_mb > 0 and s.processes >= 1 for s in samples)
+        assert sampler.cpu_s > 0
+
+
+def test_summarize():
+    """Test overall, per-tool and resource statistics."""
+    records = [("a", 1000, True), ("a", 3000, True), ("b", 2000, False)]
+    samples = [Sample(0.5, 50.0, 80.0, 1), Sample(1.0, 70.0, 90.0, 2)]
+    stats = summarize(records, 2.0, samples, cpu_s=0.6)
+    assert stats["requests"] == 3 and stats["errors"] == 1
+    assert stats["requests_per_sec"] == 1.5
+    assert stats["tools"]["a"] == {"calls": 2, "p50_us": 1.0, "p95_us": 3.0, "p99_us": 3.0}
+    assert stats["cpu_percent_mean"] == 60.0 and stats["cpu_percent_max"] == 70.0
+    assert stats["rss_mb_peak"] == 90.0 and stats["cpu_ms_per_request"] == 200.0
+    with pytest.raises(RuntimeError):
+        summarize([], 1.0, [])
+
+
+class TestEndToEnd:
+    """Test short runs against real server processes."""
+
+    def test_stdio(self):
+        """Test concurrent clients sharing one stdio session."""
+        stats = asyncio.run(run_load(StdioTarget(), clients=3, duration=0.5, warmup=0.2, interval=0.1))
+        assert stats["errors"] == 0
+        assert set(stats["tools"]) == TOOLS
+        assert stats["timeline"] and stats["rss_mb_peak"] > 0
+
+    def test_http(self, tmp_path):
+        """Test clients with their own connections to an HTTP server."""
+        target = HttpTarget(str(tmp_path / "load.sock"))
+        stats = asyncio.run(run_load(target, clients=2, duration=0.5, warmup=0.2, interval=0.1))
+        assert stats["errors"] == 0
+        assert set(stats["tools"]) == TOOLS
+
+    def test_cli_with_workload(self, tmp_path, capsys):
+        """Test a replayed JSONL workload and the JSON output."""
+        workload = tmp_path / "calls.jsonl"
+        workload.write_text('{"tool": "enhance_prompt_with_microscopy", '
+                            '"arguments": {"base_prompt": "a cell", "microscopy_type": "SEM"}}\n\n'
+                            '{"tool": "list_microscopy_types"}\n')
+        assert load_workload(workload) == [
+            ("enhance_prompt_with_microscopy", {"base_prompt": "a cell", "microscopy_type": "SEM"}),
+            ("list_microscopy_types", {}),
+        ]
+        output = tmp_path / "load.json"
+        assert main(["--transport", "stdio", "--clients", "2", "--duration", "0.3", "--warmup", "0.2",
+                     "--workload", str(workload), "--output", str(output)]) == 0
+        runs = json.loads(output.read_text())["runs"]
+        assert [(run["transport"], run["clients"]) for run in runs] == [("stdio", 2)]
+        assert set(runs[0]["stats"]["tools"]) == {"enhance_prompt_with_microscopy", "list_microscopy_types"}
+        assert "stdio" in capsys.readouterr().out
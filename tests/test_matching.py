@@ -0,0 +1,66 @@
+"""
+tests/test_matching.py - Unit tests for the single-pass keyword matcher
+"""
+
+import json
+import random
+
+from microscopy_aesthetics.matching import KeywordMatcher, vocabulary_terms
+from microscopy_aesthetics.server import (
+    MICROSCOPY_PROFILES,
+    SUGGESTION_KEYWORDS,
+    suggest_microscopy_type,
+)
+
+from tests.reference import legacy_keyword_scores
+
+
+def _terms_by_type():
+    return {
+        key: list(dict.fromkeys(t.lower() for t in SUGGESTION_KEYWORDS[key] + vocabulary_terms(profile)))
+        for key, profile in MICROSCOPY_PROFILES.items()
+    }
+
+
+class TestKeywordMatcher:
+    """Test that the compiled matcher agrees with per-keyword substring scans."""
+
+    def test_overlapping_and_nested_terms(self):
+        """Test prefixes, infixes and repeated terms."""
+        matcher = KeywordMatcher({'a': ['glow', 'glowing', 'light'], 'b': ['highlight', 'low']})
+        assert matcher.scores('Glowing highlights, glowing again') == {'a': 3, 'b': 2}
+        assert matcher.matched_terms('glowy') == {'glow', 'low'}
+
+    def test_matches_legacy_scores(self):
+        """Test random descriptions against the original substring scan."""
+        terms = _terms_by_type()
+        matcher = KeywordMatcher(terms)
+        vocabulary = [t for ts in terms.values() for t in ts] + ['noise', 'the', 'and']
+        rng = random.Random(0)
+        for _ in range(200):
+            description = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(0, 12)))
+            assert matcher.scores(description) == legacy_keyword_scores(description, terms)
+
+    def test_empty_matcher(self):
+        """Test that a matcher without terms scores zero."""
+        assert KeywordMatcher({'a': []}).scores('anything') == {'a': 0}
+
+
+class TestSuggestions:
+    """Test suggest_microscopy_type ranking."""
+
+    def test_vocabulary_phrases_are_indexed(self):
+        """Test that full profile vocabulary contributes to matches."""
+        data = json.loads(suggest_microscopy_type('golden halos around weathered grains'))
+        assert data[0]['type'] in MICROSCOPY_PROFILES
+        assert data[0]['reason'] != 'No strong matches; brightfield recommended as versatile default'
+
+    def test_default_when_nothing_matches(self):
+        """Test the brightfield fallback."""
+        data = json.loads(suggest_microscopy_type('zzz qqq'))
+        assert data == [{
+            'type': 'brightfield',
+            'display_name': 'Brightfield',
+            'confidence': 'low',
+            'reason': 'No strong matches; brightfield recommended as versatile default'
+        }]
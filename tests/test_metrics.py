@@ -0,0 +1,286 @@
+"""
+tests/test_metrics.py - Unit tests for per-tool metrics
+"""
+
+import asyncio
+import gc
+import json
+import socket
+import weakref
+
+import pytest
+
+from microscopy_aesthetics import metrics, server
+from microscopy_aesthetics.metrics import (
+    FOLD_BATCH,
+    MAX_ARGUMENT_VALUES,
+    METRICS,
+    OTHER_VALUE,
+    ErrorResult,
+    MetricsRegistry,
+    start_exporter,
+    start_exporter_from_env,
+)
+
+
+def _registry():
+    registry = MetricsRegistry(enabled=True)
+
+    @registry.instrument("microscopy_type", "magnification")
+    def tool(base_prompt, microscopy_type, magnification="medium"):
+        if microscopy_type == "boom":
+            raise RuntimeError("boom")
+        if microscopy_type == "x-ray":
+            return ErrorResult("Error: Unknown microscopy type")
+        return base_prompt
+
+    return registry, tool
+
+
+class TestInstrumentation:
+    """Test what the instrument decorator records."""
+
+    def test_calls_errors_and_arguments(self):
+        """Test counts, error results and positional/keyword/default argument values."""
+        registry, tool = _registry()
+        assert tool("a", "confocal") == "a"
+        tool("a", microscopy_type="Confocal", magnification="high")
+        tool(base_prompt="a", microscopy_type="x-ray")
+        stats = registry.snapshot()["tools"]["tool"]
+        assert stats["calls"] == 3
+        assert stats["errors"] == 1
+        assert stats["arguments"] == {
+            "microscopy_type": {"confocal": 2, "x-ray": 1},
+            "magnification": {"medium": 2, "high": 1},
+        }
+        assert sum(stats["latency_us"]["buckets"].values()) == 3
+
+    def test_results_are_not_matched_on_text(self):
+        """Test that only ErrorResult counts as an error, whatever a result starts with."""
+        registry, tool = _registry()
+        tool("Error bars on a cell", "confocal")
+        assert registry.snapshot()["tools"]["tool"]["errors"] == 0
+
+    def test_argument_labels(self):
+        """Test that label functions turn raw values into the counted value."""
+        registry = MetricsRegistry(enabled=True)
+
+        @registry.instrument("microscopy_type", labels={"microscopy_type": lambda value: "+".join(value)})
+        def tool(microscopy_type):
+            return "ok"
+
+        tool(["confocal", "darkfield"])
+        assert registry.snapshot()["tools"]["tool"]["arguments"] == {"microscopy_type": {"confocal+darkfield": 1}}
+
+    def test_exceptions_are_counted_and_raised(self):
+        """Test that a raising tool counts as an error and still raises."""
+        registry, tool = _registry()
+        with pytest.raises(RuntimeError):
+            tool("a", "boom")
+        assert registry.snapshot()["tools"]["tool"]["errors"] == 1
+
+    def test_batches_fold_without_snapshot(self):
+        """Test that buffered samples are counted once a batch fills."""
+        registry, tool = _registry()
+        for _ in range(FOLD_BATCH):
+            tool("a", "confocal")
+        assert registry.tools["tool"].calls == FOLD_BATCH
+        assert not registry.tools["tool"].pending
+
+    def test_pending_samples_keep_only_tracked_values(self):
+        """Test that buffered samples do not hold the call's other arguments."""
+        registry, tool = _registry()
+
+        class Payload(str):
+            pass
+
+        payload = Payload("a" * 1000)
+        ref = weakref.ref(payload)
+        tool(payload, "confocal")
+        del payload
+        gc.collect()
+        assert ref() is None
+        assert registry.tools["tool"].pending[0][2] == ("confocal", "medium")
+
+    def test_argument_cardinality_cap(self):
+        """Test that values past the cap are counted under one label."""
+        registry, tool = _registry()
+        for i in range(MAX_ARGUMENT_VALUES + 10):
+            tool("a", f"type{i}")
+        counts = registry.snapshot()["tools"]["tool"]["arguments"]["microscopy_type"]
+        assert len(counts) == MAX_ARGUMENT_VALUES + 1
+        assert counts[OTHER_VALUE] == 10
+
+    def test_async_tools(self):
+        """Test that coroutine tools stay coroutines and are measured when awaited."""
+        registry = MetricsRegistry(enabled=True)
+
+        @registry.instrument("mode")
+        async def tool(mode="fast"):
+            return ErrorResult("Error: nope") if mode == "bad" else mode
+
+        assert asyncio.run(tool()) == "fast"
+        asyncio.run(tool(mode="bad"))
+        stats = registry.snapshot()["tools"]["tool"]
+        assert (stats["calls"], stats["errors"], stats["arguments"]) == (2, 1, {"mode": {"fast": 1, "bad": 1}})
+
+    def test_disabled_registry_leaves_functions_alone(self):
+        """Test that a disabled registry returns the original function."""
+        registry = MetricsRegistry(enabled=False)
+
+        def tool(x):
+            return x
+
+        assert registry.instrument("x")(tool) is tool
+        assert registry.snapshot()["tools"] == {}
+
+    def test_reset(self):
+        """Test that reset clears counts but keeps the tool registered."""
+        registry, tool = _registry()
+        tool("a", "confocal")
+        registry.reset()
+        stats = registry.snapshot()["tools"]["tool"]
+        assert stats["calls"] == 0
+        assert stats["arguments"]["microscopy_type"] == {}
+
+
+class TestPrometheus:
+    """Test the text exposition output and exporters."""
+
+    def test_histogram_is_cumulative(self):
+        """Test bucket counts are cumulative and end at the call count."""
+        registry, tool = _registry()
+        tool("a", "confocal")
+        tool("a", "x-ray")
+        text = registry.prometheus_text()
+        assert 'microscopy_tool_calls_total{tool="tool"} 2' in text
+        assert 'microscopy_tool_errors_total{tool="tool"} 1' in text
+        assert 'microscopy_tool_latency_seconds_bucket{tool="tool",le="+Inf"} 2' in text
+        assert 'microscopy_tool_latency_seconds_count{tool="tool"} 2' in text
+        buckets = [int(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+                   if line.startswith("microscopy_tool_latency_seconds_bucket")]
+        assert buckets == sorted(buckets)
+
+    def test_label_values_are_escaped(self):
+        """Test quotes and backslashes in argument values."""
+        registry, tool = _registry()
+        tool("a", 'say "hi"\\')
+        assert 'value="say \\"hi\\"\\\\"' in registry.prometheus_text()
+
+    def test_write_file(self, tmp_path):
+        """Test the textfile dump."""
+        registry, tool = _registry()
+        tool("a", "confocal")
+        path = tmp_path / "microscopy.prom"
+        registry.write_prometheus(path)
+        assert path.read_text() == registry.prometheus_text()
+
+    def test_unix_socket_exporter(self, tmp_path):
+        """Test that each socket connection receives the current metrics."""
+        registry, tool = _registry()
+        tool("a", "confocal")
+        path = tmp_path / "metrics.sock"
+        start_exporter(registry, f"unix:{path}")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(path))
+            received = b""
+            while chunk := client.recv(65536):
+                received += chunk
+        assert received.decode("utf-8") == registry.prometheus_text()
+
+    def test_unix_socket_exporter_survives_disconnects(self, tmp_path, monkeypatch):
+        """Test that clients leaving mid-response do not stop the exporter."""
+        registry, tool = _registry()
+        tool("a", "confocal")
+        text = registry.prometheus_text
+        monkeypatch.setattr(registry, "prometheus_text", lambda: "#" * 2**24)
+        path = tmp_path / "metrics.sock"
+        start_exporter(registry, f"unix:{path}")
+        for _ in range(2):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(10)
+                client.connect(str(path))
+                client.recv(1)
+        monkeypatch.setattr(registry, "prometheus_text", text)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(10)
+            client.connect(str(path))
+            received = b""
+            while chunk := client.recv(65536):
+                received += chunk
+        assert received.decode("utf-8") == text()
+
+    def test_unix_socket_exporter_stops(self, tmp_path):
+        """Test that the exporter thread exits once its listening socket is shut down."""
+        registry, _ = _registry()
+        thread = start_exporter(registry, f"unix:{tmp_path / 'metrics.sock'}")
+        registry.stop_exporting()
+        thread.join(5)
+        assert not thread.is_alive()
+
+    def test_file_exporter_stops(self, tmp_path):
+        """Test that the file exporter stops between writes."""
+        registry, _ = _registry()
+        thread = start_exporter(registry, str(tmp_path / "microscopy.prom"), interval=60)
+        registry.stop_exporting()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert (tmp_path / "microscopy.prom").exists()
+
+    def test_bad_interval_uses_default(self, tmp_path, monkeypatch):
+        """Test that an unusable export interval falls back instead of raising."""
+        registry, _ = _registry()
+        monkeypatch.setattr(metrics, "start_exporter", lambda registry, target, interval: interval)
+        monkeypatch.setenv(metrics.EXPORT_ENV, str(tmp_path / "microscopy.prom"))
+        monkeypatch.setenv(metrics.INTERVAL_ENV, "often")
+        assert start_exporter_from_env(registry) == metrics.DEFAULT_EXPORT_INTERVAL
+
+
+class TestServerMetrics:
+    """Test the instrumented server tools and get_server_metrics."""
+
+    def test_every_tool_is_instrumented(self):
+        """Test that every registered tool except the metrics and profiling tools is instrumented."""
+        tools = {tool.name for tool in asyncio.run(server.mcp.list_tools())}
+        assert set(METRICS.tools) == tools - {"get_server_metrics", "profiling_report"}
+
+    def test_unknown_type_errors_are_counted(self):
+        """Test that the unknown-type error path shows up in the metrics."""
+        before = json.loads(server.get_server_metrics())["tools"]["enhance_prompt_with_microscopy"]
+        asyncio.run(server.enhance_prompt_with_microscopy_async("a cell", "x-ray"))
+        after = json.loads(server.get_server_metrics())["tools"]["enhance_prompt_with_microscopy"]
+        assert after["calls"] == before["calls"] + 1
+        assert after["errors"] == before["errors"] + 1
+        assert after["arguments"]["microscopy_type"]["x-ray"] == \
+            before["arguments"]["microscopy_type"].get("x-ray", 0) + 1
+
+    def test_successful_error_like_prompts_and_blends(self):
+        """Test that a prompt starting with "Error" is a success and blends are labeled by blend string."""
+        before = json.loads(server.get_server_metrics())["tools"]["enhance_prompt_with_microscopy"]
+        result = asyncio.run(server.enhance_prompt_with_microscopy_async(
+            "Error bars on a cell", {"confocal": 0.7, "darkfield": 0.3}))
+        assert result.startswith("Error bars on a cell, rendered with")
+        after = json.loads(server.get_server_metrics())["tools"]["enhance_prompt_with_microscopy"]
+        assert after["errors"] == before["errors"]
+        assert after["arguments"]["microscopy_type"]["confocal:0.7+darkfield:0.3"] == \
+            before["arguments"]["microscopy_type"].get("confocal:0.7+darkfield:0.3", 0) + 1
+
+    def test_client_calls_keep_tool_schemas(self):
+        """Test that wrapping keeps argument schemas and counts client calls."""
+        from fastmcp import Client
+
+        async def call():
+            async with Client(server.mcp) as client:
+                tools = {tool.name: tool for tool in await client.list_tools()}
+                await client.call_tool("list_microscopy_types", {"compact": True})
+                result = await client.call_tool("get_server_metrics", {"format": "prometheus"})
+                return tools, result.content[0].text
+
+        tools, text = asyncio.run(call())
+        assert list(tools["get_microscopy_profile"].input_schema["properties"]) == \
+            ["microscopy_type", "fields", "compact"]
+        assert 'microscopy_tool_argument_total{tool="list_microscopy_types",argument="compact",value="true"}' in text
+
+    def test_unknown_format(self):
+        """Test that an unknown metrics format returns an error."""
+        assert server.get_server_metrics(format="xml").startswith("Error: Unknown metrics format 'xml'")
@@ -0,0 +1,265 @@
+"""
+tests/test_profiling.py - Unit tests for opt-in sampled tool profiling
+"""
+
+import json
+import os
+import pstats
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+from microscopy_aesthetics import profiling, server
+from microscopy_aesthetics.profiling import Profiler, start_report_writer_from_env
+
+
+def _allocate(n=2000):
+    return [str(i) * 4 for i in range(n)]
+
+
+class TestDisabled:
+    """Test that disabled profiling leaves tools untouched."""
+
+    def test_functions_are_not_wrapped(self):
+        """Test that the decorator returns the function itself."""
+        profiler = Profiler(sample_rate=0)
+        assert profiler.profile(_allocate) is _allocate
+        assert not profiler.enabled and profiler.tools == {}
+
+    @pytest.mark.skipif(server.PROFILER.enabled, reason="MICROSCOPY_PROFILING is set")
+    def test_server_tools_unwrapped_by_default(self):
+        """Test that server tools are plain functions and the report tool explains how to enable it."""
+        assert not hasattr(server.enhance_prompt_with_microscopy, "__wrapped__")
+        assert server.profiling_report().startswith("Error: Profiling is disabled.")
+
+    def test_environment(self, monkeypatch):
+        """Test configuration from the environment."""
+        monkeypatch.setenv(profiling.PROFILING_ENV, "0.05")
+        monkeypatch.setenv(profiling.MODE_ENV, "both")
+        profiler = Profiler()
+        assert profiler.enabled and profiler.sample_rate == 0.05 and profiler.mode == "both"
+        monkeypatch.setenv(profiling.MODE_ENV, "Memory")
+        assert Profiler().mode == "memory"
+        with pytest.raises(ValueError, match="Unknown profiling mode 'gpu'"):
+            Profiler(mode="gpu")
+
+    @pytest.mark.parametrize("rate, mode", [("abc", "cpu"), ("nan", "CPU"), ("-1", "gpu")])
+    def test_bad_environment_disables(self, rate, mode, monkeypatch):
+        """Test that unusable settings fall back instead of raising."""
+        monkeypatch.setenv(profiling.PROFILING_ENV, rate)
+        monkeypatch.setenv(profiling.MODE_ENV, mode)
+        profiler = Profiler()
+        assert not profiler.enabled and profiler.mode == "cpu"
+
+    def test_bad_environment_keeps_server_importable(self):
+        """Test importing the server with garbage profiling settings."""
+        env = dict(os.environ, MICROSCOPY_PROFILING="abc", MICROSCOPY_PROFILING_MODE="CPU",
+                   MICROSCOPY_PROFILING_INTERVAL="soon")
+        code = "from microscopy_aesthetics import server; print(server.PROFILER.enabled)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+        assert result.stdout.strip() == "False"
+
+
+class TestSampling:
+    """Test sampling, CPU and memory capture."""
+
+    def test_fraction_is_exact(self):
+        """Test that a rate profiles exactly that share of calls."""
+        profiler = Profiler(sample_rate=0.25)
+        wrapped = profiler.profile(_allocate)
+        assert wrapped.__wrapped__ is _allocate
+        for _ in range(100):
+            assert len(wrapped(10)) == 10
+        state = profiler.tools["_allocate"]
+        assert (state.calls, state.sampled, state.skipped) == (100, 25, 0)
+        profiler.sample_rate = 0
+        wrapped(10)
+        assert state.sampled == 25
+
+    def test_counts_are_exact_across_threads(self):
+        """Test that concurrent calls are all counted and sampled at the rate."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        profiler = Profiler(sample_rate=0.5, mode="memory")
+        wrapped = profiler.profile(len)
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(wrapped, [()] * 4000))
+        state = profiler.tools["len"]
+        assert state.calls == 4000
+        assert state.sampled + state.skipped == 2000
+
+    def test_cpu_report(self):
+        """Test hottest functions in both orders."""
+        profiler = Profiler(sample_rate=1)
+        wrapped = profiler.profile(_allocate)
+        for _ in range(3):
+            wrapped()
+        report = profiler.report(limit=3)
+        tool = report["tools"]["_allocate"]
+        assert tool["sampled"] == 3 and tool["allocations"] == []
+        assert tool["functions"][0]["function"].endswith("(_allocate)")
+        assert tool["functions"][0]["calls"] == 3
+        assert "test_profiling.py" in tool["functions"][0]["function"]
+        by_self = profiler.report(sort="self")["tools"]["_allocate"]["functions"]
+        assert [f["self_ms"] for f in by_self] == sorted((f["self_ms"] for f in by_self), reverse=True)
+
+    def test_memory_report(self):
+        """Test allocation sites of blocks alive at return, and the peak."""
+        profiler = Profiler(sample_rate=1, mode="memory")
+        kept = profiler.profile(_allocate)()
+        tool = profiler.report()["tools"]["_allocate"]
+        assert tool["functions"] == []
+        site = tool["allocations"][0]
+        assert site["site"].endswith(f"test_profiling.py:{_allocate.__code__.co_firstlineno + 1}")
+        assert site["blocks"] >= len(kept) and tool["peak_kb"] >= site["kb"]
+        assert not tracemalloc.is_tracing()
+
+    def test_existing_tracing_is_kept(self):
+        """Test that tracing started elsewhere keeps running and is not counted."""
+        profiler = Profiler(sample_rate=1, mode="both")
+        tracemalloc.start()
+        try:
+            earlier = _allocate()
+            kept = profiler.profile(_allocate)(500)
+            assert tracemalloc.is_tracing()
+        finally:
+            tracemalloc.stop()
+        tool = profiler.report()["tools"]["_allocate"]
+        assert len(earlier) > tool["allocations"][0]["blocks"] >= len(kept)
+        assert tool["functions"]
+
+    def test_overlapping_sample_is_skipped(self):
+        """Test that only one call is profiled at a time."""
+        profiler = Profiler(sample_rate=1)
+        inner = profiler.profile(_allocate)
+
+        @profiler.profile
+        def outer():
+            return inner(10)
+
+        assert outer() == _allocate(10)
+        assert (profiler.tools["outer"].sampled, profiler.tools["_allocate"].skipped) == (1, 1)
+        assert "_allocate" not in profiler.report()["tools"]
+
+    def test_errors_propagate(self):
+        """Test that a raising call is still sampled and the profiler released."""
+        profiler = Profiler(sample_rate=1, mode="both")
+
+        @profiler.profile
+        def fails():
+            raise KeyError("x")
+
+        with pytest.raises(KeyError):
+            fails()
+        assert profiler.tools["fails"].sampled == 1
+        assert profiler.profile(_allocate)(3) == _allocate(3)
+        assert profiler.tools["_allocate"].sampled == 1
+
+    def test_coroutines_are_rejected(self):
+        """Test that async functions cannot be profiled directly."""
+        async def tool():
+            pass
+
+        with pytest.raises(TypeError):
+            Profiler(sample_rate=1).profile(tool)
+
+    def test_reset(self):
+        """Test clearing samples."""
+        profiler = Profiler(sample_rate=1, mode="both")
+        profiler.profile(_allocate)()
+        profiler.reset()
+        assert profiler.report()["tools"] == {}
+        assert profiler.tools["_allocate"].snapshot()["calls"] == 0
+
+
+class TestReports:
+    """Test report files and the report writer."""
+
+    def test_write_reports(self, tmp_path):
+        """Test pstats, text and JSON files per process."""
+        profiler = Profiler(sample_rate=1, mode="both")
+        profiler.profile(_allocate)()
+        profiler.write_reports(tmp_path / "reports")
+        pid = os.getpid()
+        names = sorted(p.name for p in (tmp_path / "reports").iterdir())
+        assert names == [f"_allocate-{pid}.prof", f"_allocate-{pid}.txt", f"profiling-{pid}.json"]
+        stats = pstats.Stats(str(tmp_path / "reports" / f"_allocate-{pid}.prof"))
+        assert any(name == "_allocate" for _, _, name in stats.stats)
+        summary = (tmp_path / "reports" / f"_allocate-{pid}.txt").read_text()
+        assert "Ordered by: cumulative time" in summary and "Allocations still alive" in summary
+        report = json.loads((tmp_path / "reports" / f"profiling-{pid}.json").read_text())
+        assert report["tools"]["_allocate"]["sampled"] == 1
+
+    def test_writer_from_env(self, tmp_path, monkeypatch):
+        """Test that reports are written on schedule only when enabled and configured."""
+        monkeypatch.delenv(profiling.DIR_ENV, raising=False)
+        assert start_report_writer_from_env(Profiler(sample_rate=1)) is None
+        monkeypatch.setenv(profiling.DIR_ENV, str(tmp_path))
+        monkeypatch.setenv(profiling.INTERVAL_ENV, "0.05")
+        assert start_report_writer_from_env(Profiler(sample_rate=0)) is None
+        monkeypatch.setenv(profiling.INTERVAL_ENV, "soon")
+        idle = Profiler(sample_rate=1)
+        idle.stop_writing()
+        start_report_writer_from_env(idle).join()
+        monkeypatch.setenv(profiling.INTERVAL_ENV, "0.05")
+        profiler = Profiler(sample_rate=1)
+        profiler.profile(_allocate)()
+        writer = start_report_writer_from_env(profiler)
+        try:
+            deadline = time.monotonic() + 10
+            while not (tmp_path / f"profiling-{os.getpid()}.json").exists():
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+        finally:
+            profiler.stop_writing()
+            writer.join()
+
+
+class TestReportTool:
+    """Test the profiling_report tool."""
+
+    @pytest.fixture
+    def profiler(self, monkeypatch):
+        profiler = Profiler(sample_rate=1)
+        monkeypatch.setattr(server, "PROFILER", profiler)
+        profiler.profile(_allocate)()
+        return profiler
+
+    def test_report_and_controls(self, profiler):
+        """Test filtering, runtime sample rate changes and reset."""
+        report = json.loads(server.profiling_report(tool="_allocate", limit=2, sample_rate=0.1))
+        assert list(report["tools"]) == ["_allocate"] and len(report["tools"]["_allocate"]["functions"]) == 2
+        assert profiler.sample_rate == 0.1
+        json.loads(server.profiling_report(reset=True))
+        assert json.loads(server.profiling_report())["tools"] == {}
+
+    def test_errors(self, profiler):
+        """Test invalid arguments."""
+        assert server.profiling_report(sort="calls") == \
+            "Error: Unknown sort 'calls'. Available sorts: cumulative, self"
+        assert server.profiling_report(tool="nope") == "Error: Unknown tool 'nope'. Profiled tools: _allocate"
+        assert server.profiling_report(sample_rate=2) == "Error: sample_rate must be between 0 and 1"
+        assert profiler.sample_rate == 1
+
+    def test_server_tools_end_to_end(self):
+        """Test profiling every server tool in a process started with profiling enabled."""
+        code = (
+            "import json\n"
+            "from microscopy_aesthetics import server\n"
+            "server.enhance_prompt_with_microscopy('a cell', 'confocal')\n"
+            "server.get_microscopy_profile('SEM')\n"
+            "server.suggest_microscopy_type('glowing neon')\n"
+            "server.list_microscopy_types()\n"
+            "print(server.profiling_report(limit=3))\n"
+        )
+        env = dict(os.environ, MICROSCOPY_PROFILING="1", MICROSCOPY_PROFILING_MODE="both")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+        report = json.loads(result.stdout)
+        assert set(report["tools"]) == {"enhance_prompt_with_microscopy", "get_microscopy_profile",
+                                        "suggest_microscopy_type", "list_microscopy_types"}
+        enhance = report["tools"]["enhance_prompt_with_microscopy"]
+        assert enhance["functions"][0]["function"].endswith("(enhance_prompt_with_microscopy)")
+        assert enhance["peak_kb"] > 0
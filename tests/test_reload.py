@@ -0,0 +1,262 @@
+"""
+tests/test_reload.py - Unit tests for hot reloading profile snapshots
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+import yaml
+
+from microscopy_aesthetics import server, store as store_module
+from microscopy_aesthetics.compact import plain
+from microscopy_aesthetics.result_cache import ResultCache
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES
+from microscopy_aesthetics.snapshot import ProfileReloader
+from microscopy_aesthetics.store import PACKAGED_DIR, ProfileError, ProfileStore
+
+KEYWORDS = {'sepia': ['brownish']}
+
+
+def _write_profile(directory, key, **changes):
+    profile = dict(plain(MICROSCOPY_PROFILES['brightfield']), **changes)
+    path = directory / f'{key}.yaml'
+    existed = path.exists()
+    path.write_text(yaml.safe_dump(profile, sort_keys=False))
+    if existed:
+        # Make the edit visible even on filesystems with coarse timestamps
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    return path
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    directory = tmp_path / 'profiles'
+    directory.mkdir()
+    _write_profile(directory, 'sepia', display_name='Sepia')
+    return directory
+
+
+@pytest.fixture
+def reloader(profile_dir, tmp_path):
+    return ProfileReloader(ProfileStore([PACKAGED_DIR, profile_dir], tmp_path / 'cache'), KEYWORDS)
+
+
+def _warm(snapshot):
+    """Build every derived structure for every type."""
+    snapshot.suffix_table.compile()
+    for key in snapshot.profiles:
+        snapshot.responses.profile(key)
+    snapshot.responses.list_types()
+    snapshot.keyword_matcher()
+
+
+class TestIncrementalReload:
+    """Test that only changed profiles are reloaded and rederived."""
+
+    def test_nothing_changed(self, reloader):
+        """Test that an unchanged source set publishes nothing."""
+        before = reloader.current
+        assert reloader.reload() == frozenset()
+        assert reloader.current is before
+        assert reloader.stats()['checks'] == 1
+        assert reloader.stats()['reloads'] == 0
+
+    def test_edit_rederives_only_that_type(self, reloader, profile_dir):
+        """Test that unchanged types keep their compiled suffixes, payloads and terms."""
+        old = reloader.current
+        _warm(old)
+        _write_profile(profile_dir, 'sepia', display_name='Sepia Toned')
+        assert reloader.reload() == {'sepia'}
+
+        new = reloader.current
+        assert new.version == old.version + 1
+        assert new.profiles['confocal'] is old.profiles['confocal']
+        assert new.responses.profile('confocal') is old.responses.profile('confocal')
+        assert new.suffix_table.entry(('confocal', 'medium', 'scientific', 4)) is \
+            old.suffix_table.entry(('confocal', 'medium', 'scientific', 4))
+        assert new.suggestion_terms()['confocal'] is old.suggestion_terms()['confocal']
+        assert json.loads(new.responses.profile('sepia'))['display_name'] == 'Sepia Toned'
+        assert json.loads(new.responses.list_types())['sepia']['display_name'] == 'Sepia Toned'
+        assert 'sepia toned microscopy' in new.suffix_table.lookup('sepia')[0]
+        # The matcher spans every type, so it was rebuilt before publishing
+        assert new._keyword_matcher is not None
+        assert new.keyword_matcher() is not old.keyword_matcher()
+        stats = reloader.stats()
+        assert stats['version'] == new.version
+        assert stats['last_changed'] == ['sepia']
+        assert stats['last_reload_ms'] >= 0
+
+    def test_previous_snapshot_is_unaffected(self, reloader, profile_dir):
+        """Test that a call holding the old snapshot keeps a consistent view."""
+        old = reloader.current
+        old.responses.profile('sepia')
+        _write_profile(profile_dir, 'sepia', display_name='Sepia Toned')
+        reloader.reload()
+        assert old.profiles['sepia']['display_name'] == 'Sepia'
+        assert json.loads(old.responses.profile('sepia'))['display_name'] == 'Sepia'
+        assert 'sepia microscopy' in old.suffix_table.lookup('sepia')[0]
+
+    def test_added_and_removed_profiles(self, reloader, profile_dir):
+        """Test that new files are served and deleted files disappear."""
+        _write_profile(profile_dir, 'umber', display_name='Umber')
+        (profile_dir / 'sepia.yaml').unlink()
+        assert reloader.reload() == {'umber', 'sepia'}
+        profiles = reloader.current.profiles
+        assert 'umber' in profiles and 'sepia' not in profiles
+        assert reloader.current.suffix_table.lookup('sepia') is None
+        assert 'umber microscopy' in reloader.current.suffix_table.lookup('umber')[0]
+
+    def test_shadowing_file_is_a_change(self, reloader, profile_dir):
+        """Test that a user file overriding a packaged profile is picked up."""
+        reloader.current.responses.profile('darkfield')
+        _write_profile(profile_dir, 'darkfield', display_name='Custom Darkfield')
+        assert reloader.reload() == {'darkfield'}
+        payload = json.loads(reloader.current.responses.profile('darkfield'))
+        assert payload['display_name'] == 'Custom Darkfield'
+
+    def test_invalid_profile_is_not_published(self, reloader, profile_dir, monkeypatch):
+        """Test that a bad edit keeps the current snapshot and is not retried until it changes."""
+        before = reloader.current
+        (profile_dir / 'sepia.yaml').write_text('display_name: Sepia\n')
+        assert reloader.reload() == frozenset()
+        assert reloader.current is before
+        stats = reloader.stats()
+        assert stats['failures'] == 1
+        assert 'missing fields' in stats['last_error']
+
+        parses = []
+        original = store_module.parse_profile
+        monkeypatch.setattr(store_module, 'parse_profile', lambda path, data=None: parses.append(path) or
+                            original(path, data))
+        assert reloader.reload() == frozenset()
+        assert parses == []
+
+        _write_profile(profile_dir, 'sepia', display_name='Sepia Fixed')
+        assert reloader.reload() == {'sepia'}
+        assert reloader.current.profiles['sepia']['display_name'] == 'Sepia Fixed'
+        assert reloader.stats()['last_error'] is None
+
+    def test_failed_type_keeps_previous_version(self, reloader, profile_dir):
+        """Test that other changes publish while a broken edit keeps the version already read."""
+        assert reloader.current.profiles['sepia']['display_name'] == 'Sepia'
+        (profile_dir / 'sepia.yaml').write_text('display_name: Sepia\n')
+        _write_profile(profile_dir, 'umber', display_name='Umber')
+        assert reloader.reload() == {'umber'}
+        profiles = reloader.current.profiles
+        assert profiles['sepia']['display_name'] == 'Sepia'
+        assert profiles['umber']['display_name'] == 'Umber'
+        stats = reloader.stats()
+        assert stats['failures'] == 1 and 'sepia.yaml' in stats['last_error']
+        assert reloader.reload() == frozenset()
+        assert reloader.stats()['failures'] == 1
+
+    def test_watcher_reloads_in_background(self, reloader, profile_dir):
+        """Test that the polling thread publishes edits."""
+        watcher = reloader.watch(interval=0.02)
+        version = reloader.current.version
+        _write_profile(profile_dir, 'sepia', display_name='Sepia Watched')
+        deadline = time.monotonic() + 5
+        while reloader.current.version == version and time.monotonic() < deadline:
+            time.sleep(0.01)
+        reloader.stop_watching()
+        watcher.join(1)
+        assert not watcher.is_alive()
+        assert reloader.current.profiles['sepia']['display_name'] == 'Sepia Watched'
+
+
+class TestLazySnapshot:
+    """Test that snapshots read profiles on first use."""
+
+    def test_nothing_read_until_used(self, reloader):
+        """Test that building a snapshot parses no profile."""
+        profiles = reloader.current.profiles
+        assert profiles.loaded() == {}
+        assert 'confocal' in profiles and len(profiles) == len(profiles.keys_listed)
+        profiles['confocal']
+        assert list(profiles.loaded()) == ['confocal']
+
+    def test_bad_file_breaks_only_its_type(self, reloader, profile_dir):
+        """Test that an unreadable profile fails its own lookups and is left out of listings."""
+        (profile_dir / 'umber.yaml').write_text('display_name: [unclosed\n')
+        reloader.rebuild()
+        snapshot = reloader.current
+        with pytest.raises(ProfileError, match='umber.yaml'):
+            snapshot.profiles['umber']
+        assert 'umber' in snapshot.profiles.errors
+        assert 'umber' not in json.loads(snapshot.responses.list_types())
+        assert 'sepia microscopy' in snapshot.suffix_table.lookup('sepia')[0]
+
+    def test_bad_file_does_not_break_import(self, tmp_path):
+        """Test importing the server with an unreadable profile on the profile path."""
+        (tmp_path / 'umber.yaml').write_text('display_name: [unclosed\n')
+        env = dict(os.environ, MICROSCOPY_PROFILE_PATH=str(tmp_path))
+        code = ("import json\n"
+                "from microscopy_aesthetics import server\n"
+                "print('confocal' in server.enhance_prompt_with_microscopy('a cell', 'confocal'))\n"
+                "print(sorted(json.loads(server.list_microscopy_types(compact=True)))[0])\n")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, check=True)
+        assert result.stdout.split() == ['True', 'brightfield']
+
+
+@pytest.fixture
+def restore_profiles(monkeypatch):
+    """Undo profile edits made by a test."""
+    cache = ResultCache(64)
+    monkeypatch.setattr(server, '_RESULT_CACHE', cache)
+    yield cache
+    MICROSCOPY_PROFILES.revert()
+    server.profiles_changed()
+
+
+class TestServerReload:
+    """Test reload_profiles() on the server's profile set."""
+
+    def test_assignment_reloads_one_type(self, restore_profiles):
+        """Test that an in-code edit invalidates only that type's cached results."""
+        server.enhance_prompt_with_microscopy('a cell', 'confocal')
+        server.enhance_prompt_with_microscopy('a cell', 'darkfield')
+        version = server.PROFILE_SNAPSHOTS.current.version
+        MICROSCOPY_PROFILES['darkfield'] = dict(MICROSCOPY_PROFILES['darkfield'], display_name='Edited')
+        assert server.reload_profiles() == {'darkfield'}
+        assert len(restore_profiles) == 1
+        assert 'edited microscopy' in server.enhance_prompt_with_microscopy('a cell', 'darkfield')
+        assert json.loads(server.list_microscopy_types())['darkfield']['display_name'] == 'Edited'
+        profiles = json.loads(server.get_server_metrics())['profiles']
+        assert profiles['version'] == version + 1
+        assert profiles['last_changed'] == ['darkfield']
+        assert f'microscopy_profiles_version {version + 1}' in server.get_server_metrics(format='prometheus')
+
+    def test_failed_reload_keeps_serving(self, restore_profiles, tmp_path):
+        """Test that after a broken edit every tool still serves the current profiles."""
+        directory = tmp_path / 'profiles'
+        directory.mkdir()
+        path = _write_profile(directory, 'sepia', display_name='Sepia')
+        directories = MICROSCOPY_PROFILES.directories
+        MICROSCOPY_PROFILES.directories = directories + [directory]
+        try:
+            server.profiles_changed()
+            # Profiles are read on first use; sepia is served before the edit breaks it
+            server.get_microscopy_profile('sepia')
+            path.write_text('display_name: [unclosed\n')
+            assert server.reload_profiles() == frozenset()
+            assert 'sepia.yaml' in json.loads(server.get_server_metrics())['profiles']['last_error']
+            assert json.loads(server.list_microscopy_types())['sepia']['display_name'] == 'Sepia'
+            assert json.loads(server.get_microscopy_profile('sepia'))['display_name'] == 'Sepia'
+            assert 'sepia microscopy' in server.enhance_prompt_with_microscopy('a cell', 'sepia')
+            assert not server.suggest_microscopy_type('a glowing cell').startswith('Error')
+        finally:
+            MICROSCOPY_PROFILES.directories = directories
+            MICROSCOPY_PROFILES.invalidate()
+
+    def test_stale_result_is_not_served(self):
+        """Test that a result stored against an old suffix misses under the new one."""
+        cache = ResultCache(4)
+        key = ('a cell', 'confocal', 'medium', 'scientific', 4)
+        cache.put(key, ', old suffix.', 'a cell, old suffix.')
+        assert cache.get(key, ', new suffix.') is None
+        assert cache.get(key, ', old suffix.') == 'a cell, old suffix.'
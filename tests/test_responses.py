@@ -0,0 +1,95 @@
+"""
+tests/test_responses.py - Unit tests for cached list/profile responses
+"""
+
+import json
+
+import pytest
+
+from microscopy_aesthetics import server
+from microscopy_aesthetics.compact import plain
+from microscopy_aesthetics.server import (
+    MICROSCOPY_PROFILES,
+    get_microscopy_profile,
+    list_microscopy_types,
+    profiles_changed,
+)
+
+from tests.reference import LEGACY_TYPE_ORDER
+
+
+def _served(profile):
+    """A profile as originally served: every field but the aliases."""
+    return {field: value for field, value in plain(profile).items() if field != 'aliases'}
+
+
+@pytest.fixture
+def restore_profiles():
+    """Undo profile edits made by a test."""
+    yield
+    MICROSCOPY_PROFILES.revert()
+    profiles_changed()
+
+
+class TestCachedResponses:
+    """Test that cached payloads match fresh serialization."""
+
+    def test_list_matches_original_output(self):
+        """Test that the default list output is unchanged."""
+        expected = json.dumps({
+            key: {'display_name': p['display_name'], 'description': p['description']}
+            for key, p in MICROSCOPY_PROFILES.items()
+        }, indent=2)
+        assert list_microscopy_types() == expected
+        assert tuple(json.loads(expected)) == LEGACY_TYPE_ORDER
+        assert list_microscopy_types() is list_microscopy_types()
+
+    def test_profile_matches_original_output(self):
+        """Test that the default profile output is unchanged."""
+        for key, profile in MICROSCOPY_PROFILES.items():
+            assert get_microscopy_profile(key) == json.dumps(_served(profile), indent=2)
+
+    def test_compact_output(self):
+        """Test compact mode drops whitespace but not data."""
+        compact = get_microscopy_profile('confocal', compact=True)
+        assert '\n' not in compact
+        assert json.loads(compact) == _served(MICROSCOPY_PROFILES['confocal'])
+        assert json.loads(list_microscopy_types(compact=True)) == json.loads(list_microscopy_types())
+
+    def test_field_projection(self):
+        """Test that only requested fields are returned, in profile order."""
+        data = json.loads(get_microscopy_profile(
+            'Phase Contrast', fields=['magnification_feel', 'color_palette']
+        ))
+        assert list(data) == ['color_palette', 'magnification_feel']
+        assert data['color_palette'] == plain(MICROSCOPY_PROFILES['phase_contrast'])['color_palette']
+
+    def test_unknown_field(self):
+        """Test projection onto a missing field returns an error."""
+        result = get_microscopy_profile('confocal', fields=['colour'])
+        assert result.startswith("Error: Unknown profile field 'colour'")
+
+    def test_unknown_type(self):
+        """Test the unknown type error is unchanged."""
+        assert get_microscopy_profile('xray').startswith("Error: Unknown microscopy type 'xray'")
+
+
+class TestInvalidation:
+    """Test that profile changes invalidate cached payloads."""
+
+    def test_profiles_changed_rebuilds_payloads(self, restore_profiles):
+        """Test that edits show up after profiles_changed()."""
+        before = server.PROFILE_SNAPSHOTS.current.responses.version
+        get_microscopy_profile('darkfield')
+        MICROSCOPY_PROFILES['darkfield'] = dict(MICROSCOPY_PROFILES['darkfield'],
+                                                description='Edited description')
+        assert profiles_changed() == before + 1
+        assert json.loads(get_microscopy_profile('darkfield'))['description'] == 'Edited description'
+        assert json.loads(list_microscopy_types())['darkfield']['description'] == 'Edited description'
+
+    def test_added_profile_is_served(self, restore_profiles):
+        """Test that new profiles reach every derived structure."""
+        MICROSCOPY_PROFILES['sepia'] = dict(MICROSCOPY_PROFILES['brightfield'], display_name='Sepia')
+        profiles_changed()
+        assert 'sepia' in json.loads(list_microscopy_types())
+        assert 'sepia microscopy' in server.enhance_prompt_with_microscopy('cells', 'sepia')
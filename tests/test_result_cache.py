@@ -0,0 +1,185 @@
+"""
+tests/test_result_cache.py - Unit tests for enhancement memoization
+"""
+
+import itertools
+import json
+
+import pytest
+
+from microscopy_aesthetics import server
+from microscopy_aesthetics.enhancement import STRENGTH_LEVELS
+from microscopy_aesthetics.result_cache import DEFAULT_MAX_BYTES, ResultCache, SharedResults, result_cache_from_env
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES, enhance_prompt_with_microscopy, profiles_changed
+
+from tests.reference import legacy_enhance_prompt
+
+
+def _key(prompt, microscopy_type="confocal"):
+    return (prompt, microscopy_type, "medium", "scientific", 4)
+
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    """Enable an in-memory result cache on the server."""
+    cache = ResultCache(64)
+    monkeypatch.setattr(server, "_RESULT_CACHE", cache)
+    yield cache
+    MICROSCOPY_PROFILES.revert()
+    profiles_changed()
+
+
+class TestResultCache:
+    """Test LRU bounds and counters."""
+
+    def test_hits_and_misses(self):
+        """Test that a stored result is returned and counted."""
+        cache = ResultCache(4)
+        assert cache.get(_key("a"), ", x.") is None
+        cache.put(_key("a"), ", x.", "a, x.")
+        assert cache.get(_key("a"), ", x.") == "a, x."
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test eviction order follows use, not insertion."""
+        cache = ResultCache(2)
+        cache.put(_key("a"), "", "A")
+        cache.put(_key("b"), "", "B")
+        cache.get(_key("a"), "")
+        cache.put(_key("c"), "", "C")
+        assert cache.get(_key("b"), "") is None
+        assert cache.get(_key("a"), "") == "A"
+        assert cache.stats()["evictions"] == 1
+
+    def test_byte_bound(self):
+        """Test that the memory bound evicts and oversized results are skipped."""
+        cache = ResultCache(100, max_bytes=1000)
+        for i in range(10):
+            cache.put(_key(str(i)), "", "x" * 200)
+        assert cache.stats()["bytes"] <= 1000
+        assert len(cache) < 10
+        cache.put(_key("huge"), "", "x" * 5000)
+        assert cache.get(_key("huge"), "") is None
+
+    def test_shared_tier_between_caches(self, tmp_path):
+        """Test that a second process-local cache is served from SQLite."""
+        path = tmp_path / "results.sqlite"
+        ResultCache(4, shared=SharedResults(path)).put(_key("a"), ", x.", "a, x.")
+        reader = ResultCache(4, shared=SharedResults(path))
+        assert reader.get(_key("a"), ", x.") == "a, x."
+        assert reader.get(_key("a"), ", x.") == "a, x."
+        stats = reader.stats()
+        assert (stats["misses"], stats["shared_hits"], stats["hits"]) == (1, 1, 1)
+        # Different suffix text (another profile set) never matches
+        assert reader.get(_key("b"), ", y.") is None
+
+    def test_shared_tier_is_trimmed(self, tmp_path, monkeypatch):
+        """Test that the SQLite table stays under its row limit."""
+        monkeypatch.setattr("microscopy_aesthetics.result_cache.TRIM_EVERY", 10)
+        shared = SharedResults(tmp_path / "results.sqlite", max_rows=25)
+        cache = ResultCache(1000, shared=shared)
+        for i in range(100):
+            cache.put(_key(str(i)), "", str(i))
+        count = shared._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        assert count <= 25
+        assert cache.stats()["evictions"] == 100 - count
+
+    def test_shared_tier_evicts_least_recently_used(self, tmp_path, monkeypatch):
+        """Test that a shared hit protects a row from trimming."""
+        monkeypatch.setattr("microscopy_aesthetics.result_cache.TRIM_EVERY", 3)
+        shared = SharedResults(tmp_path / "results.sqlite", max_rows=2)
+        cache = ResultCache(1, shared=shared)
+        cache.put(_key("a"), "", "A")
+        cache.put(_key("b"), "", "B")
+        assert ResultCache(1, shared=shared).get(_key("a"), "") == "A"
+        cache.put(_key("c"), "", "C")
+        digests = {row[0] for row in shared._connection.execute("SELECT digest FROM results")}
+        assert digests == {SharedResults.digest("a", ""), SharedResults.digest("c", "")}
+
+    def test_shared_tier_errors_fall_back(self, tmp_path):
+        """Test that an unusable database is counted and results are still served."""
+        shared = SharedResults(tmp_path / "results.sqlite")
+        cache = ResultCache(4, shared=shared)
+        shared._connection.execute("DROP TABLE results")
+        cache.put(_key("a"), ", x.", "a, x.")
+        assert cache.get(_key("a"), ", x.") == "a, x."
+        assert cache.get(_key("b"), ", x.") is None
+        assert cache.stats()["shared_errors"] == 2
+
+    def test_unusable_database_disables_shared_tier(self, tmp_path, monkeypatch):
+        """Test that a corrupt database file leaves only the in-process tier."""
+        path = tmp_path / "results.sqlite"
+        path.write_bytes(b"not a database" * 100)
+        monkeypatch.setenv("MICROSCOPY_RESULT_CACHE", "10")
+        monkeypatch.setenv("MICROSCOPY_RESULT_CACHE_SHARED", str(path))
+        cache = result_cache_from_env()
+        assert cache.max_entries == 10 and cache.shared is None
+
+    @pytest.mark.parametrize("setting", ["64MB", "-1", "1.5"])
+    def test_bad_byte_bound_uses_default(self, setting, monkeypatch, capsys):
+        """Test that an unusable byte bound warns and falls back instead of raising."""
+        monkeypatch.setenv("MICROSCOPY_RESULT_CACHE", "10")
+        monkeypatch.setenv("MICROSCOPY_RESULT_CACHE_BYTES", setting)
+        monkeypatch.delenv("MICROSCOPY_RESULT_CACHE_SHARED", raising=False)
+        assert result_cache_from_env().max_bytes == DEFAULT_MAX_BYTES
+        assert "MICROSCOPY_RESULT_CACHE_BYTES" in capsys.readouterr().err
+        monkeypatch.setenv("MICROSCOPY_RESULT_CACHE_BYTES", "4096")
+        assert result_cache_from_env().max_bytes == 4096
+
+    def test_disabled_by_default(self, monkeypatch):
+        """Test that the cache is opt-in."""
+        monkeypatch.delenv("MICROSCOPY_RESULT_CACHE", raising=False)
+        assert result_cache_from_env() is None
+        monkeypatch.setenv("MICROSCOPY_RESULT_CACHE", "500")
+        assert result_cache_from_env().max_entries == 500
+
+
+class TestServerMemoization:
+    """Test enhance_prompt_with_microscopy with the cache enabled."""
+
+    def test_output_unchanged(self, result_cache):
+        """Test cached output is identical to the original pipeline, first call and repeat."""
+        prompt = "a luminous cell " * 30
+        for combo in itertools.product(MICROSCOPY_PROFILES, ("low", "HIGH", "huge"),
+                                       ("artistic", "neon"), list(STRENGTH_LEVELS) + ["extreme"]):
+            expected = legacy_enhance_prompt(prompt, *combo)
+            assert enhance_prompt_with_microscopy(prompt, *combo) == expected
+            assert enhance_prompt_with_microscopy(prompt, *combo) == expected
+
+    def test_fallbacks_share_entries(self, result_cache):
+        """Test that arguments normalizing to the same options share one entry."""
+        enhance_prompt_with_microscopy("a cell", "Confocal", "MEDIUM", "neon", "balanced")
+        enhance_prompt_with_microscopy("a cell", "confocal", "unknown", "scientific", "whatever")
+        assert len(result_cache) == 1
+        assert result_cache.stats()["hits"] == 1
+
+    def test_unknown_type_is_not_cached(self, result_cache):
+        """Test the error path bypasses the cache."""
+        assert enhance_prompt_with_microscopy("a cell", "x-ray").startswith("Error:")
+        assert len(result_cache) == 0
+
+    def test_invalidated_on_profile_change(self, result_cache):
+        """Test that editing profiles clears cached results."""
+        enhance_prompt_with_microscopy("a cell", "confocal")
+        MICROSCOPY_PROFILES["confocal"] = dict(MICROSCOPY_PROFILES["confocal"].as_dict(), quality=["crisp"])
+        profiles_changed()
+        assert len(result_cache) == 0
+        assert "crisp" in enhance_prompt_with_microscopy("a cell", "confocal", aesthetic_strength="strong")
+
+    def test_stats_in_server_metrics(self, result_cache):
+        """Test that cache counters are reported by get_server_metrics."""
+        enhance_prompt_with_microscopy("a cell", "confocal")
+        enhance_prompt_with_microscopy("a cell", "confocal")
+        stats = json.loads(server.get_server_metrics())["result_cache"]
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+        assert "microscopy_result_cache_hits_total 1" in server.get_server_metrics(format="prometheus")
+
+    def test_server_falls_back_on_shared_errors(self, result_cache, tmp_path):
+        """Test that enhance computes results when the shared tier fails."""
+        shared = SharedResults(tmp_path / "results.sqlite")
+        result_cache.shared = shared
+        shared._connection.execute("DROP TABLE results")
+        expected = legacy_enhance_prompt("a cell", "confocal")
+        assert enhance_prompt_with_microscopy("a cell", "confocal") == expected
+        assert result_cache.stats()["shared_errors"] == 2
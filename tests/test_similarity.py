@@ -0,0 +1,97 @@
+"""
+tests/test_similarity.py - Unit tests for the TF-IDF similarity engine
+"""
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from microscopy_aesthetics import server
+from microscopy_aesthetics.similarity import SimilarityIndex, tokenize
+
+DOCUMENTS = {
+    'glow': ['glowing cells', 'neon glow', 'bright glowing markers'],
+    'dark': ['dark background', 'rim lighting', 'dramatic dark field'],
+    'mixed': ['glowing rim', 'soft background'],
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    """Build the server's similarity index from scratch in each test."""
+    monkeypatch.setattr(server.PROFILE_SNAPSHOTS.current, '_similarity_index', None)
+
+
+class TestSimilarityIndex:
+    """Test scoring and caching."""
+
+    def test_scores_are_cosine_similarities(self):
+        """Test that identical text scores 1 and disjoint text scores 0."""
+        index = SimilarityIndex.build(DOCUMENTS)
+        scores = dict(zip(index.types, index.score('dark background rim lighting dramatic dark field')))
+        assert scores['dark'] == pytest.approx(1.0, abs=1e-5)
+        assert 0 < scores['mixed'] < 1
+        assert scores['glow'] == 0
+        assert not index.score('nothing in common').any()
+
+    def test_rank_orders_by_similarity(self):
+        """Test ranking and the limit."""
+        index = SimilarityIndex.build(DOCUMENTS)
+        ranked = index.rank('glowing neon', limit=2)
+        assert [t for t, _ in ranked] == ['glow', 'mixed']
+
+    def test_score_many_matches_score(self):
+        """Test that the batch product agrees with per-description scoring."""
+        index = SimilarityIndex.build(DOCUMENTS)
+        descriptions = ['glowing', 'dark rim', '', 'soft glowing background'] * 100
+        batch = index.score_many(descriptions)
+        for row, description in zip(batch, descriptions[:4]):
+            np.testing.assert_allclose(row, index.score(description), atol=1e-6)
+        assert index.rank_many(descriptions[:2]) == [index.rank('glowing'), index.rank('dark rim')]
+
+    def test_disk_cache_round_trip(self, tmp_path):
+        """Test that the matrix is saved once and reloaded identically."""
+        built = SimilarityIndex.load_or_build(DOCUMENTS, tmp_path)
+        assert len(list(tmp_path.glob('tfidf-*.npz'))) == 1
+        loaded = SimilarityIndex.load_or_build(DOCUMENTS, tmp_path)
+        assert loaded.types == built.types
+        np.testing.assert_array_equal(loaded.score('glowing rim'), built.score('glowing rim'))
+
+    def test_corrupt_cache_is_rebuilt(self, tmp_path):
+        """Test that a truncated cache file is replaced."""
+        SimilarityIndex.load_or_build(DOCUMENTS, tmp_path)
+        (cached,) = tmp_path.glob('tfidf-*.npz')
+        data = cached.read_bytes()
+        cached.write_bytes(data[:len(data) // 2])
+        assert SimilarityIndex.load_or_build(DOCUMENTS, tmp_path).shape[0] == 3
+        assert cached.read_bytes() == data
+        assert [p.name for p in tmp_path.iterdir()] == [cached.name]
+
+    def test_unwritable_cache_is_skipped(self, tmp_path):
+        """Test that a cache directory that cannot be created still yields an index."""
+        blocker = tmp_path / 'file'
+        blocker.write_text('not a directory')
+        assert SimilarityIndex.load_or_build(DOCUMENTS, blocker / 'cache').shape[0] == 3
+
+    def test_tokenize(self):
+        """Test tokenization keeps hyphenated words."""
+        assert tokenize('Z-stack, 3D Glow!') == ['z-stack', '3d', 'glow']
+
+
+class TestSimilaritySuggestions:
+    """Test suggest_microscopy_type in similarity mode."""
+
+    def test_similarity_mode(self):
+        """Test that similarity mode ranks with real scores."""
+        data = json.loads(server.suggest_microscopy_type(
+            'dramatic dark background with rim lighting', mode='similarity'
+        ))
+        assert data[0]['type'] == 'darkfield'
+        assert 0 < data[0]['score'] <= 1
+        assert [d['score'] for d in data] == sorted((d['score'] for d in data), reverse=True)
+
+    def test_unknown_mode(self):
+        """Test mode validation."""
+        assert server.suggest_microscopy_type('x', mode='magic').startswith('Error')
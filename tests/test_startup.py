@@ -0,0 +1,54 @@
+"""
+tests/test_startup.py - Cold start budgets for the stdio server
+"""
+
+import subprocess
+import sys
+
+from benchmarks.bench_startup import (
+    FIRST_LIST_BUDGET_S,
+    PACKAGE_IMPORT_BUDGET_MS,
+    import_times,
+    package_import_ms,
+    time_to_first_list,
+)
+
+
+def _imported_modules(code):
+    result = subprocess.run([sys.executable, "-c", f"{code}\nimport sys\nprint(' '.join(sys.modules))"],
+                            capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+class TestDeferredImports:
+    """Test that heavy dependencies load only when needed."""
+
+    def test_cli_import_is_light(self):
+        """Test that importing the CLI pulls in neither fastmcp nor the process pool."""
+        modules = _imported_modules("import microscopy_aesthetics.cli")
+        assert "fastmcp" not in modules
+        assert "concurrent.futures.process" not in modules
+
+    def test_offline_enhance_skips_fastmcp(self, tmp_path):
+        """Test that the enhance command never imports the server."""
+        source = tmp_path / "in.jsonl"
+        source.write_text('{"base_prompt": "a cell", "microscopy_type": "confocal"}\n')
+        modules = _imported_modules(
+            "from microscopy_aesthetics.cli import main\n"
+            f"main(['enhance', {str(source)!r}, '-o', {str(tmp_path / 'out.jsonl')!r}, '-q'])"
+        )
+        assert "fastmcp" not in modules
+        assert "enhanced_prompt" in (tmp_path / "out.jsonl").read_text()
+
+
+class TestStartupBudget:
+    """Test startup time against the benchmark budgets."""
+
+    def test_package_import_time(self):
+        """Test that this package's own modules import within budget."""
+        assert package_import_ms(import_times()) <= PACKAGE_IMPORT_BUDGET_MS
+
+    def test_first_list_response(self):
+        """Test spawn-to-first-list_microscopy_types time over stdio."""
+        timings = time_to_first_list()
+        assert timings["initialize_s"] <= timings["first_list_s"] <= FIRST_LIST_BUDGET_S
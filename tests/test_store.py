@@ -0,0 +1,157 @@
+"""
+tests/test_store.py - Unit tests for the YAML profile store
+"""
+
+import os
+
+import pytest
+import yaml
+
+from microscopy_aesthetics import store as store_module
+from microscopy_aesthetics.compact import plain
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES
+from microscopy_aesthetics.store import PACKAGED_DIR, ProfileError, ProfileStore
+
+from tests.reference import LEGACY_TYPE_ORDER
+
+
+def _write_profile(directory, key, **changes):
+    profile = dict(plain(MICROSCOPY_PROFILES['brightfield']), **changes)
+    path = directory / f'{key}.yaml'
+    path.write_text(yaml.safe_dump(profile, sort_keys=False))
+    return path
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    directory = tmp_path / 'profiles'
+    directory.mkdir()
+    _write_profile(directory, 'sepia', display_name='Sepia')
+    _write_profile(directory, 'brightfield', display_name='Custom Brightfield')
+    return directory
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    """Count YAML parses."""
+    calls = []
+    original = store_module.parse_profile
+
+    def counting(path, data=None):
+        calls.append(path.name)
+        return original(path, data)
+
+    monkeypatch.setattr(store_module, 'parse_profile', counting)
+    return calls
+
+
+class TestProfileStore:
+    """Test discovery, lazy loading and overrides."""
+
+    def test_packaged_profiles(self):
+        """Test that the packaged YAML files provide all 7 types."""
+        packaged = ProfileStore([PACKAGED_DIR])
+        assert len(packaged) == 7
+        assert packaged['confocal']['display_name'] == 'Confocal'
+
+    def test_original_type_order(self, profile_dir, tmp_path):
+        """Test that packaged types keep their original order, overridden or not."""
+        assert tuple(ProfileStore([PACKAGED_DIR])) == LEGACY_TYPE_ORDER
+        store = ProfileStore([PACKAGED_DIR, profile_dir], tmp_path / 'cache')
+        assert tuple(store) == LEGACY_TYPE_ORDER + ('sepia',)
+        assert tuple(MICROSCOPY_PROFILES) == LEGACY_TYPE_ORDER
+
+    def test_order_file(self, profile_dir, tmp_path):
+        """Test that listed types come first and unknown entries are ignored."""
+        _write_profile(profile_dir, 'amber', display_name='Amber')
+        (profile_dir / 'order.txt').write_text('sepia\nmissing\nbrightfield\nsepia\n')
+        assert list(ProfileStore([profile_dir], tmp_path / 'cache')) == ['sepia', 'brightfield', 'amber']
+
+    def test_lazy_loading(self, profile_dir, tmp_path, parse_calls):
+        """Test that only accessed profiles are parsed."""
+        store = ProfileStore([PACKAGED_DIR, profile_dir], tmp_path / 'cache')
+        assert 'sepia' in store
+        assert parse_calls == []
+        assert store['sepia']['display_name'] == 'Sepia'
+        assert parse_calls == ['sepia.yaml']
+
+    def test_user_directory_overrides_packaged(self, profile_dir, tmp_path):
+        """Test that later directories win."""
+        store = ProfileStore([PACKAGED_DIR, profile_dir], tmp_path / 'cache')
+        assert store['brightfield']['display_name'] == 'Custom Brightfield'
+        assert list(store).count('brightfield') == 1
+        assert 'sepia' in list(store)
+
+    def test_environment_directories(self, profile_dir, monkeypatch):
+        """Test $MICROSCOPY_PROFILE_PATH is appended to the packaged directory."""
+        monkeypatch.setenv('MICROSCOPY_PROFILE_PATH', str(profile_dir))
+        assert ProfileStore().directories == [PACKAGED_DIR, profile_dir]
+
+    def test_assignment_and_deletion(self, profile_dir, tmp_path):
+        """Test in-memory edits shadow files until revert()."""
+        store = ProfileStore([profile_dir], tmp_path / 'cache')
+        store['extra'] = {'display_name': 'Extra'}
+        del store['sepia']
+        assert list(store) == ['brightfield', 'extra']
+        store.revert()
+        assert list(store) == ['brightfield', 'sepia']
+
+    def test_invalid_keys_are_not_paths(self, profile_dir, tmp_path):
+        """Test that keys cannot escape the profile directories."""
+        store = ProfileStore([profile_dir], tmp_path / 'cache')
+        assert '../profiles/sepia' not in store
+        with pytest.raises(KeyError):
+            store['../profiles/sepia']
+
+    def test_invalid_profile(self, tmp_path):
+        """Test that incomplete profiles raise ProfileError."""
+        (tmp_path / 'broken.yaml').write_text('display_name: Broken\n')
+        with pytest.raises(ProfileError, match='missing fields'):
+            ProfileStore([tmp_path], use_cache=False)['broken']
+
+
+class TestCompiledCache:
+    """Test that the compiled cache skips YAML parsing."""
+
+    def test_second_store_skips_yaml(self, profile_dir, tmp_path, parse_calls):
+        """Test that a new process (store) loads from the cache."""
+        cache = tmp_path / 'cache'
+        first = ProfileStore([profile_dir], cache)['sepia']
+        second = ProfileStore([profile_dir], cache)['sepia']
+        assert second == first
+        assert parse_calls == ['sepia.yaml']
+
+    def test_changed_file_is_reparsed(self, profile_dir, tmp_path, parse_calls):
+        """Test that edits invalidate the cache entry."""
+        cache = tmp_path / 'cache'
+        ProfileStore([profile_dir], cache)['sepia']
+        _write_profile(profile_dir, 'sepia', display_name='Sepia II')
+        assert ProfileStore([profile_dir], cache)['sepia']['display_name'] == 'Sepia II'
+        assert parse_calls == ['sepia.yaml', 'sepia.yaml']
+
+    def test_touched_file_uses_content_hash(self, profile_dir, tmp_path, parse_calls):
+        """Test that a new mtime with identical content still hits the cache."""
+        cache = tmp_path / 'cache'
+        ProfileStore([profile_dir], cache)['sepia']
+        path = profile_dir / 'sepia.yaml'
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        ProfileStore([profile_dir], cache)['sepia']
+        assert parse_calls == ['sepia.yaml']
+
+    def test_corrupt_cache_is_ignored(self, profile_dir, tmp_path):
+        """Test that unreadable cache files fall back to YAML."""
+        cache = tmp_path / 'cache'
+        ProfileStore([profile_dir], cache)['sepia']
+        for entry in cache.iterdir():
+            entry.write_bytes(b'not marshal')
+        assert ProfileStore([profile_dir], cache)['sepia']['display_name'] == 'Sepia'
+
+    @pytest.mark.parametrize("variable", ['MICROSCOPY_CACHE_DIR', 'XDG_CACHE_HOME'])
+    def test_unusable_cache_location(self, profile_dir, tmp_path, monkeypatch, variable):
+        """Test that a default cache location that cannot be created only disables the cache."""
+        blocker = tmp_path / 'blocker'
+        blocker.write_text('')
+        monkeypatch.delenv('MICROSCOPY_CACHE_DIR', raising=False)
+        monkeypatch.setenv(variable, str(blocker / 'cache'))
+        assert ProfileStore([profile_dir])['sepia']['display_name'] == 'Sepia'
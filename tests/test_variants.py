@@ -0,0 +1,163 @@
+"""
+tests/test_variants.py - Unit tests for multi-variant enhancement
+"""
+
+import asyncio
+import json
+import random
+
+import pytest
+
+from microscopy_aesthetics import server
+from microscopy_aesthetics.compact import plain
+from microscopy_aesthetics.enhancement import MAX_WORDS, compose, compose_many, compose_within
+from microscopy_aesthetics.server import MICROSCOPY_PROFILES, enhance_prompt_with_microscopy
+from microscopy_aesthetics.variants import VARIANT_FIELDS, VariantSpace, _undrawn
+
+from tests.reference import legacy_enhance_prompt
+
+
+def _variants(*args, **kwargs):
+    return json.loads(enhance_prompt_with_microscopy(*args, **kwargs))
+
+
+class TestVariantSpace:
+    """Test decoding and sampling of phrase combinations."""
+
+    @pytest.mark.parametrize("num", [2, 4, 6])
+    def test_every_variant_is_distinct_and_well_formed(self, num):
+        """Test that a whole space decodes to distinct suffixes with correct word counts."""
+        profile = MICROSCOPY_PROFILES['phase_contrast']
+        space = VariantSpace(profile, 'high', 'scientific', num)
+        entries = [space.entry(n) for n in range(len(space))]
+        assert len({suffix for suffix, _ in entries}) == len(space)
+        for suffix, words in entries:
+            assert len(suffix.split()) == words
+            features = suffix.split('Features ', 1)[1].split('. Color palette', 1)[0]
+            phrases = features.split(', ')
+            assert len(phrases) == num
+            assert phrases[0] in profile['structure']
+            vocabulary = {p for field in VARIANT_FIELDS for p in profile[field]}
+            assert all(p in vocabulary for p in phrases[1:])
+            assert profile['magnification_feel']['high'] in suffix
+
+    def test_seeded_sampling_is_repeatable(self):
+        """Test that a seed fixes the variants and different seeds differ."""
+        space = VariantSpace(MICROSCOPY_PROFILES['confocal'], 'medium', 'scientific', 4)
+        assert space.sample(50, 7) == space.sample(50, 7)
+        assert space.sample(50, 7) != space.sample(50, 8)
+
+    def test_shared_phrases_stay_distinct(self):
+        """Test that phrases repeated across fields never produce duplicate texts."""
+        profile = dict(plain(MICROSCOPY_PROFILES['confocal']))
+        for field in VARIANT_FIELDS:
+            profile[field] = ['shared', 'other']
+        space = VariantSpace(profile, 'medium', 'scientific', 2)
+        suffixes = [suffix for suffix, _ in space.sample(len(space), 3)]
+        assert len(suffixes) == len(set(suffixes))
+        # Six fields x 2 phrases collapse to 2 texts per structure and color phrase
+        assert len(suffixes) == 2 * len(profile['structure']) * len(profile['color_palette']['scientific'])
+
+    def test_replacement_draws_skip_drawn_numbers(self):
+        """Test that replacements never repeat a number and never list a huge space."""
+        rng = random.Random(5)
+        drawn = {0, 2, 4}
+        assert sorted(_undrawn(rng, 7, drawn)) == [1, 3, 5, 6]
+        huge = _undrawn(random.Random(5), 10 ** 15, {1})
+        picks = [next(huge) for _ in range(1000)]
+        assert len(set(picks)) == 1000 and 1 not in picks
+
+    def test_compose_many_matches_compose(self):
+        """Test batched composition of prompts that fit, including whitespace-padded ones."""
+        space = VariantSpace(MICROSCOPY_PROFILES['electron'], 'low', 'artistic', 6)
+        entries = space.sample(20, 1)
+        for prompt in ('a butterfly wing', '  padded  ', '', 'word ' * 20, 'fused' * 3):
+            expected = [compose(prompt, suffix, words) for suffix, words in entries]
+            assert compose_many(prompt, entries) == expected
+
+    @pytest.mark.parametrize("length", [70, 75, 90, 500])
+    def test_compose_many_keeps_suffixes_whole(self, length):
+        """Test that long prompts are shortened instead of the suffixes."""
+        space = VariantSpace(MICROSCOPY_PROFILES['electron'], 'low', 'artistic', 6)
+        entries = space.sample(20, 1)
+        prompt = 'word ' * length
+        results = compose_many(prompt, entries)
+        for result, (suffix, words) in zip(results, entries):
+            assert result == compose_within(prompt, suffix, words, MAX_WORDS)
+            assert result.endswith(suffix) and len(result.split()) <= MAX_WORDS
+
+
+class TestVariantsTool:
+    """Test enhance_prompt_with_microscopy(variants=N)."""
+
+    def test_default_output_unchanged(self):
+        """Test that a single unseeded call still returns the plain prompt."""
+        assert enhance_prompt_with_microscopy('a cell', 'confocal', variants=1) == \
+            legacy_enhance_prompt('a cell', 'confocal')
+
+    def test_thousand_distinct_variants(self):
+        """Test a large seeded request."""
+        result = _variants('a coral reef', 'fluorescence', aesthetic_strength='strong', variants=1000, seed=42)
+        assert result['seed'] == 42
+        assert result['available'] >= 1000
+        assert len(set(result['variants'])) == 1000
+        assert all(v.startswith('a coral reef, rendered with fluorescence microscopy') for v in result['variants'])
+        assert all(len(v.split()) <= MAX_WORDS for v in result['variants'])
+        assert result == _variants('a coral reef', 'Fluorescence', aesthetic_strength='strong',
+                                   variants=1000, seed=42)
+
+    @pytest.mark.parametrize("length", [40, 75, 90])
+    def test_long_prompts_stay_distinct(self, length):
+        """Test that variants of a prompt near or over the word limit still differ."""
+        prompt = ' '.join(f'word{i}' for i in range(length))
+        result = _variants(prompt, 'confocal', variants=50, seed=3)
+        assert len(set(result['variants'])) == 50
+        assert all(len(v.split()) <= MAX_WORDS for v in result['variants'])
+        assert all(v.startswith('word0 word1') for v in result['variants'])
+
+    def test_capped_at_available(self):
+        """Test that small spaces return every distinct variant and say how many exist."""
+        result = _variants('a cell', 'phase contrast', color_palette='scientific',
+                           aesthetic_strength='subtle', variants=1000, seed=1)
+        assert len(result['variants']) == result['available'] < 1000
+        assert len(set(result['variants'])) == result['available']
+
+    def test_unseeded_reports_seed(self):
+        """Test that the chosen seed reproduces the run."""
+        first = _variants('a cell', 'darkfield', variants=5)
+        assert _variants('a cell', 'darkfield', variants=5, seed=first['seed']) == first
+
+    def test_seed_alone_returns_one_variant(self):
+        """Test that a seed with the default count samples one variant."""
+        assert len(_variants('a cell', 'darkfield', seed=3)['variants']) == 1
+
+    @pytest.mark.parametrize("variants", [0, -1, 1001])
+    def test_out_of_range(self, variants):
+        """Test the variant count bounds."""
+        assert enhance_prompt_with_microscopy('a cell', 'confocal', variants=variants) == \
+            "Error: variants must be between 1 and 1000"
+
+    def test_unknown_type(self):
+        """Test the unknown type error is unchanged."""
+        result = enhance_prompt_with_microscopy('a cell', 'x-ray', variants=3)
+        assert result.startswith("Error: Unknown microscopy type 'x-ray'")
+
+    def test_async_variant_offloads_large_requests(self):
+        """Test the registered tool returns the same variants, offloading large counts."""
+        before = server._EXECUTOR.submitted
+        result = asyncio.run(server.enhance_prompt_with_microscopy_async('a cell', 'confocal',
+                                                                         variants=200, seed=9))
+        assert result == enhance_prompt_with_microscopy('a cell', 'confocal', variants=200, seed=9)
+        assert server._EXECUTOR.submitted == before + 1
+
+    def test_reload_rebuilds_changed_type(self):
+        """Test that variant spaces follow profile edits."""
+        try:
+            enhance_prompt_with_microscopy('a cell', 'darkfield', variants=3, seed=1)
+            MICROSCOPY_PROFILES['darkfield'] = dict(MICROSCOPY_PROFILES['darkfield'], display_name='Edited')
+            server.reload_profiles()
+            result = _variants('a cell', 'darkfield', variants=3, seed=1)
+            assert all('edited microscopy' in v for v in result['variants'])
+        finally:
+            MICROSCOPY_PROFILES.revert()
+            server.profiles_changed()